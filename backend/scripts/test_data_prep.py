@@ -0,0 +1,208 @@
+import numpy as np
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine, inspect
+import data_prep
+
+def build_pbp_df_for_test(num_plays: int, seed: int) -> pd.DataFrame:
+    # Random plays that cover every branch of determine_play_result, including missing values
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "play_type": rng.choice(np.array(["pass", "run", "punt", "kickoff", "qb_kneel", "qb_spike", "extra_point", "field_goal", "no_play", None],
+                                         dtype=object), num_plays),
+        "touchdown": rng.choice([0.0, 0.0, 0.0, 1.0, np.nan], num_plays),
+        "extra_point_result": rng.choice(np.array(["good", "failed", "blocked", None], dtype=object), num_plays),
+        "field_goal_attempt": rng.choice([0.0, 0.0, 1.0, np.nan], num_plays),
+        "field_goal_result": rng.choice(np.array(["made", "missed", "blocked", None], dtype=object), num_plays),
+        "interception": rng.choice([0.0, 0.0, 0.0, 1.0, np.nan], num_plays),
+        "fumble_lost": rng.choice([0.0, 0.0, 0.0, 1.0, np.nan], num_plays),
+        "down": rng.choice([1.0, 2.0, 3.0, 4.0, np.nan], num_plays),
+        "ydstogo": rng.choice(np.append(np.arange(1.0, 21.0), np.nan), num_plays),
+        "ydsnet": rng.choice(np.append(np.arange(-10.0, 40.0), np.nan), num_plays),
+    })
+
+def test_vectorized_play_results_match_row_function():
+    pbp_df = build_pbp_df_for_test(5000, 7)
+    expected_play_results = pbp_df.apply(data_prep.determine_play_result, axis=1)
+    play_results = data_prep.determine_play_results(pbp_df)
+    pd.testing.assert_series_equal(play_results, expected_play_results, check_dtype=False, check_names=False)
+    assert set(play_results) == {"NA", "Touchdown", "Success", "Failure", "Field Goal", "Turnover"}
+
+def test_vectorized_play_results_use_down_dependent_success_thresholds():
+    # Gaining exactly the required share of the yards to go is a success, one yard less is a failure
+    pbp_df = pd.DataFrame({
+        "play_type": ["run"] * 8,
+        "touchdown": [0.0] * 8,
+        "extra_point_result": [None] * 8,
+        "field_goal_attempt": [0.0] * 8,
+        "field_goal_result": [None] * 8,
+        "interception": [0.0] * 8,
+        "fumble_lost": [0.0] * 8,
+        "down": [1.0, 1.0, 2.0, 2.0, 3.0, 3.0, 4.0, 4.0],
+        "ydstogo": [10.0] * 8,
+        "ydsnet": [4.0, 3.0, 6.0, 5.0, 10.0, 9.0, 10.0, 9.0],
+    })
+    assert list(data_prep.determine_play_results(pbp_df)) == ["Success", "Failure"] * 4
+
+def build_raw_pbp_df_for_test(game_matchups: list, seed: int) -> pd.DataFrame:
+    # A small play-by-play data set in the nflverse format with the columns that the sim engine tables are built from
+    rng = np.random.default_rng(seed)
+    game_dfs = []
+    for game_number, (home_team, away_team) in enumerate(game_matchups):
+        num_plays = 120
+        drive = np.cumsum(rng.random(num_plays) < 0.1) + 1
+        home_ball = drive % 2 == 1
+        play_kind = rng.choice(["pass", "run", "field_goal", "punt"], num_plays, p=[0.5, 0.4, 0.05, 0.05])
+        is_pass = play_kind == "pass"
+        is_run = play_kind == "run"
+        sack = is_pass & (rng.random(num_plays) < 0.07)
+        complete_pass = is_pass & ~sack & (rng.random(num_plays) < 0.65)
+        air_yards = np.where(is_pass & ~sack, rng.integers(-2, 35, num_plays), np.nan)
+        yards_after_catch = np.where(complete_pass, rng.integers(0, 15, num_plays), np.nan)
+        passing_yards = np.where(complete_pass, np.maximum(air_yards + yards_after_catch, 1), np.nan)
+        rushing_yards = np.where(is_run, rng.integers(1, 20, num_plays), np.nan)
+        yards_gained = np.where(sack, -rng.integers(1, 10, num_plays), np.nan_to_num(passing_yards) + np.nan_to_num(rushing_yards))
+        game_dfs.append(pd.DataFrame({
+            "game_id": f"2024_{game_number:02d}_{away_team}_{home_team}",
+            "play_id": np.arange(num_plays),
+            "drive": drive.astype(float),
+            "home_team": home_team,
+            "away_team": away_team,
+            "posteam": np.where(home_ball, home_team, away_team),
+            "defteam": np.where(home_ball, away_team, home_team),
+            "qtr": np.arange(num_plays) * 4 // num_plays + 1,
+            "down": np.where(is_pass | is_run, rng.integers(1, 4, num_plays), 4).astype(float),
+            "ydstogo": rng.integers(1, 15, num_plays).astype(float),
+            "yardline_100": rng.integers(1, 100, num_plays).astype(float),
+            "ydsnet": rng.integers(-5, 60, num_plays).astype(float),
+            "yards_gained": yards_gained,
+            "play_type": play_kind,
+            "quarter_seconds_remaining": 900 - (np.arange(num_plays) % 30) * 30,
+            "game_seconds_remaining": 3600 - np.arange(num_plays) * 30,
+            "pass_attempt": is_pass.astype(float),
+            "sack": sack.astype(float),
+            "complete_pass": complete_pass.astype(float),
+            "air_yards": air_yards,
+            "passing_yards": passing_yards,
+            "yards_after_catch": yards_after_catch,
+            "rush_attempt": is_run.astype(float),
+            "rushing_yards": rushing_yards,
+            "interception": (is_pass & ~complete_pass & (rng.random(num_plays) < 0.05)).astype(float),
+            "fumble_lost": (is_run & (rng.random(num_plays) < 0.02)).astype(float),
+            "touchdown": ((is_pass | is_run) & (rng.random(num_plays) < 0.03)).astype(float),
+            "field_goal_attempt": (play_kind == "field_goal").astype(float),
+            "field_goal_result": np.where(play_kind == "field_goal", rng.choice(["made", "missed"], num_plays, p=[0.85, 0.15]), None),
+            "extra_point_result": None,
+        }))
+    return pd.concat(game_dfs, ignore_index=True)
+
+def test_incremental_update_matches_full_rebuild():
+    game_matchups = [("BUF", "MIA"), ("KC", "NYJ"), ("NE", "BUF"), ("MIA", "KC"), ("NYJ", "NE"), ("BUF", "KC"), ("MIA", "NYJ")]
+    raw_pbp_df = build_raw_pbp_df_for_test(game_matchups, 3)
+    first_week_pbp_df = raw_pbp_df[raw_pbp_df["game_id"].isin(raw_pbp_df["game_id"].unique()[:5])].copy()
+
+    with create_engine("sqlite://").connect() as incremental_db_conn, create_engine("sqlite://").connect() as full_db_conn:
+        # The first update builds every table, later ones only ingest the new games and refit the teams that played in them
+        assert data_prep.update_sim_engine_tables(first_week_pbp_df, incremental_db_conn, num_workers=2) == ["BUF", "KC", "MIA", "NE", "NYJ"]
+        assert data_prep.update_sim_engine_tables(raw_pbp_df, incremental_db_conn, num_workers=2) == ["BUF", "KC", "MIA", "NYJ"]
+        assert data_prep.update_sim_engine_tables(raw_pbp_df, incremental_db_conn, num_workers=2) == []
+
+        data_prep.setup_sim_engine_pbp_table(raw_pbp_df.copy(), full_db_conn)
+        data_prep.setup_sim_engine_team_stats_table(raw_pbp_df, full_db_conn, num_workers=2)
+        for table_name in ["sim_engine_pbp_2024", "sim_engine_team_totals_2024", "sim_engine_team_stats_2024"]:
+            incremental_table_df = pd.read_sql_table(table_name, incremental_db_conn)
+            full_table_df = pd.read_sql_table(table_name, full_db_conn)
+            pd.testing.assert_frame_equal(incremental_table_df, full_table_df, check_dtype=False)
+
+def test_failed_incremental_update_is_rolled_back_and_retried(monkeypatch):
+    game_matchups = [("BUF", "MIA"), ("KC", "NYJ"), ("MIA", "KC"), ("NYJ", "BUF")]
+    raw_pbp_df = build_raw_pbp_df_for_test(game_matchups, 13)
+    first_week_pbp_df = raw_pbp_df[raw_pbp_df["game_id"].isin(raw_pbp_df["game_id"].unique()[:2])].copy()
+    table_names = ["sim_engine_pbp_2024", "sim_engine_team_totals_2024", "sim_engine_team_stats_2024"]
+    write_table = data_prep.write_table
+
+    def fail_pbp_append(df, table_name, db_conn, if_exists='replace', chunk_size=None):
+        # The totals and stats are written before the new plays, so this fails after every other write of the update
+        if table_name == "sim_engine_pbp_2024" and if_exists == 'append':
+            raise RuntimeError("Lost the database connection")
+        write_table(df, table_name, db_conn, if_exists, chunk_size)
+
+    def fail_refit(*args, **kwargs):
+        raise RuntimeError("The lognorm fit failed")
+
+    with create_engine("sqlite://").connect() as incremental_db_conn, create_engine("sqlite://").connect() as full_db_conn:
+        data_prep.update_sim_engine_tables(first_week_pbp_df, incremental_db_conn, num_workers=2)
+        first_week_tables = {table_name: pd.read_sql_table(table_name, incremental_db_conn) for table_name in table_names}
+        for failing_step, failure in [("write_table", fail_pbp_append), ("get_yards_distribution_params", fail_refit)]:
+            with monkeypatch.context() as patch:
+                patch.setattr(data_prep, failing_step, failure)
+                with pytest.raises(RuntimeError):
+                    data_prep.update_sim_engine_tables(raw_pbp_df, incremental_db_conn, num_workers=2)
+            for table_name in table_names:
+                pd.testing.assert_frame_equal(pd.read_sql_table(table_name, incremental_db_conn), first_week_tables[table_name])
+
+        # The rerun ingests the games of the failed updates
+        assert data_prep.update_sim_engine_tables(raw_pbp_df, incremental_db_conn, num_workers=2) == ["BUF", "KC", "MIA", "NYJ"]
+        data_prep.setup_sim_engine_pbp_table(raw_pbp_df.copy(), full_db_conn)
+        data_prep.setup_sim_engine_team_stats_table(raw_pbp_df, full_db_conn, num_workers=2)
+        for table_name in table_names:
+            pd.testing.assert_frame_equal(pd.read_sql_table(table_name, incremental_db_conn), pd.read_sql_table(table_name, full_db_conn),
+                                          check_dtype=False)
+
+def test_raw_pbp_csv_is_read_pruned_and_cached(tmp_path, monkeypatch):
+    raw_pbp_df = build_raw_pbp_df_for_test([("BUF", "MIA"), ("MIA", "KC"), ("KC", "BUF")], 5)
+    csv_path = tmp_path / "2024_NFL.csv"
+    # Columns that the sim engine doesn't use are never loaded
+    raw_pbp_df.assign(unused_epa=0.25, unused_desc="play description").to_csv(csv_path, index=False)
+
+    cache_dir = tmp_path / "cache"
+    loaded_pbp_df = data_prep.load_raw_pbp_df(str(csv_path), str(cache_dir), chunk_size=100)
+    assert list(loaded_pbp_df.columns) == list(data_prep.raw_pbp_dtypes)
+    assert loaded_pbp_df["posteam"].dtype == "category"
+    assert len(list(cache_dir.iterdir())) == 1
+
+    # Later loads come from the cache without reading the CSV
+    def fail_read_csv(*args, **kwargs):
+        raise AssertionError("The raw CSV was read again")
+    with monkeypatch.context() as patch:
+        patch.setattr(pd, "read_csv", fail_read_csv)
+        cached_pbp_df = data_prep.load_raw_pbp_df(str(csv_path), str(cache_dir))
+    pd.testing.assert_frame_equal(cached_pbp_df, loaded_pbp_df)
+
+    # The compact dtypes don't change the play results or team stats
+    pd.testing.assert_series_equal(data_prep.determine_play_results(loaded_pbp_df), data_prep.determine_play_results(raw_pbp_df))
+    pd.testing.assert_frame_equal(data_prep.get_team_stats_df(loaded_pbp_df, num_workers=2), data_prep.get_team_stats_df(raw_pbp_df, num_workers=2),
+                                  check_dtype=False)
+
+    # Changing the CSV invalidates the cache
+    raw_pbp_df.iloc[:-1].to_csv(csv_path, index=False)
+    assert len(data_prep.load_raw_pbp_df(str(csv_path), str(cache_dir))) == len(raw_pbp_df) - 1
+    assert len(list(cache_dir.iterdir())) == 2
+
+def test_sim_engine_tables_are_written_to_sqlite_in_chunks(tmp_path, monkeypatch):
+    sqlite_path = tmp_path / "sim_engine.db"
+    monkeypatch.setenv("SIM_ENGINE_DB_URL", f"sqlite:///{sqlite_path}")
+    assert data_prep.get_main_db_url() == f"sqlite:///{sqlite_path}"
+
+    raw_pbp_df = build_raw_pbp_df_for_test([("BUF", "MIA"), ("MIA", "KC"), ("KC", "BUF")], 9)
+    main_db_conn, alt_db_conn = data_prep.setup_db_connections(alt_db_url=False)
+    assert alt_db_conn is None
+    with main_db_conn:
+        # Every chunk is inserted, including the last partial one
+        monkeypatch.setattr(data_prep, "to_sql_chunk_size", 64)
+        data_prep.setup_sim_engine_pbp_table(raw_pbp_df.copy(), main_db_conn)
+        data_prep.setup_sim_engine_team_stats_table(raw_pbp_df, main_db_conn, num_workers=2)
+        main_db_conn.commit()
+
+    with create_engine(f"sqlite:///{sqlite_path}").connect() as db_conn:
+        assert len(pd.read_sql_table("sim_engine_pbp_2024", db_conn)) == len(raw_pbp_df)
+        team_stats_df = pd.read_sql_table("sim_engine_team_stats_2024", db_conn)
+    assert list(team_stats_df["team"]) == ["BUF", "KC", "MIA"]
+    assert list(team_stats_df.columns) == ["index"] + data_prep.team_stats_columns
+
+def test_sim_engine_tables_are_keyed_by_season():
+    raw_pbp_df = build_raw_pbp_df_for_test([("BUF", "MIA"), ("MIA", "BUF")], 11)
+    with create_engine("sqlite://").connect() as db_conn:
+        assert data_prep.update_sim_engine_tables(raw_pbp_df, db_conn, num_workers=2, season=2023) == ["BUF", "MIA"]
+        assert data_prep.update_sim_engine_tables(raw_pbp_df, db_conn, num_workers=2, season=2023) == []
+        assert sorted(inspect(db_conn).get_table_names()) == ["sim_engine_pbp_2023", "sim_engine_team_stats_2023", "sim_engine_team_totals_2023"]
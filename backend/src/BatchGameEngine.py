@@ -0,0 +1,194 @@
+import numpy as np
+from GameModels import PrototypeGameModel, RUN_PLAY, PASS_PLAY, PUNT_PLAY, FIELD_GOAL_PLAY
+
+team_stat_counter_names = ["plays", "run_plays", "rush_yards", "rush_tds", "pass_plays", "pass_cmps", "pass_yards",
+                           "pass_tds", "turnovers", "sacks", "fg_attempts", "fg_makes"]
+
+# Index of each team's row in the team stat counter arrays
+HOME = 0
+AWAY = 1
+
+class BatchGameEngine:
+    # Simulates num_games independent games of the same matchup in lockstep. Every call to step() advances
+    # all unfinished games by one play, so the game state is held as one NumPy array per field.
+    def __init__(self, home_team: object, away_team: object, num_games: int, game_model=PrototypeGameModel(), rng=None):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.num_games = num_games
+        self.game_model = game_model
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.game_state = self._initialize_game_state()
+        self.team_stats = {name: np.zeros((2, num_games)) for name in team_stat_counter_names}
+        home_team.setup_teams_for_game_model(game_model.get_model_code())
+        away_team.setup_teams_for_game_model(game_model.get_model_code())
+
+    def _initialize_game_state(self) -> dict:
+        num_games = self.num_games
+        return {
+            "quarter": np.full(num_games, 1, dtype=np.int64),
+            "game_seconds_remaining": np.full(num_games, 3600, dtype=np.int64),
+            "quarter_seconds_remaining": np.full(num_games, 900, dtype=np.int64),
+            "home_has_possession": np.ones(num_games, dtype=bool),
+            "yardline": np.full(num_games, 75, dtype=np.float64),
+            "down": np.full(num_games, 1, dtype=np.int64),
+            "distance": np.full(num_games, 10, dtype=np.float64),
+            "home_score": np.zeros(num_games, dtype=np.int64),
+            "away_score": np.zeros(num_games, dtype=np.int64),
+            "num_plays": np.zeros(num_games, dtype=np.int64),
+            "game_over": np.zeros(num_games, dtype=bool),
+        }
+
+    def get_active_game_state(self, game_indices: np.ndarray) -> dict:
+        active_game_state = {key: values[game_indices] for key, values in self.game_state.items()}
+        active_game_state["home_team"] = self.home_team
+        active_game_state["away_team"] = self.away_team
+        return active_game_state
+
+    def step(self) -> bool:
+        game_indices = np.flatnonzero(~self.game_state["game_over"])
+        if game_indices.size == 0:
+            return False
+        play_result = self.game_model.resolve_play_batch(self.get_active_game_state(game_indices), self.rng)
+        self.update_game_state(game_indices, play_result)
+        return True
+
+    def update_game_state(self, game_indices: np.ndarray, play_result: dict) -> None:
+        # Masked equivalent of GameEngine.update_game_state applied to every game in game_indices
+        game_state = self.game_state
+        home_ball = game_state["home_has_possession"][game_indices]
+        yardline = game_state["yardline"][game_indices]
+        down = game_state["down"][game_indices]
+        distance = game_state["distance"][game_indices]
+        home_score = game_state["home_score"][game_indices]
+        away_score = game_state["away_score"][game_indices]
+        quarter = game_state["quarter"][game_indices]
+        quarter_seconds_remaining = game_state["quarter_seconds_remaining"][game_indices] - play_result["time_elapsed"]
+        game_seconds_remaining = game_state["game_seconds_remaining"][game_indices] - play_result["time_elapsed"]
+
+        play_type = play_result["play_type"]
+        yards_gained = play_result["yards_gained"]
+        turnover = play_result["turnover"]
+        punt = ~turnover & (play_type == PUNT_PLAY)
+        field_goal = ~turnover & (play_type == FIELD_GOAL_PLAY)
+        scrimmage_play = ~(turnover | punt | field_goal)
+
+        # Turnovers, punts and field goals (simulate_turnover, simulate_punt, simulate_field_goal)
+        punt_yardline = yardline - yards_gained
+        punt_yardline = np.where(punt_yardline < 0, 25, punt_yardline) # Handle touchbacks
+        field_goal_made = field_goal & play_result["field_goal_made"]
+        home_score += 3 * (field_goal_made & home_ball)
+        away_score += 3 * (field_goal_made & ~home_ball)
+        new_yardline = np.where(turnover, 100 - yardline, yardline)
+        new_yardline = np.where(punt, 100 - punt_yardline, new_yardline)
+        new_yardline = np.where(field_goal, 75, new_yardline)
+        change_of_possession = ~scrimmage_play
+        new_down = np.where(change_of_possession, 1, down)
+        new_distance = np.where(change_of_possession, 10, distance)
+
+        # Run and pass plays
+        scrimmage_yardline = yardline - yards_gained
+        first_down = scrimmage_play & (yards_gained >= distance)
+        turnover_on_downs = scrimmage_play & ~first_down & (down == 4)
+        next_down = scrimmage_play & ~first_down & ~turnover_on_downs
+        new_yardline = np.where(scrimmage_play, scrimmage_yardline, new_yardline)
+        new_down = np.where(first_down, 1, np.where(next_down, down + 1, new_down))
+        new_distance = np.where(first_down, 10, np.where(next_down, distance - yards_gained, new_distance))
+        home_ball_after_play = home_ball ^ turnover_on_downs
+
+        touchdown = scrimmage_play & (scrimmage_yardline <= 0)
+        home_score += 7 * (touchdown & home_ball_after_play)
+        away_score += 7 * (touchdown & ~home_ball_after_play)
+        safety = scrimmage_play & ~touchdown & (scrimmage_yardline > 100)
+        home_score += 2 * (safety & ~home_ball_after_play)
+        away_score += 2 * (safety & home_ball_after_play)
+        kickoff = touchdown | safety
+        new_yardline = np.where(touchdown, 75, np.where(safety, 60, new_yardline)) # Since free kicks typically don't travel as far as kickoffs
+        new_down = np.where(kickoff, 1, new_down)
+        new_distance = np.where(kickoff, 10, new_distance)
+        new_home_ball = np.where(scrimmage_play, home_ball_after_play ^ kickoff, ~home_ball)
+
+        self.update_team_stats(game_indices, home_ball, play_result, touchdown)
+
+        # End of quarter, halftime and end of game handling
+        end_of_quarter = quarter_seconds_remaining <= 0
+        next_quarter = end_of_quarter & (quarter != 2) & (quarter != 4)
+        halftime = end_of_quarter & (quarter == 2)
+        game_over = end_of_quarter & (quarter == 4)
+        new_quarter = np.where(next_quarter | halftime, quarter + 1, quarter)
+        quarter_seconds_remaining = np.where(next_quarter | halftime, 900, quarter_seconds_remaining)
+        new_home_ball = np.where(halftime, False, new_home_ball)
+        new_yardline = np.where(halftime, 75, new_yardline)
+        new_down = np.where(halftime, 1, new_down)
+        new_distance = np.where(halftime, 10, new_distance)
+
+        game_state["home_has_possession"][game_indices] = new_home_ball
+        game_state["yardline"][game_indices] = new_yardline
+        game_state["down"][game_indices] = new_down
+        game_state["distance"][game_indices] = new_distance
+        game_state["home_score"][game_indices] = home_score
+        game_state["away_score"][game_indices] = away_score
+        game_state["quarter"][game_indices] = new_quarter
+        game_state["quarter_seconds_remaining"][game_indices] = quarter_seconds_remaining
+        game_state["game_seconds_remaining"][game_indices] = game_seconds_remaining
+        game_state["num_plays"][game_indices] += 1
+        game_state["game_over"][game_indices] = game_over
+
+    def update_team_stats(self, game_indices: np.ndarray, home_ball: np.ndarray, play_result: dict, touchdown: np.ndarray) -> None:
+        # Stats are credited to the team that had the ball when the play started
+        team_index = np.where(home_ball, HOME, AWAY)
+        play_type = play_result["play_type"]
+        yards_gained = play_result["yards_gained"]
+        run_play = play_type == RUN_PLAY
+        pass_play = play_type == PASS_PLAY
+        field_goal = play_type == FIELD_GOAL_PLAY
+
+        team_stats = self.team_stats
+        team_stats["plays"][team_index, game_indices] += 1
+        team_stats["run_plays"][team_index, game_indices] += run_play
+        team_stats["rush_yards"][team_index, game_indices] += np.where(run_play, yards_gained, 0)
+        team_stats["rush_tds"][team_index, game_indices] += run_play & touchdown
+        team_stats["pass_plays"][team_index, game_indices] += pass_play
+        team_stats["pass_cmps"][team_index, game_indices] += pass_play & (yards_gained > 0)
+        team_stats["pass_yards"][team_index, game_indices] += np.where(pass_play, yards_gained, 0)
+        team_stats["pass_tds"][team_index, game_indices] += pass_play & touchdown
+        team_stats["turnovers"][team_index, game_indices] += play_result["turnover"]
+        team_stats["sacks"][team_index, game_indices] += pass_play & (yards_gained < 0)
+        team_stats["fg_attempts"][team_index, game_indices] += field_goal
+        team_stats["fg_makes"][team_index, game_indices] += field_goal & play_result["field_goal_made"]
+
+    def run_simulation(self) -> dict:
+        while self.step():
+            pass
+        return self.get_game_summary()
+
+    def get_game_summary(self) -> dict:
+        return {
+            "final_score": {self.home_team.name: self.game_state["home_score"], self.away_team.name: self.game_state["away_score"]},
+            "num_plays_in_game": self.game_state["num_plays"],
+            self.home_team.name: self.generate_team_stats_summary(self.home_team.name, HOME),
+            self.away_team.name: self.generate_team_stats_summary(self.away_team.name, AWAY)
+        }
+
+    def generate_team_stats_summary(self, team_name: str, team_index: int) -> dict:
+        # Per-game columns matching GameEngine.generate_team_stats_summary
+        team_stats = {name: counts[team_index] for name, counts in self.team_stats.items()}
+        score = self.game_state["home_score"] if team_index == HOME else self.game_state["away_score"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "team": np.full(self.num_games, team_name),
+                "score": score,
+                "run_rate": np.round(team_stats["run_plays"] / team_stats["plays"], 2),
+                "pass_rate": np.round(team_stats["pass_plays"] / team_stats["plays"], 2),
+                "pass_cmp_rate": np.round(team_stats["pass_cmps"] / team_stats["pass_plays"], 2),
+                "pass_yards": team_stats["pass_yards"],
+                "passing_tds": team_stats["pass_tds"].astype(np.int64),
+                "sacks_allowed": team_stats["sacks"].astype(np.int64),
+                "pass_yards_per_play": np.round(team_stats["pass_yards"] / team_stats["pass_plays"], 2),
+                "rushing_attempts": team_stats["run_plays"].astype(np.int64),
+                "rushing_yards": team_stats["rush_yards"],
+                "rushing_tds": team_stats["rush_tds"].astype(np.int64),
+                "rush_yards_per_play": np.round(team_stats["rush_yards"] / team_stats["run_plays"], 2),
+                "total_turnovers": team_stats["turnovers"].astype(np.int64),
+                "fg_pct": np.where(team_stats["fg_attempts"] > 0,
+                                   np.round(100 * (team_stats["fg_makes"] / team_stats["fg_attempts"]), 2), np.nan)
+            }
@@ -0,0 +1,141 @@
+import argparse
+import joblib
+import numpy as np
+import pandas as pd
+
+fourth_down_feature_columns = ["game_seconds_remaining", "half_seconds_remaining", "ydstogo", "yardline_100", "score_differential"]
+
+default_grid_resolution = {
+    "time_step": 60,
+    "max_ydstogo": 15,
+    "yardline_step": 2,
+    "score_differential_step": 3,
+    "max_score_differential": 21,
+}
+
+# Grids are shared by every game model instance in the process that uses the same 4th down model and resolution
+grid_cache = {}
+
+class FourthDownGrid:
+    # Precomputed 4th down play calls of a 4th down model over a discretized grid of game situations.
+    # game_seconds_remaining and half_seconds_remaining are tied together within a game, so the time axes are
+    # (half of the game, half_seconds_remaining) and game_seconds_remaining is derived from them when evaluating the model.
+    def __init__(self, fourth_down_model: object, time_step=60, max_ydstogo=15, yardline_step=2,
+                 score_differential_step=3, max_score_differential=21):
+        if min(time_step, max_ydstogo, yardline_step, score_differential_step) < 1 or max_score_differential < 0:
+            raise ValueError("Invalid 4th down grid resolution")
+        self.time_step = time_step
+        self.max_ydstogo = max_ydstogo
+        self.yardline_step = yardline_step
+        self.score_differential_step = score_differential_step
+        self.max_score_differential = max_score_differential
+
+        self.half_seconds_values = np.arange(0, 1800 + time_step, time_step)
+        self.ydstogo_values = np.arange(1, max_ydstogo + 1)
+        self.yardline_values = np.arange(1, 100, yardline_step)
+        self.score_differential_values = np.arange(-max_score_differential, max_score_differential + 1, score_differential_step)
+        self.shape = (2, len(self.half_seconds_values), len(self.ydstogo_values), len(self.yardline_values), len(self.score_differential_values))
+        self.play_calls = self.evaluate_model(fourth_down_model)
+
+    def get_resolution(self) -> dict:
+        return {
+            "time_step": self.time_step,
+            "max_ydstogo": self.max_ydstogo,
+            "yardline_step": self.yardline_step,
+            "score_differential_step": self.score_differential_step,
+            "max_score_differential": self.max_score_differential,
+        }
+
+    def get_grid_features(self) -> pd.DataFrame:
+        half_idx, half_seconds_idx, ydstogo_idx, yardline_idx, score_idx = np.indices(self.shape).reshape(len(self.shape), -1)
+        half_seconds_remaining = self.half_seconds_values[half_seconds_idx]
+        return pd.DataFrame({
+            "game_seconds_remaining": half_seconds_remaining + 1800 * (half_idx == 0),
+            "half_seconds_remaining": half_seconds_remaining,
+            "ydstogo": self.ydstogo_values[ydstogo_idx],
+            "yardline_100": self.yardline_values[yardline_idx],
+            "score_differential": self.score_differential_values[score_idx],
+        }, columns=fourth_down_feature_columns)
+
+    def evaluate_model(self, fourth_down_model: object) -> np.ndarray:
+        predictions = fourth_down_model.predict(self.get_grid_features())
+        return np.asarray(predictions).astype(np.int16).reshape(self.shape)
+
+    def get_grid_indices(self, game_seconds_remaining, half_seconds_remaining, ydstogo, yardline_100, score_differential) -> tuple:
+        # Works for scalars as well as equally sized arrays of game situations
+        first_half = (np.asarray(game_seconds_remaining) - np.asarray(half_seconds_remaining)) > 900
+        half_idx = np.where(first_half, 0, 1)
+        half_seconds_idx = self.to_index(half_seconds_remaining, 0, self.time_step, len(self.half_seconds_values))
+        ydstogo_idx = self.to_index(ydstogo, 1, 1, len(self.ydstogo_values))
+        yardline_idx = self.to_index(yardline_100, 1, self.yardline_step, len(self.yardline_values))
+        score_idx = self.to_index(score_differential, -self.max_score_differential, self.score_differential_step,
+                                  len(self.score_differential_values))
+        return half_idx, half_seconds_idx, ydstogo_idx, yardline_idx, score_idx
+
+    def to_index(self, values, start: int, step: int, num_values: int):
+        return np.clip(np.rint((np.asarray(values) - start) / step), 0, num_values - 1).astype(np.int64)
+
+    def predict_one(self, game_seconds_remaining, half_seconds_remaining, ydstogo, yardline_100, score_differential) -> int:
+        # Scalar lookup that avoids NumPy call overhead for the per-play path
+        half_idx = 0 if game_seconds_remaining - half_seconds_remaining > 900 else 1
+        half_seconds_idx = min(max(int(round(half_seconds_remaining / self.time_step)), 0), self.shape[1] - 1)
+        ydstogo_idx = min(max(int(round(ydstogo - 1)), 0), self.shape[2] - 1)
+        yardline_idx = min(max(int(round((yardline_100 - 1) / self.yardline_step)), 0), self.shape[3] - 1)
+        score_idx = min(max(int(round((score_differential + self.max_score_differential) / self.score_differential_step)), 0), self.shape[4] - 1)
+        return int(self.play_calls[half_idx, half_seconds_idx, ydstogo_idx, yardline_idx, score_idx])
+
+    def predict(self, fourth_down_data) -> np.ndarray:
+        # Same interface as the underlying model's predict() for a DataFrame or dict of feature columns
+        return self.play_calls[self.get_grid_indices(*[fourth_down_data[column] for column in fourth_down_feature_columns])]
+
+def get_fourth_down_grid(model_path: str, fourth_down_model: object, grid_resolution=None) -> FourthDownGrid:
+    resolution = dict(default_grid_resolution)
+    if grid_resolution:
+        resolution.update(grid_resolution)
+    cache_key = (model_path, tuple(sorted(resolution.items())))
+    if cache_key not in grid_cache:
+        grid_cache[cache_key] = FourthDownGrid(fourth_down_model, **resolution)
+    return grid_cache[cache_key]
+
+def sample_fourth_down_situations(num_samples: int, rng: np.random.Generator) -> pd.DataFrame:
+    quarter = rng.integers(1, 5, num_samples)
+    quarter_seconds_remaining = rng.integers(0, 901, num_samples)
+    half_seconds_remaining = np.where((quarter == 1) | (quarter == 3), quarter_seconds_remaining + 900, quarter_seconds_remaining)
+    return pd.DataFrame({
+        "game_seconds_remaining": (4 - quarter) * 900 + quarter_seconds_remaining,
+        "half_seconds_remaining": half_seconds_remaining,
+        "ydstogo": rng.integers(1, 21, num_samples),
+        "yardline_100": rng.integers(1, 100, num_samples),
+        "score_differential": rng.integers(-28, 29, num_samples),
+    }, columns=fourth_down_feature_columns)
+
+def measure_grid_disagreement(fourth_down_model: object, grid: FourthDownGrid, num_samples=20000, seed=None) -> dict:
+    # Compares the grid against the raw model over randomly sampled 4th down situations
+    situations = sample_fourth_down_situations(num_samples, np.random.default_rng(seed))
+    model_predictions = np.asarray(fourth_down_model.predict(situations))
+    grid_predictions = grid.predict(situations)
+    disagreements = model_predictions != grid_predictions
+    in_range = (situations["ydstogo"] <= grid.max_ydstogo) & (situations["score_differential"].abs() <= grid.max_score_differential)
+    return {
+        "resolution": grid.get_resolution(),
+        "grid_size": int(grid.play_calls.size),
+        "num_samples": num_samples,
+        "disagreement_rate": round(float(disagreements.mean()), 4),
+        "in_range_disagreement_rate": round(float(disagreements[in_range.to_numpy()].mean()), 4),
+        "disagreements_by_model_prediction": {
+            int(prediction): int(disagreements[model_predictions == prediction].sum()) for prediction in np.unique(model_predictions)
+        },
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how often a precomputed 4th down grid disagrees with the raw model")
+    parser.add_argument("--model", default="game_models/v2a_4th_down_playcall_model.pkl")
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=None)
+    for resolution_name, default_value in default_grid_resolution.items():
+        parser.add_argument(f"--{resolution_name.replace('_', '-')}", type=int, default=default_value)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    fourth_down_grid = FourthDownGrid(model, **{name: getattr(args, name) for name in default_grid_resolution})
+    print(measure_grid_disagreement(model, fourth_down_grid, args.samples, args.seed))
@@ -1,203 +1,242 @@
-import pandas as pd
+import csv
+import math
+import numpy as np
 from GameModels import PrototypeGameModel, GameModel_V1
+from GameState import GameState, PlayResult, TeamStatsAccumulator
+from PlayLog import PlayLog
+from time import perf_counter
+import instrumentation
+
+# "off" only keeps the final score, "summary" adds the team stats and "full" also keeps the play log
+log_modes = ["off", "summary", "full"]
 
 class GameEngine:
-    def __init__(self, home_team: object, away_team:object, game_model=PrototypeGameModel()):
+    def __init__(self, home_team: object, away_team:object, game_model=PrototypeGameModel(), rng=None):
         self.home_team = home_team
         self.away_team = away_team
         self.game_state = self._initialize_game_state()
         self.game_model = game_model
+        # All of the play outcome draws made by the game model come from this Generator
+        self.rng = rng if rng is not None else np.random.default_rng()
         home_team.setup_teams_for_game_model(game_model.get_model_code())
         away_team.setup_teams_for_game_model(game_model.get_model_code())
 
-    def _initialize_game_state(self) -> dict:
-        return {
-            "quarter": 1,
-            "game_seconds_remaining": 3600,
-            "quarter_seconds_remaining": 900, 
-            "possession_team": self.home_team, 
-            "defense_team": self.away_team,
-            "yardline": 75, 
-            "down": 1,
-            "distance": 10,
-            "score": {self.home_team.name: 0, self.away_team.name: 0},
-            "play_log": [],
-        }
-
-    def simulate_play(self) -> dict:
-        play_result = self.game_model.resolve_play(self.game_state)
-        play_result["game_seconds_remaining"] = self.game_state["game_seconds_remaining"]
-        play_result["yardline"] = self.game_state["yardline"]
-        play_result["down"] = self.game_state["down"]
-        play_result["distance"] = self.game_state["distance"]
-        play_result["score"] = self.game_state["score"].copy()
-        play_result["posteam_score"] = self.game_state["score"][self.game_state["possession_team"].name]
+    def _initialize_game_state(self) -> GameState:
+        return GameState(self.home_team, self.away_team)
+
+    def simulate_play(self) -> PlayResult:
+        game_state = self.game_state
+        play_result = self.game_model.resolve_play(game_state, self.rng)
+        play_result.game_seconds_remaining = game_state.game_seconds_remaining
+        play_result.yardline = game_state.yardline
+        play_result.down = game_state.down
+        play_result.distance = game_state.distance
+        play_result.home_score = game_state.home_score
+        play_result.away_score = game_state.away_score
+        play_result.posteam_score = game_state.get_score(game_state.possession_team)
         return play_result
 
-    def update_game_state(self, play_result: dict) -> bool:
+    def update_game_state(self, play_result: PlayResult) -> bool:
         # Update game state based on play result
         # Update yardline, down, distance, score, time remaining, etc.
         # Append play result to play log
-        self.game_state["quarter_seconds_remaining"] -= play_result["time_elapsed"]
-        self.game_state["game_seconds_remaining"] -= play_result["time_elapsed"]
+        game_state = self.game_state
+        offense_team_stats = game_state.get_team_stats(game_state.possession_team)
+        game_state.quarter_seconds_remaining -= play_result.time_elapsed
+        game_state.game_seconds_remaining -= play_result.time_elapsed
 
-        if (play_result["turnover"]):
+        if (play_result.turnover):
             self.simulate_turnover()
-        elif (play_result["play_type"] == "punt"):
+        elif (play_result.play_type == "punt"):
             self.simulate_punt(play_result)
-        elif (play_result["play_type"] == "field_goal"):
+        elif (play_result.play_type == "field_goal"):
             self.simulate_field_goal(play_result)
         else:
-            self.game_state["yardline"] -= play_result["yards_gained"]
+            game_state.yardline -= play_result.yards_gained
 
-            if (play_result["yards_gained"] >= self.game_state["distance"]): # Gained a first down
-                self.game_state["down"] = 1
-                self.game_state["distance"] = 10
-            elif (play_result["yards_gained"] < self.game_state["distance"] and self.game_state["down"] == 4): # Turnover on downs
+            if (play_result.yards_gained >= game_state.distance): # Gained a first down
+                game_state.down = 1
+                game_state.distance = 10
+            elif (play_result.yards_gained < game_state.distance and game_state.down == 4): # Turnover on downs
                 self.switch_possession()
             else:
-                self.game_state["down"] += 1
-                self.game_state["distance"] -= play_result["yards_gained"]
+                game_state.down += 1
+                game_state.distance -= play_result.yards_gained
 
-            if (self.game_state["yardline"] <= 0): # Touchdown
-                self.game_state["score"][self.game_state["possession_team"].name] += 7
+            if (game_state.yardline <= 0): # Touchdown
+                game_state.add_score(game_state.possession_team, 7)
                 self.switch_possession()
-                self.game_state["yardline"] = 75
-                self.game_state["down"] = 1
-                self.game_state["distance"] = 10
-                play_result["touchdown"] = True
-            elif (self.game_state["yardline"] > 100): # Safety
-                self.game_state["score"][self.game_state["defense_team"].name] += 2
+                game_state.yardline = 75
+                game_state.down = 1
+                game_state.distance = 10
+                play_result.touchdown = True
+            elif (game_state.yardline > 100): # Safety
+                game_state.add_score(game_state.defense_team, 2)
                 self.switch_possession()
-                self.game_state["yardline"] = 60 # Since free kicks typically don't travel as far as kickoffs
-                self.game_state["down"] = 1
-                self.game_state["distance"] = 10
-
-        self.game_state["play_log"].append(play_result)
-
-        if (self.game_state["quarter_seconds_remaining"] <= 0 and self.game_state["quarter"] not in [2, 4]):
-            self.game_state["quarter"] += 1
-            self.game_state["quarter_seconds_remaining"] = 900
+                game_state.yardline = 60 # Since free kicks typically don't travel as far as kickoffs
+                game_state.down = 1
+                game_state.distance = 10
+
+        offense_team_stats.record_play(play_result)
+        game_state.num_plays += 1
+        if (game_state.play_log is not None):
+            game_state.play_log.append(play_result)
+
+        if (game_state.quarter_seconds_remaining <= 0 and game_state.quarter not in [2, 4]):
+            game_state.quarter += 1
+            game_state.quarter_seconds_remaining = 900
             return False
-        elif (self.game_state["quarter_seconds_remaining"] <= 0 and self.game_state["quarter"] == 2):
+        elif (game_state.quarter_seconds_remaining <= 0 and game_state.quarter == 2):
             self.handle_halftime()
             return False
-        elif (self.game_state["quarter_seconds_remaining"] <= 0 and self.game_state["quarter"] == 4):
-            self.game_state["play_log"].append(play_result)
+        elif (game_state.quarter_seconds_remaining <= 0 and game_state.quarter == 4):
             return True
     
     def simulate_turnover(self):
         self.switch_possession()
-        self.game_state["yardline"] = 100 - self.game_state["yardline"]
-        self.game_state["down"] = 1
-        self.game_state["distance"] = 10
+        self.game_state.yardline = 100 - self.game_state.yardline
+        self.game_state.down = 1
+        self.game_state.distance = 10
 
-    def simulate_punt(self, play_result: dict):
+    def simulate_punt(self, play_result: PlayResult):
         self.switch_possession()
-        self.game_state["yardline"] -= play_result["yards_gained"]
-        if (self.game_state["yardline"] < 0): # Handle touchbacks
-            self.game_state["yardline"] = 25
-        self.game_state["yardline"] = 100 - self.game_state["yardline"]
-        self.game_state["down"] = 1
-        self.game_state["distance"] = 10
-
-    def simulate_field_goal(self, play_result: dict):
-        if (play_result["field_goal_made"]):
-            self.game_state["score"][self.game_state["possession_team"].name] += 3
+        self.game_state.yardline -= play_result.yards_gained
+        if (self.game_state.yardline < 0): # Handle touchbacks
+            self.game_state.yardline = 25
+        self.game_state.yardline = 100 - self.game_state.yardline
+        self.game_state.down = 1
+        self.game_state.distance = 10
+
+    def simulate_field_goal(self, play_result: PlayResult):
+        if (play_result.field_goal_made):
+            self.game_state.add_score(self.game_state.possession_team, 3)
         self.switch_possession()
-        self.game_state["yardline"] = 75
-        self.game_state["down"] = 1
-        self.game_state["distance"] = 10
+        self.game_state.yardline = 75
+        self.game_state.down = 1
+        self.game_state.distance = 10
 
     def switch_possession(self):
-        if (self.game_state["possession_team"] == self.home_team):
-            self.game_state["possession_team"] = self.away_team
-            self.game_state["defense_team"] = self.home_team
+        if (self.game_state.possession_team == self.home_team):
+            self.game_state.possession_team = self.away_team
+            self.game_state.defense_team = self.home_team
         else:
-            self.game_state["possession_team"] = self.home_team
-            self.game_state["defense_team"] = self.away_team
+            self.game_state.possession_team = self.home_team
+            self.game_state.defense_team = self.away_team
     
     def handle_halftime(self):
-        self.game_state["quarter"] += 1
-        self.game_state["quarter_seconds_remaining"] = 900
-        self.game_state["possession_team"] = self.away_team
-        self.game_state["defense_team"] = self.home_team
-        self.game_state["yardline"] = 75
-        self.game_state["down"] = 1
-        self.game_state["distance"] = 10
+        self.game_state.quarter += 1
+        self.game_state.quarter_seconds_remaining = 900
+        self.game_state.possession_team = self.away_team
+        self.game_state.defense_team = self.home_team
+        self.game_state.yardline = 75
+        self.game_state.down = 1
+        self.game_state.distance = 10
     
-    def run_simulation(self, test_mode=False) -> dict:
+    def run_simulation(self, test_mode=False, log_mode="full") -> dict:
+        if log_mode not in log_modes:
+            raise ValueError(f"Invalid log mode: {log_mode}")
+        self.game_state.play_log = PlayLog(self.home_team.name, self.away_team.name) if log_mode == "full" else None
+        if instrumentation.enabled:
+            return self.run_instrumented_simulation(test_mode, log_mode)
+
         while True:
             play_result = self.simulate_play()
             game_over = self.update_game_state(play_result)
             if game_over:
                 break
-        return self.get_game_summary(test_mode)
-
-    def get_game_summary(self, test_mode: bool) -> dict:
-        # create play log dataframe and save it to a csv file
-        play_log_df = pd.DataFrame(self.game_state["play_log"])
-
-        home_team_df = play_log_df[play_log_df["posteam"] == self.home_team.name]
-        away_team_df = play_log_df[play_log_df["posteam"] == self.away_team.name]
+        return self.get_game_summary(test_mode, log_mode)
 
+    def run_instrumented_simulation(self, test_mode: bool, log_mode: str) -> dict:
+        # Same loop as run_simulation with the time spent in each phase added up and recorded once per game
+        resolve_play_seconds = 0.0
+        update_game_state_seconds = 0.0
+        num_plays = 0
+        while True:
+            phase_start = perf_counter()
+            play_result = self.simulate_play()
+            phase_end = perf_counter()
+            game_over = self.update_game_state(play_result)
+            resolve_play_seconds += phase_end - phase_start
+            update_game_state_seconds += perf_counter() - phase_end
+            num_plays += 1
+            if game_over:
+                break
+        instrumentation.record("resolve_play", resolve_play_seconds, num_plays)
+        instrumentation.record("update_game_state", update_game_state_seconds, num_plays)
+        with instrumentation.timed("get_game_summary"):
+            return self.get_game_summary(test_mode, log_mode)
+
+    def get_play_log_dicts(self) -> list:
+        play_log = self.game_state.play_log
+        if isinstance(play_log, PlayLog):
+            return play_log.to_dicts()
+        return [play_result.to_dict(self.home_team.name, self.away_team.name) for play_result in play_log]
+
+    def get_game_summary(self, test_mode: bool, log_mode="full") -> dict:
         game_summary_dict = {
-            "final_score": self.game_state["score"],
-            "num_plays_in_game": len(self.game_state["play_log"]),
-            "play_log": self.game_state["play_log"],
-            self.home_team.name: self.generate_team_stats_summary(self.home_team.name, home_team_df),
-            self.away_team.name: self.generate_team_stats_summary(self.away_team.name, away_team_df)
+            "final_score": self.game_state.score,
+            "num_plays_in_game": self.game_state.num_plays,
         }
-
-        if (not test_mode):
-            play_log_df.to_csv("logs/play_log.csv", index=True)
-            home_team_stats_df = pd.DataFrame([game_summary_dict[self.home_team.name]])
-            away_team_stats_df = pd.DataFrame([game_summary_dict[self.away_team.name]])
-            team_stats_df = pd.concat([home_team_stats_df, away_team_stats_df])
-            team_stats_df.to_csv("logs/team_stats.csv", index=False)
+        if (log_mode == "off"):
+            return game_summary_dict
+
+        game_summary_dict[self.home_team.name] = self.generate_team_stats_summary(self.home_team)
+        game_summary_dict[self.away_team.name] = self.generate_team_stats_summary(self.away_team)
+        if (log_mode == "full"):
+            play_log = self.get_play_log_dicts()
+            game_summary_dict["play_log"] = play_log
+            # Per-game csv files are only written when the full play log was kept
+            if (not test_mode):
+                self.write_game_logs(play_log, [game_summary_dict[self.home_team.name], game_summary_dict[self.away_team.name]])
 
         return game_summary_dict
-    
-    def generate_team_stats_summary(self, team_name: str, team_df: pd.DataFrame) -> dict:
-        team_run_df = team_df[team_df["play_type"] == "run"]
-        team_pass_df = team_df[team_df["play_type"] == "pass"]
-        team_fg_df = team_df[team_df["play_type"] == "field_goal"]
-        total_plays = team_df["play_type"].count()
-        total_run_plays = team_run_df["play_type"].count()
-        team_rush_yards = team_run_df["yards_gained"].sum()
-        team_rush_tds = team_run_df[team_run_df["touchdown"] == True]["touchdown"].count()
-        total_pass_plays = team_pass_df["play_type"].count()
-        team_pass_cmps = team_pass_df[team_pass_df["yards_gained"] > 0]["yards_gained"].count()
-        team_pass_yards = team_pass_df["yards_gained"].sum()
-        team_pass_tds = team_pass_df[team_pass_df["touchdown"] == True]["touchdown"].count()
-        team_total_turnovers = team_df[team_df["turnover"] == True]["turnover"].count()
-        team_total_sacks = team_pass_df[team_pass_df["yards_gained"] < 0]["yards_gained"].count()
-        team_fg_attempts = team_fg_df["play_type"].count()
-        team_fg_makes = team_fg_df[team_fg_df["field_goal_made"] == True]["field_goal_made"].count()
-
-        run_rate = round(total_run_plays / total_plays, 2)
-        pass_rate = round(total_pass_plays / total_plays, 2)
-        pass_cmp_rate = round(team_pass_cmps / total_pass_plays, 2)
-        rush_yards_per_play = round(team_rush_yards / total_run_plays, 2)
-        pass_yards_per_play = round(team_pass_yards / total_pass_plays, 2)
+
+    def write_game_logs(self, play_log: list, team_stats: list) -> None:
+        # Save the play log and team stats to csv files (the play log keeps a leading index column)
+        if play_log:
+            with open("logs/play_log.csv", "w", newline="") as play_log_file:
+                writer = csv.writer(play_log_file)
+                writer.writerow([""] + list(play_log[0].keys()))
+                for i, play in enumerate(play_log):
+                    writer.writerow([i] + list(play.values()))
+
+        with open("logs/team_stats.csv", "w", newline="") as team_stats_file:
+            writer = csv.DictWriter(team_stats_file, fieldnames=list(team_stats[0].keys()))
+            writer.writeheader()
+            writer.writerows(team_stats)
+
+    def generate_team_stats_summary(self, team: object) -> dict:
+        team_stats: TeamStatsAccumulator = self.game_state.get_team_stats(team)
+
+        run_rate = get_rounded_ratio(team_stats.run_plays, team_stats.plays)
+        pass_rate = get_rounded_ratio(team_stats.pass_plays, team_stats.plays)
+        pass_cmp_rate = get_rounded_ratio(team_stats.pass_cmps, team_stats.pass_plays)
+        rush_yards_per_play = get_rounded_ratio(team_stats.rush_yards, team_stats.run_plays)
+        pass_yards_per_play = get_rounded_ratio(team_stats.pass_yards, team_stats.pass_plays)
         fg_pct = None
-        if (team_fg_attempts > 0):
-            fg_pct = round(100 * (team_fg_makes / team_fg_attempts), 2)
+        if (team_stats.fg_attempts > 0):
+            fg_pct = round(100 * (team_stats.fg_makes / team_stats.fg_attempts), 2)
 
         return {
-            "team": team_df["posteam"].iloc[0],
-            "score": self.game_state["score"][team_name],
+            "team": team.name,
+            "score": self.game_state.get_score(team),
             "run_rate": run_rate,
             "pass_rate": pass_rate,
             "pass_cmp_rate": pass_cmp_rate,
-            "pass_yards": team_pass_yards,
-            "passing_tds": team_pass_tds,
-            "sacks_allowed": team_total_sacks,
+            "pass_yards": team_stats.pass_yards,
+            "passing_tds": team_stats.pass_tds,
+            "sacks_allowed": team_stats.sacks,
             "pass_yards_per_play": pass_yards_per_play,
-            "rushing_attempts": total_run_plays,
-            "rushing_yards": team_rush_yards,
-            "rushing_tds": team_rush_tds,
+            "rushing_attempts": team_stats.run_plays,
+            "rushing_yards": team_stats.rush_yards,
+            "rushing_tds": team_stats.rush_tds,
             "rush_yards_per_play": rush_yards_per_play,
-            "total_turnovers": team_total_turnovers,
+            "total_turnovers": team_stats.turnovers,
             "fg_pct": fg_pct
-        }
\ No newline at end of file
+        }
+
+def get_rounded_ratio(numerator, denominator) -> float:
+    # Rates over play types a team never ran are reported as NaN
+    if denominator == 0:
+        return math.nan
+    return round(numerator / denominator, 2)
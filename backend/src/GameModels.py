@@ -1,23 +1,159 @@
 from abc import ABC, abstractmethod
-from functools import lru_cache
-import random
 import joblib
+import numpy as np
 import pandas as pd
+from FourthDownGrid import get_fourth_down_grid
+from GameState import GameState, PlayResult
+import instrumentation
+
+# Integer play type codes used by the batch (vectorized) simulation mode
+RUN_PLAY = 0
+PASS_PLAY = 1
+PUNT_PLAY = 2
+FIELD_GOAL_PLAY = 3
+play_type_codes = {"run": RUN_PLAY, "pass": PASS_PLAY, "punt": PUNT_PLAY, "field_goal": FIELD_GOAL_PLAY}
+
+class MatchupContext:
+    # The rates of an offense against a defense that are the same on every play, weighted once per matchup and game model
+    # so that resolving a play only reads fields instead of looking up and reweighting team stats
+    def __init__(self, offense, defense, off_weight: float, turnover_rate_factor=1.0):
+        self.offense_stats = offense.stats
+        self.defense_stats = defense.stats
+        self.off_weight = off_weight
+        self.def_weight = 1 - off_weight
+
+        # Probabilities of calling a run, compared against a uniform draw. Go-for-it calls on 4th down weigh the offense's
+        # run rate against the defense's pass rate.
+        run_rate = offense.get_stat("run_rate")
+        self.run_probability = run_rate / (run_rate + offense.get_stat("pass_rate"))
+        self.go_for_it_run_probability = run_rate / (run_rate + defense.get_stat("pass_rate"))
+        self.field_goal_success_rate = offense.get_stat("field_goal_success_rate")
+
+        self.rush_yards_per_carry = self.get_weighted_stat(offense, defense, "rush_yards_per_carry", "rush_yards_per_carry_allowed")
+        self.yards_per_completion = self.get_weighted_stat(offense, defense, "yards_per_completion", "yards_allowed_per_completion")
+        self.yac_per_completion = self.get_weighted_stat(offense, defense, "off_yac_per_completion", "def_yac_per_completion")
+        self.pass_completion_rate = self.get_weighted_average(offense.get_stat("pass_completion_rate") / 100,
+                                                             defense.get_stat("pass_completion_rate_allowed") / 100)
+        self.turnover_rate = turnover_rate_factor * self.get_weighted_stat(offense, defense, "turnover_rate", "forced_turnover_rate")
+        self.sack_rate = self.get_weighted_stat(offense, defense, "sacks_allowed_rate", "sacks_made_rate")
+        self.sack_yards = self.get_weighted_stat(offense, defense, "sack_yards_allowed", "sack_yards_inflicted")
+
+    def get_weighted_average(self, off_stat, def_stat):
+        return (off_stat * self.off_weight) + (def_stat * self.def_weight)
+
+    def get_weighted_stat(self, offense, defense, off_stat_name: str, def_stat_name: str):
+        return self.get_weighted_average(offense.get_stat(off_stat_name), defense.get_stat(def_stat_name))
 
 class AbstractGameModel(ABC):
+    # Scales the weighted turnover rate of every play
+    turnover_rate_factor = 1.0
 
     def __init__(self, off_weight=0.55):
         self.off_weight = off_weight
         self.def_weight = 1 - off_weight
 
     @abstractmethod
-    def resolve_play(self, game_state: dict) -> dict:
+    def resolve_play(self, game_state: GameState, rng: np.random.Generator) -> PlayResult:
+        pass
+
+    # Scalar draws from the Generator that is passed in by the GameEngine. These are cheaper than random.choices on
+    # two-element lists and give the same outcome probabilities.
+    def random_bool(self, rng: np.random.Generator, probability) -> bool:
+        return rng.random() < probability
+
+    def random_int(self, rng: np.random.Generator, low: int, high: int) -> int:
+        # Inclusive of high, like random.randint
+        return low + int(rng.random() * (high - low + 1))
+
+    def choose_run_or_pass(self, rng: np.random.Generator, run_probability) -> str:
+        return "run" if rng.random() < run_probability else "pass"
+
+    def get_matchup_context(self, offense, defense) -> MatchupContext:
+        # Contexts are kept on the offense's Team (so they go away along with it) and are rebuilt if either team's stats were replaced
+        matchup_key = (defense.name, self.get_model_code(), self.off_weight)
+        matchup_context = offense.matchup_contexts.get(matchup_key)
+        if matchup_context is None or matchup_context.offense_stats is not offense.stats or matchup_context.defense_stats is not defense.stats:
+            matchup_context = MatchupContext(offense, defense, self.off_weight, self.turnover_rate_factor)
+            offense.matchup_contexts[matchup_key] = matchup_context
+        return matchup_context
+
+    def warm_up(self) -> None:
+        pass
+
+    @abstractmethod
+    def resolve_play_batch(self, game_state: dict, rng: np.random.Generator) -> dict:
         pass
 
-    @lru_cache(maxsize=1000)
     def get_weighted_average(self, off_stat, def_stat):
         return (off_stat * self.off_weight) + (def_stat * self.def_weight)
 
+    # Helpers for the batch simulation mode. Batch game states hold one array entry per game
+    # and "home_has_possession" decides which team's stats apply to each entry.
+    def get_batch_weighted_average(self, off_stats: np.ndarray, def_stats: np.ndarray) -> np.ndarray:
+        return (off_stats * self.off_weight) + (def_stats * self.def_weight)
+
+    def get_batch_substate(self, game_state: dict, mask: np.ndarray) -> dict:
+        return {key: value[mask] if isinstance(value, np.ndarray) else value for key, value in game_state.items()}
+
+    def get_batch_matchup_value(self, game_state: dict, field: str) -> np.ndarray:
+        # Picks a field of the home or away team's matchup context depending on which team has the ball
+        home_value = getattr(self.get_matchup_context(game_state["home_team"], game_state["away_team"]), field)
+        away_value = getattr(self.get_matchup_context(game_state["away_team"], game_state["home_team"]), field)
+        return np.where(game_state["home_has_possession"], home_value, away_value)
+
+    def sample_batch(self, game_state: dict, mask: np.ndarray, off_sample_method: str, def_sample_method: str) -> np.ndarray:
+        # Returns the weighted offense/defense samples for the games selected by mask
+        home_ball = game_state["home_has_possession"][mask]
+        num_home_ball = int(np.count_nonzero(home_ball))
+        num_away_ball = home_ball.size - num_home_ball
+        home_team = game_state["home_team"]
+        away_team = game_state["away_team"]
+
+        off_samples = np.empty(home_ball.size)
+        def_samples = np.empty(home_ball.size)
+        if num_home_ball > 0:
+            off_samples[home_ball] = getattr(home_team, off_sample_method)(size=num_home_ball)
+            def_samples[home_ball] = getattr(away_team, def_sample_method)(size=num_home_ball)
+        if num_away_ball > 0:
+            off_samples[~home_ball] = getattr(away_team, off_sample_method)(size=num_away_ball)
+            def_samples[~home_ball] = getattr(home_team, def_sample_method)(size=num_away_ball)
+        return self.get_batch_weighted_average(off_samples, def_samples)
+
+    def choose_run_or_pass_batch(self, game_state: dict, rng: np.random.Generator, run_probabilities=None) -> np.ndarray:
+        # Same weighting as choose_run_or_pass
+        if run_probabilities is None:
+            run_probabilities = self.get_batch_matchup_value(game_state, "run_probability")
+        is_run = rng.random(run_probabilities.size) < run_probabilities
+        return np.where(is_run, RUN_PLAY, PASS_PLAY).astype(np.int8)
+
+    def resolve_special_teams_batch(self, game_state: dict, rng: np.random.Generator, play_type: np.ndarray,
+                                    yards_gained: np.ndarray, turnover: np.ndarray, punt_yards: np.ndarray) -> dict:
+        punt = play_type == PUNT_PLAY
+        field_goal = play_type == FIELD_GOAL_PLAY
+        fg_success_rate = self.get_batch_matchup_value(game_state, "field_goal_success_rate")
+        field_goal_made = field_goal & (rng.random(play_type.size) < fg_success_rate)
+        yards_gained = np.where(punt, punt_yards, np.where(field_goal, 0, yards_gained))
+        turnover = turnover & ~(punt | field_goal)
+        return {
+            "play_type": play_type,
+            "field_goal_made": field_goal_made,
+            "yards_gained": yards_gained,
+            "turnover": turnover,
+        }
+
+    def resolve_turnovers_and_sacks_batch(self, game_state: dict, rng: np.random.Generator, play_type: np.ndarray,
+                                          yards_gained: np.ndarray) -> tuple:
+        num_plays = play_type.size
+        weighted_turnover_rate = self.get_batch_matchup_value(game_state, "turnover_rate")
+        turnover_on_play = rng.random(num_plays) < weighted_turnover_rate
+        yards_gained = np.where(turnover_on_play, 0, yards_gained)
+
+        weighted_sack_rate = self.get_batch_matchup_value(game_state, "sack_rate")
+        sack_on_play = (rng.random(num_plays) < weighted_sack_rate) & (play_type == PASS_PLAY)
+        yards_lost_on_sack = self.get_batch_matchup_value(game_state, "sack_yards")
+        yards_gained = np.where(sack_on_play, yards_lost_on_sack, yards_gained)
+        return yards_gained, turnover_on_play
+
 class PrototypeGameModel(AbstractGameModel):
 
     def __init__(self, off_weight=0.55):
@@ -26,100 +162,110 @@ class PrototypeGameModel(AbstractGameModel):
     def get_model_code(self) -> str:
         return "proto"
 
-    def resolve_play(self, game_state: dict) -> dict:
-        posteam = game_state["possession_team"]
-        defteam = game_state["defense_team"]
+    def resolve_play(self, game_state: GameState, rng: np.random.Generator) -> PlayResult:
+        posteam = game_state.possession_team
+        defteam = game_state.defense_team
+        matchup_context = self.get_matchup_context(posteam, defteam)
 
-        time_elapsed = random.randint(15,40)
+        time_elapsed = self.random_int(rng, 15, 40)
 
         # Handle 4th down scenarios
-        if game_state["down"] == 4 and game_state["yardline"] > 55:
-            return {
-                "play_type": "punt", 
-                "field_goal_made": None,
-                "yards_gained": 40,
-                "time_elapsed": time_elapsed, 
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
-        elif game_state["down"] == 4 and game_state["yardline"] <= 45:
-            fg_success_rate = posteam.get_stat("field_goal_success_rate")
-            return {
-                "play_type": "field_goal", 
-                "field_goal_made": random.choices([True, False], [fg_success_rate, 1 - fg_success_rate])[0],
-                "yards_gained": 0,
-                "time_elapsed": time_elapsed,
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],  
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
+        if game_state.down == 4 and game_state.yardline > 55:
+            return PlayResult(
+                play_type="punt",
+                field_goal_made=None,
+                yards_gained=40,
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
+        elif game_state.down == 4 and game_state.yardline <= 45:
+            return PlayResult(
+                play_type="field_goal",
+                field_goal_made=self.random_bool(rng, matchup_context.field_goal_success_rate),
+                yards_gained=0,
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
         
         # If not 4th down, run normal simulation logic
-        play_type = random.choices(['run', 'pass'], [posteam.get_stat("run_rate"), posteam.get_stat("pass_rate")])[0]
+        play_type = self.choose_run_or_pass(rng, matchup_context.run_probability)
 
-        off_yards_per_play = None
-        def_yards_per_play = None
         if (play_type == "run"):
-            off_yards_per_play = posteam.get_stat("rush_yards_per_carry")
-            def_yards_per_play = defteam.get_stat("rush_yards_per_carry_allowed")
+            weighted_yards_per_play = matchup_context.rush_yards_per_carry
         else:
-            off_yards_per_play = posteam.get_stat("yards_per_completion")
-            def_yards_per_play = defteam.get_stat("yards_allowed_per_completion")
-        
-        weighted_yards_per_play = self.get_weighted_average(off_yards_per_play, def_yards_per_play)
+            weighted_yards_per_play = matchup_context.yards_per_completion
 
         if (play_type == "pass"):
-            off_pass_cmp_rate = posteam.get_stat("pass_completion_rate") / 100
-            def_pass_cmp_rate = defteam.get_stat("pass_completion_rate_allowed") / 100
-            weighted_pass_cmp_rate = self.get_weighted_average(off_pass_cmp_rate, def_pass_cmp_rate)
-            pass_completed = random.choices([True, False], [weighted_pass_cmp_rate, 1 - weighted_pass_cmp_rate])[0]
+            pass_completed = self.random_bool(rng, matchup_context.pass_completion_rate)
             if (not pass_completed):
                weighted_yards_per_play = 0 
 
-        off_turnover_rate = posteam.get_stat("turnover_rate")
-        def_turnover_rate = defteam.get_stat("forced_turnover_rate")
-        weighted_turnover_rate = self.get_weighted_average(off_turnover_rate, def_turnover_rate)
-        turnover_on_play = random.choices([True, False], [weighted_turnover_rate, 1 - weighted_turnover_rate])[0]
+        turnover_on_play = self.random_bool(rng, matchup_context.turnover_rate)
 
         if (not turnover_on_play):
             yards_gained = weighted_yards_per_play
         else:
             yards_gained = 0
 
-        off_sack_rate = posteam.get_stat("sacks_allowed_rate")
-        def_sack_rate = defteam.get_stat("sacks_made_rate")
-        weighted_sack_rate = self.get_weighted_average(off_sack_rate, def_sack_rate)
-        sack_on_play = random.choices([True, False], [weighted_sack_rate, 1 - weighted_sack_rate])[0]
+        sack_on_play = self.random_bool(rng, matchup_context.sack_rate)
 
         if (sack_on_play and play_type == "pass"):
-            off_yards_lost_per_sack = posteam.get_stat("sack_yards_allowed")
-            def_yards_inflicted_per_sack = defteam.get_stat("sack_yards_inflicted")
-            yards_lost_on_sack = self.get_weighted_average(off_yards_lost_per_sack, def_yards_inflicted_per_sack)
-            yards_gained = yards_lost_on_sack
-
-        return {
-            "play_type": play_type, 
-            "field_goal_made": None,
-            "yards_gained": yards_gained,
-            "time_elapsed": time_elapsed,
-            "quarter": game_state["quarter"],
-            "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-            "turnover": turnover_on_play,
-            "touchdown": False, # This will be updated after the play is processed in update_game_state
-            "posteam": posteam.name
-        }
+            yards_gained = matchup_context.sack_yards
+
+        return PlayResult(
+            play_type=play_type,
+            field_goal_made=None,
+            yards_gained=yards_gained,
+            time_elapsed=time_elapsed,
+            quarter=game_state.quarter,
+            quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+            turnover=turnover_on_play,
+            touchdown=False, # This will be updated after the play is processed in update_game_state
+            posteam=posteam.name
+        )
+
+    def resolve_play_batch(self, game_state: dict, rng: np.random.Generator) -> dict:
+        num_plays = game_state["down"].size
+        time_elapsed = rng.integers(15, 41, num_plays)
+
+        # Handle 4th down scenarios the same way as resolve_play
+        play_type = self.choose_run_or_pass_batch(game_state, rng)
+        fourth_down = game_state["down"] == 4
+        play_type[fourth_down & (game_state["yardline"] > 55)] = PUNT_PLAY
+        play_type[fourth_down & (game_state["yardline"] <= 45)] = FIELD_GOAL_PLAY
+
+        run_yards = self.get_batch_matchup_value(game_state, "rush_yards_per_carry")
+        pass_yards = self.get_batch_matchup_value(game_state, "yards_per_completion")
+        weighted_pass_cmp_rate = self.get_batch_matchup_value(game_state, "pass_completion_rate")
+        pass_completed = rng.random(num_plays) < weighted_pass_cmp_rate
+        yards_gained = np.where(play_type == RUN_PLAY, run_yards, np.where(pass_completed, pass_yards, 0))
+
+        yards_gained, turnover_on_play = self.resolve_turnovers_and_sacks_batch(game_state, rng, play_type, yards_gained)
+        play_result = self.resolve_special_teams_batch(game_state, rng, play_type, yards_gained, turnover_on_play, 40)
+        play_result["time_elapsed"] = time_elapsed
+        return play_result
     
 class GameModel_V1(AbstractGameModel):
-    
-    def __init__(self, off_weight=0.65):
-        self.fourth_down_model = joblib.load("game_models/v1_4th_down_playcall_model.pkl")
+    turnover_rate_factor = 0.45
+
+    def __init__(self, off_weight=0.65, use_fourth_down_grid=True, fourth_down_grid_resolution=None):
+        self.fourth_down_model_path = "game_models/v1_4th_down_playcall_model.pkl"
+        self.fourth_down_model = joblib.load(self.fourth_down_model_path)
         self.fourth_down_model_column_mapping = { 0: "run", 1: "pass",
                                                 2: "punt", 3: "field_goal" }
+        # When enabled, 4th down play calls are looked up from a grid of precomputed model predictions
+        # instead of running the random forest on every 4th down
+        self.use_fourth_down_grid = use_fourth_down_grid
+        self.fourth_down_grid_resolution = fourth_down_grid_resolution
+        self.fourth_down_grid = None
         super().__init__(off_weight)
 
     def get_model_code(self) -> str:
@@ -131,59 +277,81 @@ class GameModel_V1(AbstractGameModel):
         else:
             return qtr_seconds_remaining
 
-    def handle_4th_down(self, game_state:dict):
-        posteam = game_state["possession_team"].name
-        defteam = game_state["defense_team"].name
+    def get_fourth_down_grid(self):
+        if self.fourth_down_grid is None:
+            self.fourth_down_grid = get_fourth_down_grid(self.fourth_down_model_path, self.fourth_down_model, self.fourth_down_grid_resolution)
+        return self.fourth_down_grid
+
+    def warm_up(self) -> None:
+        # Builds the 4th down grid up front so that it is shipped along with the model to worker processes
+        if self.use_fourth_down_grid:
+            self.get_fourth_down_grid()
+
+    def predict_4th_down_play_call(self, fourth_down_data: dict) -> str:
+        if instrumentation.enabled:
+            with instrumentation.timed("fourth_down_inference"):
+                return self.lookup_4th_down_play_call(fourth_down_data)
+        return self.lookup_4th_down_play_call(fourth_down_data)
+
+    def lookup_4th_down_play_call(self, fourth_down_data: dict) -> str:
+        if self.use_fourth_down_grid:
+            prediction = self.get_fourth_down_grid().predict_one(**fourth_down_data)
+        else:
+            prediction = self.fourth_down_model.predict(pd.DataFrame([fourth_down_data]))[0]
+        return self.fourth_down_model_column_mapping[prediction]
+
+    def handle_4th_down(self, game_state: GameState, rng: np.random.Generator):
+        posteam = game_state.possession_team
+        defteam = game_state.defense_team
         fourth_down_data = {
-            "game_seconds_remaining": game_state["game_seconds_remaining"],
-            "half_seconds_remaining": self.get_half_seconds_remaining(game_state["quarter"], game_state["quarter_seconds_remaining"]),
-            "ydstogo": game_state["distance"],
-            "yardline_100": game_state["yardline"],
-            "score_differential": game_state["score"][posteam] - game_state["score"][defteam]    
+            "game_seconds_remaining": game_state.game_seconds_remaining,
+            "half_seconds_remaining": self.get_half_seconds_remaining(game_state.quarter, game_state.quarter_seconds_remaining),
+            "ydstogo": game_state.distance,
+            "yardline_100": game_state.yardline,
+            "score_differential": game_state.get_score(posteam) - game_state.get_score(defteam)
         }
-        prediction = self.fourth_down_model.predict(pd.DataFrame([fourth_down_data]))
-        return self.fourth_down_model_column_mapping[prediction[0]]
+        return self.predict_4th_down_play_call(fourth_down_data)
 
-    def resolve_play(self, game_state: dict) -> dict:
-        posteam = game_state["possession_team"]
-        defteam = game_state["defense_team"]
+    def resolve_play(self, game_state: GameState, rng: np.random.Generator) -> PlayResult:
+        posteam = game_state.possession_team
+        defteam = game_state.defense_team
+        matchup_context = self.get_matchup_context(posteam, defteam)
 
-        time_elapsed = random.randint(15,40)
+        time_elapsed = self.random_int(rng, 15, 40)
 
         play_type = None
-        if (game_state["down"] == 4):
-            # For 4th downs, use our random forest model to determine the play call
-            play_type = self.handle_4th_down(game_state)
+        if (game_state.down == 4):
+            # For 4th downs, the play call comes from the precomputed 4th down grid (or the random forest itself when use_fourth_down_grid=False)
+            play_type = self.handle_4th_down(game_state, rng)
         else:
             # If not 4th down, run normal simulation logic
-            play_type = random.choices(['run', 'pass'], [posteam.get_stat("run_rate"), posteam.get_stat("pass_rate")])[0]
+            play_type = self.choose_run_or_pass(rng, matchup_context.run_probability)
 
         # Handle 4th down scenarios for punts and field goals
-        if game_state["down"] == 4 and play_type == "punt":
-            return {
-                "play_type": "punt", 
-                "field_goal_made": None,
-                "yards_gained": 40,
-                "time_elapsed": time_elapsed, 
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
-        elif game_state["down"] == 4 and play_type == "field_goal":
-            fg_success_rate = posteam.get_stat("field_goal_success_rate")
-            return {
-                "play_type": "field_goal", 
-                "field_goal_made": random.choices([True, False], [fg_success_rate, 1 - fg_success_rate])[0],
-                "yards_gained": 0,
-                "time_elapsed": time_elapsed,
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],  
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
+        if game_state.down == 4 and play_type == "punt":
+            return PlayResult(
+                play_type="punt",
+                field_goal_made=None,
+                yards_gained=40,
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
+        elif game_state.down == 4 and play_type == "field_goal":
+            return PlayResult(
+                play_type="field_goal",
+                field_goal_made=self.random_bool(rng, matchup_context.field_goal_success_rate),
+                yards_gained=0,
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
 
         # Handle normal play calls (run or pass)
         off_yards_per_play = None
@@ -198,113 +366,150 @@ class GameModel_V1(AbstractGameModel):
         weighted_yards_per_play = self.get_weighted_average(off_yards_per_play, def_yards_per_play)
 
         if (play_type == "pass"):
-            off_pass_cmp_rate = posteam.get_stat("pass_completion_rate") / 100
-            def_pass_cmp_rate = defteam.get_stat("pass_completion_rate_allowed") / 100
-            weighted_pass_cmp_rate = self.get_weighted_average(off_pass_cmp_rate, def_pass_cmp_rate)
-            pass_completed = random.choices([True, False], [weighted_pass_cmp_rate, 1 - weighted_pass_cmp_rate])[0]
+            pass_completed = self.random_bool(rng, matchup_context.pass_completion_rate)
             if (not pass_completed):
                weighted_yards_per_play = 0 
 
-        off_turnover_rate = posteam.get_stat("turnover_rate")
-        def_turnover_rate = defteam.get_stat("forced_turnover_rate")
-        weighted_turnover_rate = (0.45) * (self.get_weighted_average(off_turnover_rate, def_turnover_rate))
-        turnover_on_play = random.choices([True, False], [weighted_turnover_rate, 1 - weighted_turnover_rate])[0]
+        turnover_on_play = self.random_bool(rng, matchup_context.turnover_rate)
 
         if (not turnover_on_play):
             yards_gained = weighted_yards_per_play
         else:
             yards_gained = 0
 
-        off_sack_rate = posteam.get_stat("sacks_allowed_rate")
-        def_sack_rate = defteam.get_stat("sacks_made_rate")
-        weighted_sack_rate = self.get_weighted_average(off_sack_rate, def_sack_rate)
-        sack_on_play = random.choices([True, False], [weighted_sack_rate, 1 - weighted_sack_rate])[0]
+        sack_on_play = self.random_bool(rng, matchup_context.sack_rate)
 
         if (sack_on_play and play_type == "pass"):
-            off_yards_lost_per_sack = posteam.get_stat("sack_yards_allowed")
-            def_yards_inflicted_per_sack = defteam.get_stat("sack_yards_inflicted")
-            yards_lost_on_sack = self.get_weighted_average(off_yards_lost_per_sack, def_yards_inflicted_per_sack)
-            yards_gained = yards_lost_on_sack
-
-        return {
-            "play_type": play_type, 
-            "field_goal_made": None,
-            "yards_gained": yards_gained,
-            "time_elapsed": time_elapsed,
-            "quarter": game_state["quarter"],
-            "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-            "turnover": turnover_on_play,
-            "touchdown": False, # This will be updated after the play is processed in update_game_state
-            "posteam": posteam.name
-        }
+            yards_gained = matchup_context.sack_yards
+
+        return PlayResult(
+            play_type=play_type,
+            field_goal_made=None,
+            yards_gained=yards_gained,
+            time_elapsed=time_elapsed,
+            quarter=game_state.quarter,
+            quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+            turnover=turnover_on_play,
+            touchdown=False, # This will be updated after the play is processed in update_game_state
+            posteam=posteam.name
+        )
+
+    def get_score_differential_batch(self, game_state: dict) -> np.ndarray:
+        home_score_differential = game_state["home_score"] - game_state["away_score"]
+        return np.where(game_state["home_has_possession"], home_score_differential, -home_score_differential)
+
+    def get_4th_down_play_types_batch(self, play_calls: list, game_state: dict, rng: np.random.Generator) -> np.ndarray:
+        return np.array([play_type_codes[play_call] for play_call in play_calls], dtype=np.int8)
+
+    def handle_4th_down_batch(self, game_state: dict, rng: np.random.Generator) -> np.ndarray:
+        quarter = game_state["quarter"]
+        quarter_seconds_remaining = game_state["quarter_seconds_remaining"]
+        fourth_down_df = pd.DataFrame({
+            "game_seconds_remaining": game_state["game_seconds_remaining"],
+            "half_seconds_remaining": np.where((quarter == 1) | (quarter == 3), quarter_seconds_remaining + 900, quarter_seconds_remaining),
+            "ydstogo": game_state["distance"],
+            "yardline_100": game_state["yardline"],
+            "score_differential": self.get_score_differential_batch(game_state)
+        })
+        if self.use_fourth_down_grid:
+            predictions = self.get_fourth_down_grid().predict(fourth_down_df)
+        else:
+            predictions = self.fourth_down_model.predict(fourth_down_df)
+        play_calls = [self.fourth_down_model_column_mapping[prediction] for prediction in predictions]
+        return self.get_4th_down_play_types_batch(play_calls, game_state, rng)
+
+    def resolve_play_batch(self, game_state: dict, rng: np.random.Generator) -> dict:
+        num_plays = game_state["down"].size
+        time_elapsed = rng.integers(15, 41, num_plays)
+
+        play_type = self.choose_run_or_pass_batch(game_state, rng)
+        fourth_down = game_state["down"] == 4
+        if fourth_down.any():
+            # For 4th downs, the play calls come from the precomputed 4th down grid (or the random forest itself when use_fourth_down_grid=False)
+            play_type[fourth_down] = self.handle_4th_down_batch(self.get_batch_substate(game_state, fourth_down), rng)
+
+        run_play = play_type == RUN_PLAY
+        pass_play = play_type == PASS_PLAY
+        yards_gained = np.zeros(num_plays)
+        yards_gained[run_play] = self.sample_batch(game_state, run_play, "sample_offensive_rushing_play", "sample_defensive_rushing_play")
+        yards_gained[pass_play] = self.sample_batch(game_state, pass_play, "sample_offensive_passing_play", "sample_defensive_passing_play")
+
+        weighted_pass_cmp_rate = self.get_batch_matchup_value(game_state, "pass_completion_rate")
+        pass_completed = rng.random(num_plays) < weighted_pass_cmp_rate
+        yards_gained[pass_play & ~pass_completed] = 0
+
+        yards_gained, turnover_on_play = self.resolve_turnovers_and_sacks_batch(game_state, rng, play_type, yards_gained)
+        play_result = self.resolve_special_teams_batch(game_state, rng, play_type, yards_gained, turnover_on_play, 40)
+        play_result["time_elapsed"] = time_elapsed
+        return play_result
     
 class GameModel_V1a(GameModel_V1):
-    
-    def __init__(self, off_weight=0.625):
+    turnover_rate_factor = 0.40
+
+    def __init__(self, off_weight=0.625, use_fourth_down_grid=True, fourth_down_grid_resolution=None):
         self.fourth_down_model = joblib.load("game_models/v2a_4th_down_playcall_model.pkl")
         self.fourth_down_model_column_mapping = { 0: "goforit", 1: "field_goal", 2: "punt" }
-        super().__init__(off_weight)
+        super().__init__(off_weight, use_fourth_down_grid, fourth_down_grid_resolution)
 
     def get_model_code(self) -> str:
         return "v1a"
 
-    def handle_4th_down(self, game_state:dict):
-        posteam = game_state["possession_team"]
-        defteam = game_state["defense_team"]
+    def handle_4th_down(self, game_state: GameState, rng: np.random.Generator):
+        posteam = game_state.possession_team
+        defteam = game_state.defense_team
         fourth_down_data = {
-            "game_seconds_remaining": game_state["game_seconds_remaining"],
-            "half_seconds_remaining": self.get_half_seconds_remaining(game_state["quarter"], game_state["quarter_seconds_remaining"]),
-            "ydstogo": game_state["distance"],
-            "yardline_100": game_state["yardline"],
-            "score_differential": game_state["score"][posteam.name] - game_state["score"][posteam.name]    
+            "game_seconds_remaining": game_state.game_seconds_remaining,
+            "half_seconds_remaining": self.get_half_seconds_remaining(game_state.quarter, game_state.quarter_seconds_remaining),
+            "ydstogo": game_state.distance,
+            "yardline_100": game_state.yardline,
+            "score_differential": game_state.get_score(posteam) - game_state.get_score(posteam)    
         }
-        prediction_result = self.fourth_down_model.predict(pd.DataFrame([fourth_down_data]))
-        prediction = self.fourth_down_model_column_mapping[prediction_result[0]]
+        prediction = self.predict_4th_down_play_call(fourth_down_data)
         if prediction == "goforit":
-            return random.choices(['run', 'pass'], [posteam.get_stat("run_rate"), defteam.get_stat("pass_rate")])[0]
+            return self.choose_run_or_pass(rng, self.get_matchup_context(posteam, defteam).go_for_it_run_probability)
         else:
             return prediction
 
-    def resolve_play(self, game_state: dict) -> dict:
-        posteam = game_state["possession_team"]
-        defteam = game_state["defense_team"]
+    def resolve_play(self, game_state: GameState, rng: np.random.Generator) -> PlayResult:
+        posteam = game_state.possession_team
+        defteam = game_state.defense_team
+        matchup_context = self.get_matchup_context(posteam, defteam)
 
-        time_elapsed = random.randint(20,30)
+        time_elapsed = self.random_int(rng, 20, 30)
 
         play_type = None
-        if (game_state["down"] == 4):
-            # For 4th downs, use our random forest model to determine the play call
-            play_type = self.handle_4th_down(game_state)
+        if (game_state.down == 4):
+            # For 4th downs, the play call comes from the precomputed 4th down grid (or the random forest itself when use_fourth_down_grid=False)
+            play_type = self.handle_4th_down(game_state, rng)
         else:
             # If not 4th down, run normal simulation logic
-            play_type = random.choices(['run', 'pass'], [posteam.get_stat("run_rate"), posteam.get_stat("pass_rate")])[0]
+            play_type = self.choose_run_or_pass(rng, matchup_context.run_probability)
 
         # Handle 4th down scenarios for punts and field goals
-        if game_state["down"] == 4 and play_type == "punt":
-            return {
-                "play_type": "punt", 
-                "field_goal_made": None,
-                "yards_gained": random.randint(40,55),
-                "time_elapsed": time_elapsed, 
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
-        elif game_state["down"] == 4 and play_type == "field_goal":
-            fg_success_rate = posteam.get_stat("field_goal_success_rate")
-            return {
-                "play_type": "field_goal", 
-                "field_goal_made": random.choices([True, False], [fg_success_rate, 1 - fg_success_rate])[0],
-                "yards_gained": 0,
-                "time_elapsed": time_elapsed,
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],  
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
+        if game_state.down == 4 and play_type == "punt":
+            return PlayResult(
+                play_type="punt",
+                field_goal_made=None,
+                yards_gained=self.random_int(rng, 40, 55),
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
+        elif game_state.down == 4 and play_type == "field_goal":
+            return PlayResult(
+                play_type="field_goal",
+                field_goal_made=self.random_bool(rng, matchup_context.field_goal_success_rate),
+                yards_gained=0,
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
 
         # Handle normal play calls (run or pass)
         off_yards_per_play = None
@@ -319,105 +524,128 @@ class GameModel_V1a(GameModel_V1):
         weighted_yards_per_play = self.get_weighted_average(off_yards_per_play, def_yards_per_play)
 
         if (play_type == "pass"):
-            off_pass_cmp_rate = posteam.get_stat("pass_completion_rate") / 100
-            def_pass_cmp_rate = defteam.get_stat("pass_completion_rate_allowed") / 100
-            weighted_pass_cmp_rate = self.get_weighted_average(off_pass_cmp_rate, def_pass_cmp_rate)
-            pass_completed = random.choices([True, False], [weighted_pass_cmp_rate, 1 - weighted_pass_cmp_rate])[0]
+            pass_completed = self.random_bool(rng, matchup_context.pass_completion_rate)
             if (not pass_completed):
                weighted_yards_per_play = 0 
 
-        off_turnover_rate = posteam.get_stat("turnover_rate")
-        def_turnover_rate = defteam.get_stat("forced_turnover_rate")
-        weighted_turnover_rate = (0.40) * (self.get_weighted_average(off_turnover_rate, def_turnover_rate))
-        turnover_on_play = random.choices([True, False], [weighted_turnover_rate, 1 - weighted_turnover_rate])[0]
+        turnover_on_play = self.random_bool(rng, matchup_context.turnover_rate)
 
         if (not turnover_on_play):
             yards_gained = weighted_yards_per_play
         else:
             yards_gained = 0
 
-        off_sack_rate = posteam.get_stat("sacks_allowed_rate")
-        def_sack_rate = defteam.get_stat("sacks_made_rate")
-        weighted_sack_rate = self.get_weighted_average(off_sack_rate, def_sack_rate)
-        sack_on_play = random.choices([True, False], [weighted_sack_rate, 1 - weighted_sack_rate])[0]
+        sack_on_play = self.random_bool(rng, matchup_context.sack_rate)
 
         if (sack_on_play and play_type == "pass"):
-            off_yards_lost_per_sack = posteam.get_stat("sack_yards_allowed")
-            def_yards_inflicted_per_sack = defteam.get_stat("sack_yards_inflicted")
-            yards_lost_on_sack = self.get_weighted_average(off_yards_lost_per_sack, def_yards_inflicted_per_sack)
-            yards_gained = yards_lost_on_sack
-
-        return {
-            "play_type": play_type, 
-            "field_goal_made": None,
-            "yards_gained": yards_gained,
-            "time_elapsed": time_elapsed,
-            "quarter": game_state["quarter"],
-            "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-            "turnover": turnover_on_play,
-            "touchdown": False, # This will be updated after the play is processed in update_game_state
-            "posteam": posteam.name
-        }
+            yards_gained = matchup_context.sack_yards
+
+        return PlayResult(
+            play_type=play_type,
+            field_goal_made=None,
+            yards_gained=yards_gained,
+            time_elapsed=time_elapsed,
+            quarter=game_state.quarter,
+            quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+            turnover=turnover_on_play,
+            touchdown=False, # This will be updated after the play is processed in update_game_state
+            posteam=posteam.name
+        )
+
+    def get_score_differential_batch(self, game_state: dict) -> np.ndarray:
+        # Mirrors handle_4th_down, which differences the possession team's score against itself
+        return np.zeros(game_state["down"].size, dtype=np.int64)
+
+    def get_4th_down_play_types_batch(self, play_calls: list, game_state: dict, rng: np.random.Generator) -> np.ndarray:
+        go_for_it = np.array([play_call == "goforit" for play_call in play_calls], dtype=bool)
+        play_types = np.array([play_type_codes.get(play_call, RUN_PLAY) for play_call in play_calls], dtype=np.int8)
+        if go_for_it.any():
+            go_for_it_state = self.get_batch_substate(game_state, go_for_it)
+            run_probabilities = self.get_batch_matchup_value(go_for_it_state, "go_for_it_run_probability")
+            play_types[go_for_it] = self.choose_run_or_pass_batch(go_for_it_state, rng, run_probabilities)
+        return play_types
+
+    def resolve_play_batch(self, game_state: dict, rng: np.random.Generator) -> dict:
+        num_plays = game_state["down"].size
+        time_elapsed = rng.integers(20, 31, num_plays)
+
+        play_type = self.choose_run_or_pass_batch(game_state, rng)
+        fourth_down = game_state["down"] == 4
+        if fourth_down.any():
+            # For 4th downs, the play calls come from the precomputed 4th down grid (or the random forest itself when use_fourth_down_grid=False)
+            play_type[fourth_down] = self.handle_4th_down_batch(self.get_batch_substate(game_state, fourth_down), rng)
+
+        run_play = play_type == RUN_PLAY
+        pass_play = play_type == PASS_PLAY
+        yards_gained = np.zeros(num_plays)
+        yards_gained[run_play] = self.sample_batch(game_state, run_play, "sample_offensive_rushing_play", "sample_defensive_rushing_play")
+        yards_gained[pass_play] = self.sample_batch(game_state, pass_play, "sample_offensive_passing_play", "sample_defensive_passing_play")
+
+        weighted_pass_cmp_rate = self.get_batch_matchup_value(game_state, "pass_completion_rate")
+        pass_completed = rng.random(num_plays) < weighted_pass_cmp_rate
+        yards_gained[pass_play & ~pass_completed] = 0
+
+        yards_gained, turnover_on_play = self.resolve_turnovers_and_sacks_batch(game_state, rng, play_type, yards_gained)
+        punt_yards = rng.integers(40, 56, num_plays)
+        play_result = self.resolve_special_teams_batch(game_state, rng, play_type, yards_gained, turnover_on_play, punt_yards)
+        play_result["time_elapsed"] = time_elapsed
+        return play_result
     
 class GameModel_V1b(GameModel_V1a):
-    
-    def __init__(self, off_weight=0.575):
-        super().__init__(off_weight)
+    turnover_rate_factor = 0.375
+
+    def __init__(self, off_weight=0.575, use_fourth_down_grid=True, fourth_down_grid_resolution=None):
+        super().__init__(off_weight, use_fourth_down_grid, fourth_down_grid_resolution)
 
     def get_model_code(self) -> str:
         return "v1b"
 
-    def get_projected_pass_yards_for_play(self, posteam: object, defteam: object) -> float:
+    def get_projected_pass_yards_for_play(self, posteam: object, defteam: object, matchup_context: MatchupContext) -> float:
         off_air_yards_per_attempt = posteam.sample_offensive_air_yards()
         def_air_yards_per_attempt = defteam.sample_defensive_air_yards()
         weighted_air_yards_per_attempt = self.get_weighted_average(off_air_yards_per_attempt, def_air_yards_per_attempt)
+        return weighted_air_yards_per_attempt + matchup_context.yac_per_completion
 
-        off_yac_per_completion = posteam.get_stat("off_yac_per_completion")
-        def_yac_per_completion = defteam.get_stat("def_yac_per_completion")
-        weighted_yac_per_completion = self.get_weighted_average(off_yac_per_completion, def_yac_per_completion)
-
-        return weighted_air_yards_per_attempt + weighted_yac_per_completion
-
-    def resolve_play(self, game_state: dict) -> dict:
-        posteam = game_state["possession_team"]
-        defteam = game_state["defense_team"]
+    def resolve_play(self, game_state: GameState, rng: np.random.Generator) -> PlayResult:
+        posteam = game_state.possession_team
+        defteam = game_state.defense_team
+        matchup_context = self.get_matchup_context(posteam, defteam)
 
-        time_elapsed = random.randint(17,30)
+        time_elapsed = self.random_int(rng, 17, 30)
 
         play_type = None
-        if (game_state["down"] == 4):
-            # For 4th downs, use our random forest model to determine the play call
-            play_type = self.handle_4th_down(game_state)
+        if (game_state.down == 4):
+            # For 4th downs, the play call comes from the precomputed 4th down grid (or the random forest itself when use_fourth_down_grid=False)
+            play_type = self.handle_4th_down(game_state, rng)
         else:
             # If not 4th down, run normal simulation logic
-            play_type = random.choices(['run', 'pass'], [posteam.get_stat("run_rate"), posteam.get_stat("pass_rate")])[0]
+            play_type = self.choose_run_or_pass(rng, matchup_context.run_probability)
 
         # Handle 4th down scenarios for punts and field goals
-        if game_state["down"] == 4 and play_type == "punt":
-            return {
-                "play_type": "punt", 
-                "field_goal_made": None,
-                "yards_gained": random.randint(40,55),
-                "time_elapsed": time_elapsed, 
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
-        elif game_state["down"] == 4 and play_type == "field_goal":
-            fg_success_rate = posteam.get_stat("field_goal_success_rate")
-            return {
-                "play_type": "field_goal", 
-                "field_goal_made": random.choices([True, False], [fg_success_rate, 1 - fg_success_rate])[0],
-                "yards_gained": 0,
-                "time_elapsed": time_elapsed,
-                "quarter": game_state["quarter"],
-                "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],  
-                "turnover": False,
-                "touchdown": False,
-                "posteam": posteam.name
-            }
+        if game_state.down == 4 and play_type == "punt":
+            return PlayResult(
+                play_type="punt",
+                field_goal_made=None,
+                yards_gained=self.random_int(rng, 40, 55),
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
+        elif game_state.down == 4 and play_type == "field_goal":
+            return PlayResult(
+                play_type="field_goal",
+                field_goal_made=self.random_bool(rng, matchup_context.field_goal_success_rate),
+                yards_gained=0,
+                time_elapsed=time_elapsed,
+                quarter=game_state.quarter,
+                quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+                turnover=False,
+                touchdown=False,
+                posteam=posteam.name
+            )
 
         # Handle normal play calls (run or pass)
         weighted_yards_per_play = None
@@ -426,44 +654,68 @@ class GameModel_V1b(GameModel_V1a):
             def_yards_per_play = defteam.sample_defensive_rushing_play()
             weighted_yards_per_play = self.get_weighted_average(off_yards_per_play, def_yards_per_play)
         else:
-            off_pass_cmp_rate = posteam.get_stat("pass_completion_rate") / 100
-            def_pass_cmp_rate = defteam.get_stat("pass_completion_rate_allowed") / 100
-            weighted_pass_cmp_rate = self.get_weighted_average(off_pass_cmp_rate, def_pass_cmp_rate)
-            pass_completed = random.choices([True, False], [weighted_pass_cmp_rate, 1 - weighted_pass_cmp_rate])[0]
+            pass_completed = self.random_bool(rng, matchup_context.pass_completion_rate)
             if (not pass_completed):
                weighted_yards_per_play = 0
             else:
-                weighted_yards_per_play = self.get_projected_pass_yards_for_play(posteam, defteam)
+                weighted_yards_per_play = self.get_projected_pass_yards_for_play(posteam, defteam, matchup_context)
 
-        off_turnover_rate = posteam.get_stat("turnover_rate")
-        def_turnover_rate = defteam.get_stat("forced_turnover_rate")
-        weighted_turnover_rate = (0.375) * (self.get_weighted_average(off_turnover_rate, def_turnover_rate))
-        turnover_on_play = random.choices([True, False], [weighted_turnover_rate, 1 - weighted_turnover_rate])[0]
+        turnover_on_play = self.random_bool(rng, matchup_context.turnover_rate)
 
         if (not turnover_on_play):
             yards_gained = weighted_yards_per_play
         else:
             yards_gained = 0
 
-        off_sack_rate = posteam.get_stat("sacks_allowed_rate")
-        def_sack_rate = defteam.get_stat("sacks_made_rate")
-        weighted_sack_rate = self.get_weighted_average(off_sack_rate, def_sack_rate)
-        sack_on_play = random.choices([True, False], [weighted_sack_rate, 1 - weighted_sack_rate])[0]
+        sack_on_play = self.random_bool(rng, matchup_context.sack_rate)
 
         if (sack_on_play and play_type == "pass"):
-            off_yards_lost_per_sack = posteam.get_stat("sack_yards_allowed")
-            def_yards_inflicted_per_sack = defteam.get_stat("sack_yards_inflicted")
-            yards_lost_on_sack = self.get_weighted_average(off_yards_lost_per_sack, def_yards_inflicted_per_sack)
-            yards_gained = yards_lost_on_sack
-
-        return {
-            "play_type": play_type, 
-            "field_goal_made": None,
-            "yards_gained": yards_gained,
-            "time_elapsed": time_elapsed,
-            "quarter": game_state["quarter"],
-            "quarter_seconds_remaining": game_state["quarter_seconds_remaining"],
-            "turnover": turnover_on_play,
-            "touchdown": False, # This will be updated after the play is processed in update_game_state
-            "posteam": posteam.name
-        }
\ No newline at end of file
+            yards_gained = matchup_context.sack_yards
+
+        return PlayResult(
+            play_type=play_type,
+            field_goal_made=None,
+            yards_gained=yards_gained,
+            time_elapsed=time_elapsed,
+            quarter=game_state.quarter,
+            quarter_seconds_remaining=game_state.quarter_seconds_remaining,
+            turnover=turnover_on_play,
+            touchdown=False, # This will be updated after the play is processed in update_game_state
+            posteam=posteam.name
+        )
+
+    def resolve_play_batch(self, game_state: dict, rng: np.random.Generator) -> dict:
+        num_plays = game_state["down"].size
+        time_elapsed = rng.integers(17, 31, num_plays)
+
+        play_type = self.choose_run_or_pass_batch(game_state, rng)
+        fourth_down = game_state["down"] == 4
+        if fourth_down.any():
+            # For 4th downs, the play calls come from the precomputed 4th down grid (or the random forest itself when use_fourth_down_grid=False)
+            play_type[fourth_down] = self.handle_4th_down_batch(self.get_batch_substate(game_state, fourth_down), rng)
+
+        run_play = play_type == RUN_PLAY
+        pass_play = play_type == PASS_PLAY
+        weighted_pass_cmp_rate = self.get_batch_matchup_value(game_state, "pass_completion_rate")
+        completed_pass = pass_play & (rng.random(num_plays) < weighted_pass_cmp_rate)
+
+        yards_gained = np.zeros(num_plays)
+        yards_gained[run_play] = self.sample_batch(game_state, run_play, "sample_offensive_rushing_play", "sample_defensive_rushing_play")
+        if completed_pass.any():
+            completed_pass_state = self.get_batch_substate(game_state, completed_pass)
+            weighted_air_yards = self.sample_batch(game_state, completed_pass, "sample_offensive_air_yards", "sample_defensive_air_yards")
+            weighted_yac = self.get_batch_matchup_value(completed_pass_state, "yac_per_completion")
+            yards_gained[completed_pass] = weighted_air_yards + weighted_yac
+
+        yards_gained, turnover_on_play = self.resolve_turnovers_and_sacks_batch(game_state, rng, play_type, yards_gained)
+        punt_yards = rng.integers(40, 56, num_plays)
+        play_result = self.resolve_special_teams_batch(game_state, rng, play_type, yards_gained, turnover_on_play, punt_yards)
+        play_result["time_elapsed"] = time_elapsed
+        return play_result
+
+model_code_to_model_class = {
+    "proto": PrototypeGameModel,
+    "v1": GameModel_V1,
+    "v1a": GameModel_V1a,
+    "v1b": GameModel_V1b
+}
@@ -0,0 +1,146 @@
+class GameState:
+    # Slotted record of the state of a single game. The score is kept as two ints and is only
+    # turned into a {team name: score} dict when a dict view is requested.
+    __slots__ = ("home_team", "away_team", "quarter", "game_seconds_remaining", "quarter_seconds_remaining",
+                 "possession_team", "defense_team", "yardline", "down", "distance", "home_score", "away_score", "play_log",
+                 "num_plays", "home_team_stats", "away_team_stats")
+
+    def __init__(self, home_team: object, away_team: object, quarter=1, game_seconds_remaining=3600, quarter_seconds_remaining=900,
+                 possession_team=None, defense_team=None, yardline=75, down=1, distance=10, home_score=0, away_score=0, play_log=None):
+        self.home_team = home_team
+        self.away_team = away_team
+        self.quarter = quarter
+        self.game_seconds_remaining = game_seconds_remaining
+        self.quarter_seconds_remaining = quarter_seconds_remaining
+        self.possession_team = possession_team if possession_team is not None else home_team
+        self.defense_team = defense_team if defense_team is not None else away_team
+        self.yardline = yardline
+        self.down = down
+        self.distance = distance
+        self.home_score = home_score
+        self.away_score = away_score
+        self.play_log = play_log if play_log is not None else []
+        self.num_plays = 0
+        self.home_team_stats = TeamStatsAccumulator()
+        self.away_team_stats = TeamStatsAccumulator()
+
+    @property
+    def score(self) -> dict:
+        return {self.home_team.name: self.home_score, self.away_team.name: self.away_score}
+
+    def get_score(self, team: object) -> int:
+        return self.home_score if team is self.home_team else self.away_score
+
+    def add_score(self, team: object, points: int) -> None:
+        if team is self.home_team:
+            self.home_score += points
+        else:
+            self.away_score += points
+
+    def get_team_stats(self, team: object) -> "TeamStatsAccumulator":
+        return self.home_team_stats if team is self.home_team else self.away_team_stats
+
+    def to_dict(self) -> dict:
+        return {
+            "quarter": self.quarter,
+            "game_seconds_remaining": self.game_seconds_remaining,
+            "quarter_seconds_remaining": self.quarter_seconds_remaining,
+            "possession_team": self.possession_team,
+            "defense_team": self.defense_team,
+            "yardline": self.yardline,
+            "down": self.down,
+            "distance": self.distance,
+            "score": self.score,
+            "play_log": self.play_log,
+        }
+
+class PlayResult:
+    # Slotted record of a single play. Game models fill in the outcome of the play and the GameEngine
+    # fills in the game situation (clock, field position and score) the play was run in.
+    __slots__ = ("play_type", "field_goal_made", "yards_gained", "time_elapsed", "quarter", "quarter_seconds_remaining",
+                 "turnover", "touchdown", "posteam", "game_seconds_remaining", "yardline", "down", "distance",
+                 "home_score", "away_score", "posteam_score")
+
+    def __init__(self, play_type: str, field_goal_made, yards_gained, time_elapsed: int, quarter: int,
+                 quarter_seconds_remaining: int, turnover: bool, touchdown: bool, posteam: str):
+        self.play_type = play_type
+        self.field_goal_made = field_goal_made
+        self.yards_gained = yards_gained
+        self.time_elapsed = time_elapsed
+        self.quarter = quarter
+        self.quarter_seconds_remaining = quarter_seconds_remaining
+        self.turnover = turnover
+        self.touchdown = touchdown
+        self.posteam = posteam
+        self.game_seconds_remaining = None
+        self.yardline = None
+        self.down = None
+        self.distance = None
+        self.home_score = None
+        self.away_score = None
+        self.posteam_score = None
+
+    def to_dict(self, home_team_name: str, away_team_name: str) -> dict:
+        return {
+            "play_type": self.play_type,
+            "field_goal_made": self.field_goal_made,
+            "yards_gained": self.yards_gained,
+            "time_elapsed": self.time_elapsed,
+            "quarter": self.quarter,
+            "quarter_seconds_remaining": self.quarter_seconds_remaining,
+            "turnover": self.turnover,
+            "touchdown": self.touchdown,
+            "posteam": self.posteam,
+            "game_seconds_remaining": self.game_seconds_remaining,
+            "yardline": self.yardline,
+            "down": self.down,
+            "distance": self.distance,
+            "score": {home_team_name: self.home_score, away_team_name: self.away_score},
+            "posteam_score": self.posteam_score,
+        }
+
+class TeamStatsAccumulator:
+    # Running per-team counters that are updated after every play so that the end of game
+    # summary doesn't have to rescan the play log
+    __slots__ = ("plays", "run_plays", "rush_yards", "rush_tds", "pass_plays", "pass_cmps", "pass_yards", "pass_tds",
+                 "turnovers", "sacks", "fg_attempts", "fg_makes")
+
+    def __init__(self):
+        self.plays = 0
+        self.run_plays = 0
+        self.rush_yards = 0
+        self.rush_tds = 0
+        self.pass_plays = 0
+        self.pass_cmps = 0
+        self.pass_yards = 0
+        self.pass_tds = 0
+        self.turnovers = 0
+        self.sacks = 0
+        self.fg_attempts = 0
+        self.fg_makes = 0
+
+    def record_play(self, play_result: PlayResult) -> None:
+        self.plays += 1
+        if play_result.turnover:
+            self.turnovers += 1
+
+        play_type = play_result.play_type
+        if play_type == "run":
+            self.run_plays += 1
+            self.rush_yards += play_result.yards_gained
+            if play_result.touchdown:
+                self.rush_tds += 1
+        elif play_type == "pass":
+            yards_gained = play_result.yards_gained
+            self.pass_plays += 1
+            self.pass_yards += yards_gained
+            if yards_gained > 0:
+                self.pass_cmps += 1
+            elif yards_gained < 0:
+                self.sacks += 1
+            if play_result.touchdown:
+                self.pass_tds += 1
+        elif play_type == "field_goal":
+            self.fg_attempts += 1
+            if play_result.field_goal_made:
+                self.fg_makes += 1
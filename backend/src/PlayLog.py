@@ -0,0 +1,84 @@
+from array import array
+
+play_types = ["run", "pass", "punt", "field_goal"]
+play_type_indices = {play_type: i for i, play_type in enumerate(play_types)}
+
+# Typecode of the array backing each play log column. play_type and posteam are stored as small codes and
+# field_goal_made uses -1 for plays that weren't field goal attempts.
+play_log_columns = {
+    "play_type": "b",
+    "field_goal_made": "b",
+    "yards_gained": "d",
+    "time_elapsed": "l",
+    "quarter": "b",
+    "quarter_seconds_remaining": "l",
+    "turnover": "b",
+    "touchdown": "b",
+    "posteam": "b",
+    "game_seconds_remaining": "l",
+    "yardline": "d",
+    "down": "b",
+    "distance": "d",
+    "home_score": "l",
+    "away_score": "l",
+    "posteam_score": "l",
+}
+
+class PlayLog:
+    # Columnar play log that keeps one compact array per PlayResult field instead of one object per play
+    __slots__ = ("home_team_name", "away_team_name", "columns")
+
+    def __init__(self, home_team_name: str, away_team_name: str):
+        self.home_team_name = home_team_name
+        self.away_team_name = away_team_name
+        self.columns = {name: array(typecode) for name, typecode in play_log_columns.items()}
+
+    def __len__(self) -> int:
+        return len(self.columns["play_type"])
+
+    def append(self, play_result: object) -> None:
+        columns = self.columns
+        columns["play_type"].append(play_type_indices[play_result.play_type])
+        columns["field_goal_made"].append(-1 if play_result.field_goal_made is None else int(play_result.field_goal_made))
+        columns["yards_gained"].append(play_result.yards_gained)
+        columns["time_elapsed"].append(play_result.time_elapsed)
+        columns["quarter"].append(play_result.quarter)
+        columns["quarter_seconds_remaining"].append(play_result.quarter_seconds_remaining)
+        columns["turnover"].append(int(play_result.turnover))
+        columns["touchdown"].append(int(play_result.touchdown))
+        columns["posteam"].append(0 if play_result.posteam == self.home_team_name else 1)
+        columns["game_seconds_remaining"].append(play_result.game_seconds_remaining)
+        columns["yardline"].append(play_result.yardline)
+        columns["down"].append(play_result.down)
+        columns["distance"].append(play_result.distance)
+        columns["home_score"].append(play_result.home_score)
+        columns["away_score"].append(play_result.away_score)
+        columns["posteam_score"].append(play_result.posteam_score)
+
+    def to_columns(self) -> dict:
+        # Decoded columns with the same keys and values as the dicts returned by to_dicts
+        columns = self.columns
+        team_names = [self.home_team_name, self.away_team_name]
+        return {
+            "play_type": [play_types[code] for code in columns["play_type"]],
+            "field_goal_made": [None if made < 0 else bool(made) for made in columns["field_goal_made"]],
+            "yards_gained": columns["yards_gained"].tolist(),
+            "time_elapsed": columns["time_elapsed"].tolist(),
+            "quarter": columns["quarter"].tolist(),
+            "quarter_seconds_remaining": columns["quarter_seconds_remaining"].tolist(),
+            "turnover": [bool(turnover) for turnover in columns["turnover"]],
+            "touchdown": [bool(touchdown) for touchdown in columns["touchdown"]],
+            "posteam": [team_names[code] for code in columns["posteam"]],
+            "game_seconds_remaining": columns["game_seconds_remaining"].tolist(),
+            "yardline": columns["yardline"].tolist(),
+            "down": columns["down"].tolist(),
+            "distance": columns["distance"].tolist(),
+            "score": [{self.home_team_name: home_score, self.away_team_name: away_score}
+                      for home_score, away_score in zip(columns["home_score"], columns["away_score"])],
+            "posteam_score": columns["posteam_score"].tolist(),
+        }
+
+    def to_dicts(self) -> list:
+        columns = self.to_columns()
+        column_names = list(columns.keys())
+        return [dict(zip(column_names, row)) for row in zip(*columns.values())]
@@ -0,0 +1,65 @@
+import numpy as np
+
+num_playoff_seeds = 7
+
+class SeasonAggregate:
+    # Mergeable per-team totals over a set of simulated seasons: the sums of wins, losses, ties and points, and the
+    # number of seasons each team won its division or finished with each playoff seed. Arrays have one entry per team
+    # in team_abbrevs.
+    def __init__(self, team_abbrevs: list):
+        num_teams = len(team_abbrevs)
+        self.team_abbrevs = list(team_abbrevs)
+        self.team_indices = {team_abbrev: i for i, team_abbrev in enumerate(self.team_abbrevs)}
+        self.num_seasons = 0
+        self.wins_sum = np.zeros(num_teams, dtype=np.int64)
+        self.losses_sum = np.zeros(num_teams, dtype=np.int64)
+        self.ties_sum = np.zeros(num_teams, dtype=np.int64)
+        self.points_for_sum = np.zeros(num_teams, dtype=np.int64)
+        self.points_against_sum = np.zeros(num_teams, dtype=np.int64)
+        self.division_titles = np.zeros(num_teams, dtype=np.int64)
+        self.seed_counts = np.zeros((num_teams, num_playoff_seeds), dtype=np.int64)
+
+    def add_seasons(self, wins: np.ndarray, losses: np.ndarray, ties: np.ndarray, points_for: np.ndarray,
+                    points_against: np.ndarray, division_winners: np.ndarray, seeds: np.ndarray) -> None:
+        # Every argument has one row per team and one column per season. seeds is 0 for teams that missed the playoffs.
+        self.num_seasons += wins.shape[1]
+        self.wins_sum += wins.sum(axis=1)
+        self.losses_sum += losses.sum(axis=1)
+        self.ties_sum += ties.sum(axis=1)
+        self.points_for_sum += points_for.sum(axis=1)
+        self.points_against_sum += points_against.sum(axis=1)
+        self.division_titles += division_winners.sum(axis=1)
+        for seed in range(1, num_playoff_seeds + 1):
+            self.seed_counts[:, seed - 1] += (seeds == seed).sum(axis=1)
+
+    def merge(self, other: "SeasonAggregate") -> None:
+        if other.team_abbrevs != self.team_abbrevs:
+            raise ValueError("Cannot merge season aggregates of different sets of teams")
+        self.num_seasons += other.num_seasons
+        self.wins_sum += other.wins_sum
+        self.losses_sum += other.losses_sum
+        self.ties_sum += other.ties_sum
+        self.points_for_sum += other.points_for_sum
+        self.points_against_sum += other.points_against_sum
+        self.division_titles += other.division_titles
+        self.seed_counts += other.seed_counts
+
+    def get_pct(self, count: int) -> float:
+        return round(100 * (count / self.num_seasons), 2) if self.num_seasons > 0 else None
+
+    def get_team_summary(self, team_abbrev: str) -> dict:
+        i = self.team_indices[team_abbrev]
+        num_seasons = max(self.num_seasons, 1)
+        seed_counts = self.seed_counts[i]
+        return {
+            "team": team_abbrev,
+            "average_wins": round(self.wins_sum[i] / num_seasons, 2),
+            "average_losses": round(self.losses_sum[i] / num_seasons, 2),
+            "average_ties": round(self.ties_sum[i] / num_seasons, 2),
+            "average_points_for": round(self.points_for_sum[i] / num_seasons, 2),
+            "average_points_against": round(self.points_against_sum[i] / num_seasons, 2),
+            "division_title_pct": self.get_pct(self.division_titles[i]),
+            "playoff_pct": self.get_pct(seed_counts.sum()),
+            "first_round_bye_pct": self.get_pct(seed_counts[0]),
+            "seed_pcts": {str(seed): self.get_pct(seed_counts[seed - 1]) for seed in range(1, num_playoff_seeds + 1)},
+        }
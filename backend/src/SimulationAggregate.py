@@ -0,0 +1,106 @@
+import math
+
+team_stat_fields = ["score", "run_rate", "pass_rate", "pass_cmp_rate", "pass_yards", "passing_tds", "sacks_allowed",
+                    "pass_yards_per_play", "rushing_attempts", "rushing_yards", "rushing_tds", "rush_yards_per_play",
+                    "total_turnovers", "fg_pct"]
+
+class SimulationAggregate:
+    # Mergeable sufficient statistics of a set of simulated games of one matchup. Each team stat field keeps
+    # [count, sum, sum of squares] over the games where it was defined (missing values such as fg_pct without a
+    # field goal attempt are skipped, like pandas does when taking the mean).
+    def __init__(self, home_team_name: str, away_team_name: str):
+        self.home_team_name = home_team_name
+        self.away_team_name = away_team_name
+        self.num_games = 0
+        self.home_wins = 0
+        self.away_wins = 0
+        self.ties = 0
+        self.score_diff_sum = 0
+        self.score_diff_sq_sum = 0
+        self.team_stats = {
+            team_name: {field: [0, 0.0, 0.0] for field in team_stat_fields} for team_name in [home_team_name, away_team_name]
+        }
+        # Instrumentation phases recorded while simulating a chunk, sent back to the parent process along with the aggregate
+        self.phase_records = {}
+
+    def add_game(self, game_summary: dict) -> None:
+        final_score = game_summary["final_score"]
+        score_diff = final_score[self.home_team_name] - final_score[self.away_team_name]
+        self.num_games += 1
+        if score_diff > 0:
+            self.home_wins += 1
+        elif score_diff < 0:
+            self.away_wins += 1
+        else:
+            self.ties += 1
+        self.score_diff_sum += score_diff
+        self.score_diff_sq_sum += score_diff * score_diff
+
+        for team_name, field_stats in self.team_stats.items():
+            team_summary = game_summary[team_name]
+            for field, stats in field_stats.items():
+                value = team_summary[field]
+                if value is None or math.isnan(value):
+                    continue
+                stats[0] += 1
+                stats[1] += value
+                stats[2] += value * value
+
+    def merge(self, other: "SimulationAggregate") -> None:
+        if (other.home_team_name, other.away_team_name) != (self.home_team_name, self.away_team_name):
+            raise ValueError("Cannot merge simulation aggregates of different matchups")
+        self.num_games += other.num_games
+        self.home_wins += other.home_wins
+        self.away_wins += other.away_wins
+        self.ties += other.ties
+        self.score_diff_sum += other.score_diff_sum
+        self.score_diff_sq_sum += other.score_diff_sq_sum
+        for team_name, field_stats in self.team_stats.items():
+            for field, stats in field_stats.items():
+                other_stats = other.team_stats[team_name][field]
+                stats[0] += other_stats[0]
+                stats[1] += other_stats[1]
+                stats[2] += other_stats[2]
+
+    def get_mean(self, team_name: str, field: str) -> float:
+        count, total, _ = self.team_stats[team_name][field]
+        return total / count if count > 0 else math.nan
+
+    def get_variance(self, team_name: str, field: str) -> float:
+        # Sample variance of the field over the games where it was defined
+        count, total, total_sq = self.team_stats[team_name][field]
+        if count < 2:
+            return math.nan
+        return max(total_sq - total * total / count, 0.0) / (count - 1)
+
+    def get_score_diff_mean(self) -> float:
+        return self.score_diff_sum / self.num_games if self.num_games > 0 else math.nan
+
+    def get_score_diff_variance(self) -> float:
+        if self.num_games < 2:
+            return math.nan
+        return max(self.score_diff_sq_sum - self.score_diff_sum ** 2 / self.num_games, 0.0) / (self.num_games - 1)
+
+    def get_home_win_pct_interval_width(self, z=1.96) -> float:
+        # Width (in percentage points) of the Wilson score interval of the home win percentage, which unlike the
+        # normal approximation doesn't collapse to 0 when one team wins every game so far
+        if self.num_games == 0:
+            return math.inf
+        n = self.num_games
+        p = self.home_wins / n
+        half_width = (z / (1 + z * z / n)) * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n))
+        return 100 * 2 * half_width
+
+    def get_score_diff_interval_width(self, z=1.96) -> float:
+        # Width of the normal approximation confidence interval of the average score difference
+        variance = self.get_score_diff_variance()
+        if math.isnan(variance):
+            return math.inf
+        return 2 * z * math.sqrt(variance / self.num_games)
+
+    def get_team_stats_summary(self, team_name: str) -> dict:
+        # Same fields as the averaged team stats produced by game_simulator.generate_simulation_stats_summary
+        team_stats_summary = {"team": team_name}
+        for field in team_stat_fields:
+            team_stats_summary[field] = round(self.get_mean(team_name, field), 2)
+        return team_stats_summary
@@ -0,0 +1,101 @@
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from threading import Condition, Lock
+from time import time
+
+job_statuses = ["queued", "running", "completed", "failed"]
+finished_job_statuses = ["completed", "failed"]
+
+class SimulationJob:
+    # State of one background simulation run. Every change bumps version and wakes up anyone waiting for progress.
+    def __init__(self, job_id: str, params: dict):
+        self.job_id = job_id
+        self.params = params
+        self.status = "queued"
+        self.progress = {}
+        self.result = None
+        self.error = None
+        self.created_at = time()
+        self.started_at = None
+        self.finished_at = None
+        self.version = 0
+        self.condition = Condition()
+
+    def is_finished(self) -> bool:
+        return self.status in finished_job_statuses
+
+    def update(self, **fields) -> None:
+        with self.condition:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.version += 1
+            self.condition.notify_all()
+
+    def update_progress(self, sim_aggregate: object) -> None:
+        # Partial results of the games that have been merged so far
+        num_games = sim_aggregate.num_games
+        self.update(progress={
+            "num_simulations_done": num_games,
+            "num_simulations": self.params.get("num_simulations"),
+            "home_win_pct": round(100 * (sim_aggregate.home_wins / num_games), 2) if num_games > 0 else None,
+            "average_score_diff": round(sim_aggregate.get_score_diff_mean(), 2) if num_games > 0 else None,
+        })
+
+    def wait_for_update(self, last_version: int, timeout: float) -> int:
+        # Blocks until the job changes after last_version (or the timeout passes) and returns the current version
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != last_version, timeout=timeout)
+            return self.version
+
+    def to_dict(self) -> dict:
+        with self.condition:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "params": self.params,
+                "progress": self.progress,
+                "error": self.error,
+                "created_at": self.created_at,
+                "started_at": self.started_at,
+                "finished_at": self.finished_at,
+            }
+
+class SimulationJobManager:
+    # Runs simulation jobs on a shared background executor so that requests only submit work and poll for it.
+    # Finished jobs are kept (oldest evicted first) so that their results can be retrieved later.
+    def __init__(self, max_workers=2, max_finished_jobs=100):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="simulation-job")
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs = OrderedDict()
+        self.lock = Lock()
+
+    def submit(self, run_job, params: dict) -> SimulationJob:
+        # run_job is called with a progress callback that takes the running SimulationAggregate and returns the job's result
+        job = SimulationJob(uuid.uuid4().hex, params)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self.evict_finished_jobs()
+        self.executor.submit(self.run, job, run_job)
+        return job
+
+    def run(self, job: SimulationJob, run_job) -> None:
+        job.update(status="running", started_at=time())
+        try:
+            result = run_job(job.update_progress)
+        except Exception as e:
+            job.update(status="failed", error=str(e), finished_at=time())
+            return
+        job.update(status="completed", result=result, finished_at=time())
+
+    def get_job(self, job_id: str) -> SimulationJob:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def evict_finished_jobs(self) -> None:
+        finished_job_ids = [job_id for job_id, job in self.jobs.items() if job.is_finished()]
+        for job_id in finished_job_ids[:max(0, len(finished_job_ids) - self.max_finished_jobs)]:
+            del self.jobs[job_id]
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False)
@@ -0,0 +1,78 @@
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+
+default_max_entries = 128
+default_ttl_seconds = 7 * 24 * 60 * 60
+
+class SimulationResultCache:
+    # Bounded cache of simulation results. The least recently used entry is evicted once max_entries is reached, and
+    # entries older than ttl_seconds are treated as misses. Keys should include the team stats version so that a
+    # result is never served for stats other than the ones it was simulated with.
+    def __init__(self, max_entries=default_max_entries, ttl_seconds=default_ttl_seconds):
+        if max_entries < 1:
+            raise ValueError(f"max_entries must be at least 1, got {max_entries}")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.entries = OrderedDict()
+        self.lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: tuple):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.is_expired(entry):
+                del self.entries[key]
+                self.evictions += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: tuple, result: dict) -> None:
+        with self.lock:
+            self.entries[key] = (monotonic(), result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key: tuple, compute_result) -> dict:
+        # compute_result runs outside of the lock, so identical requests that arrive together may both compute the result
+        result = self.get(key)
+        if result is None:
+            result = compute_result()
+            self.put(key, result)
+        return result
+
+    def is_expired(self, entry: tuple) -> bool:
+        return self.ttl_seconds is not None and monotonic() - entry[0] > self.ttl_seconds
+
+    def invalidate(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.invalidations += 1
+
+    def watch_team_stats(self, team_stats_store: object) -> None:
+        # Drops every cached result whenever the store's stats change
+        team_stats_store.add_refresh_listener(lambda store: self.invalidate())
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            num_lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / num_lookups, 4) if num_lookups > 0 else None,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,56 @@
+import importlib.util
+import os
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime
+import instrumentation
+
+sink_file_formats = ["csv", "parquet"]
+
+def get_run_id(home_team_name: str, away_team_name: str) -> str:
+    return f"{home_team_name}_{away_team_name}_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+class SimulationStatsSink:
+    # Writes the tables of simulation runs to files on a background thread so that requests don't wait on disk I/O.
+    # Every file name starts with the run id, so concurrent runs never overwrite each other's files.
+    def __init__(self, output_dir="logs", file_format="csv"):
+        if file_format not in sink_file_formats:
+            raise ValueError(f"Invalid stats sink file format: {file_format}")
+        if file_format == "parquet" and importlib.util.find_spec("pyarrow") is None and importlib.util.find_spec("fastparquet") is None:
+            raise ValueError("Writing Parquet files requires pyarrow or fastparquet to be installed")
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="simulation-stats-sink")
+
+    def get_file_path(self, run_id: str, table_name: str) -> str:
+        return os.path.join(self.output_dir, f"{run_id}_{table_name}.{self.file_format}")
+
+    def write(self, run_id: str, tables: dict) -> Future:
+        # tables maps table names to DataFrames. Returns a future of the written file paths.
+        future = self.executor.submit(self.write_tables, run_id, tables)
+        future.add_done_callback(self.report_write_error)
+        return future
+
+    def write_tables(self, run_id: str, tables: dict) -> list:
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_paths = []
+        with instrumentation.timed("stats_sink_write"):
+            for table_name, table_df in tables.items():
+                file_path = self.get_file_path(run_id, table_name)
+                if self.file_format == "parquet":
+                    table_df.to_parquet(file_path, index=False)
+                else:
+                    table_df.to_csv(file_path, index=False)
+                file_paths.append(file_path)
+        return file_paths
+
+    def report_write_error(self, future: Future) -> None:
+        if future.exception() is not None:
+            print(f"Failed to write simulation stats: {future.exception()}")
+
+    def flush(self) -> None:
+        # Writes are run in submission order, so this returns once every earlier write has finished
+        self.executor.submit(lambda: None).result()
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=True)
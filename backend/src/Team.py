@@ -1,18 +1,71 @@
 import numpy as np
 from scipy.stats import lognorm
 
+default_sample_block_size = 1024
+
+class DistributionSampler:
+    # Serves samples of a frozen scipy distribution from a preallocated block that is refilled in bulk,
+    # which avoids paying the per-call overhead of rvs() on every play
+    def __init__(self, distribution, block_size=default_sample_block_size, rng=None):
+        if block_size < 1:
+            raise ValueError(f"Invalid sample block size: {block_size}")
+        self.distribution = distribution
+        self.block_size = block_size
+        self.block = np.empty(block_size)
+        self.cursor = block_size
+        self.rng = rng
+
+    def refill(self) -> None:
+        # Falls back to scipy's global random state when no Generator has been attached
+        self.block[:] = self.distribution.rvs(size=self.block_size, random_state=self.rng)
+        self.cursor = 0
+
+    def reset(self, rng) -> None:
+        # Discards any buffered samples so that every following sample comes from rng
+        self.rng = rng
+        self.cursor = self.block_size
+
+    def sample(self) -> float:
+        if self.cursor >= self.block_size:
+            self.refill()
+        value = self.block[self.cursor]
+        self.cursor += 1
+        return value
+
+    def sample_many(self, size: int) -> np.ndarray:
+        samples = np.empty(size)
+        filled = 0
+        while filled < size:
+            if self.cursor >= self.block_size:
+                self.refill()
+            num_taken = min(size - filled, self.block_size - self.cursor)
+            samples[filled:filled + num_taken] = self.block[self.cursor:self.cursor + num_taken]
+            self.cursor += num_taken
+            filled += num_taken
+        return samples
+
 class Team:
-    def __init__(self, name: str, stats: dict):
+    def __init__(self, name: str, stats: dict, sample_block_size=default_sample_block_size):
         self.name = name
         self.stats = stats
+        self.sample_block_size = sample_block_size
+        self.game_model_str = None
         self.off_passing_distribution = None
         self.off_rushing_distribution = None
         self.def_passing_distribution = None
         self.def_rushing_distribution = None
         self.enhanced_off_passing_dist = None
         self.enhanced_def_passing_dist = None
+        self.samplers = {}
+        self.sample_rng = None
+        # Matchup contexts of the game models, keyed by the defense, model code and offense weight (see GameModels.MatchupContext)
+        self.matchup_contexts = {}
 
     def setup_teams_for_game_model(self, game_model_str: str):
+        # The distributions (and their sample buffers) only need to be rebuilt when the game model changes
+        if game_model_str == self.game_model_str:
+            return
+
         if game_model_str == "proto":
             pass
         elif game_model_str == "v1" or game_model_str == "v1a":
@@ -29,6 +82,14 @@ class Team:
             self.def_rushing_distribution = self.init_distribution("def_rush_yards_per_play_mean", "def_rush_yards_per_play_variance")
         else:
             raise ValueError(f"Invalid game model string: {game_model_str}")
+
+        self.samplers = {}
+        for dist_attr in ["off_passing_distribution", "off_rushing_distribution", "def_passing_distribution",
+                          "def_rushing_distribution", "enhanced_off_passing_dist", "enhanced_def_passing_dist"]:
+            dist = getattr(self, dist_attr)
+            if dist is not None:
+                self.samplers[dist_attr] = DistributionSampler(dist, self.sample_block_size, self.sample_rng)
+        self.game_model_str = game_model_str
     
     def init_distribution(self, mean_col_name: str, variance_col_name: str):
         mean = self.get_stat(mean_col_name)
@@ -38,23 +99,35 @@ class Team:
         dist = lognorm(s=sigma, scale=np.exp(mu))
         return dist
     
-    def sample_offensive_passing_play(self) -> float:
-        return self.off_passing_distribution.rvs()
+    def sample_offensive_passing_play(self, size=None) -> float:
+        return self.draw_samples("off_passing_distribution", size)
     
-    def sample_offensive_rushing_play(self) -> float:
-        return self.off_rushing_distribution.rvs()
+    def sample_offensive_rushing_play(self, size=None) -> float:
+        return self.draw_samples("off_rushing_distribution", size)
     
-    def sample_offensive_air_yards(self) -> float:
-        return self.enhanced_off_passing_dist.rvs()
+    def sample_offensive_air_yards(self, size=None) -> float:
+        return self.draw_samples("enhanced_off_passing_dist", size)
     
-    def sample_defensive_passing_play(self) -> float:
-        return self.def_passing_distribution.rvs()
+    def sample_defensive_passing_play(self, size=None) -> float:
+        return self.draw_samples("def_passing_distribution", size)
     
-    def sample_defensive_rushing_play(self) -> float:
-        return self.def_rushing_distribution.rvs()
+    def sample_defensive_rushing_play(self, size=None) -> float:
+        return self.draw_samples("def_rushing_distribution", size)
     
-    def sample_defensive_air_yards(self) -> float:
-        return self.enhanced_def_passing_dist.rvs()
+    def sample_defensive_air_yards(self, size=None) -> float:
+        return self.draw_samples("enhanced_def_passing_dist", size)
+
+    def reset_samplers(self, rng) -> None:
+        # Attaches a Generator to every distribution sampler (including ones built later by setup_teams_for_game_model)
+        self.sample_rng = rng
+        for sampler in self.samplers.values():
+            sampler.reset(rng)
+
+    def draw_samples(self, dist_attr: str, size=None):
+        sampler = self.samplers[dist_attr]
+        if size is None:
+            return sampler.sample()
+        return sampler.sample_many(size)
 
     def __str__(self):
         return f"Team object representing {self.name}"
@@ -70,6 +143,8 @@ class Team:
     
     def set_stats(self, stats: dict) -> None:
         self.stats = stats
+        self.game_model_str = None
+        self.matchup_contexts = {}
 
     def get_stat(self, key: str) -> any:
         return self.stats[key]
\ No newline at end of file
@@ -0,0 +1,131 @@
+import mmap
+import os
+import sys
+from collections.abc import Mapping
+import numpy as np
+from Team import Team
+
+default_team_params_dir = "team_params"
+
+# Layout of a team parameter file: the header, the team abbreviations, the column names and then a row-major float64 matrix
+# of teams x columns (missing values are NaN). The matrix starts on an 8-byte boundary so rows can be read in place.
+team_params_magic = b"SIMTPRM1"
+team_params_header_dtype = np.dtype([("magic", "S8"), ("season", "<i4"), ("num_teams", "<i4"), ("num_columns", "<i4"),
+                                     ("stats_version", "S20")])
+team_abbrev_dtype = np.dtype("S8")
+column_name_dtype = np.dtype("S64")
+team_params_value_dtype = np.dtype("<f8")
+
+def get_team_params_path(season: int) -> str:
+    # One file per season (set SIM_ENGINE_TEAM_PARAMS_DIR to keep them somewhere else)
+    return os.path.join(os.environ.get("SIM_ENGINE_TEAM_PARAMS_DIR", default_team_params_dir), f"team_params_{season}.bin")
+
+def get_team_params_matrix_offset(num_teams: int, num_columns: int) -> int:
+    names_end = team_params_header_dtype.itemsize + num_teams * team_abbrev_dtype.itemsize + num_columns * column_name_dtype.itemsize
+    return -(-names_end // team_params_value_dtype.itemsize) * team_params_value_dtype.itemsize
+
+def write_team_params(path: str, season: int, team_stats: dict, stats_version: str) -> None:
+    # team_stats maps team abbreviations to rows of stats like the ones in TeamStatsStore. Every column other than "team" must be numeric.
+    team_abbrevs = sorted(team_stats.keys())
+    if not team_abbrevs:
+        raise ValueError("No team stats to write")
+    column_names = [column for column in team_stats[team_abbrevs[0]].keys() if column != "team"]
+    for names, name_dtype in [(team_abbrevs, team_abbrev_dtype), (column_names, column_name_dtype)]:
+        for name in names:
+            if len(name.encode("utf-8")) > name_dtype.itemsize:
+                raise ValueError(f"Name is too long for the team parameter file: {name}")
+
+    values = np.empty((len(team_abbrevs), len(column_names)), dtype=team_params_value_dtype)
+    for i, team_abbrev in enumerate(team_abbrevs):
+        team_row = team_stats[team_abbrev]
+        for j, column in enumerate(column_names):
+            value = team_row[column]
+            try:
+                values[i, j] = np.nan if value is None else float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f"Team stat {column} of {team_abbrev} is not numeric: {value!r}")
+
+    header = np.zeros(1, dtype=team_params_header_dtype)
+    header[0] = (team_params_magic, season, len(team_abbrevs), len(column_names), stats_version.encode("utf-8"))
+    matrix_offset = get_team_params_matrix_offset(len(team_abbrevs), len(column_names))
+
+    params_dir = os.path.dirname(path)
+    if params_dir:
+        os.makedirs(params_dir, exist_ok=True)
+    # Written to a temporary file that replaces the old one, so processes that have the old file mapped keep reading a complete copy
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    with open(temp_path, "wb") as params_file:
+        params_file.write(header.tobytes())
+        params_file.write(np.array(team_abbrevs, dtype=team_abbrev_dtype).tobytes())
+        params_file.write(np.array(column_names, dtype=column_name_dtype).tobytes())
+        params_file.write(b"\0" * (matrix_offset - params_file.tell()))
+        params_file.write(values.tobytes())
+    os.replace(temp_path, path)
+
+class TeamParamRow(Mapping):
+    # Read-only view of one team's row of a TeamParamStore that can be used in place of a stats dict (e.g. by Team.get_stat)
+    __slots__ = ("name", "values", "column_indices")
+
+    def __init__(self, name: str, values: memoryview, column_indices: dict):
+        self.name = name
+        self.values = values
+        self.column_indices = column_indices
+
+    def __getitem__(self, key: str) -> any:
+        if key == "team":
+            return self.name
+        return self.values[self.column_indices[key]]
+
+    def __iter__(self):
+        yield "team"
+        yield from self.column_indices
+
+    def __len__(self) -> int:
+        return len(self.column_indices) + 1
+
+class TeamParamStore:
+    # The team parameters of one season, memory-mapped read-only from a file written by write_team_params. Opening a store only
+    # reads the header and names, and every process that maps the same file shares the pages of the OS page cache instead of
+    # holding its own copy of the stats.
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as params_file:
+            self.mapped_file = mmap.mmap(params_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header = np.frombuffer(self.mapped_file, dtype=team_params_header_dtype, count=1)[0]
+        if header["magic"] != team_params_magic:
+            raise ValueError(f"Not a team parameter file: {path}")
+        self.season = int(header["season"])
+        self.stats_version = header["stats_version"].decode("utf-8")
+        num_teams = int(header["num_teams"])
+        num_columns = int(header["num_columns"])
+
+        offset = team_params_header_dtype.itemsize
+        team_abbrevs = np.frombuffer(self.mapped_file, dtype=team_abbrev_dtype, count=num_teams, offset=offset)
+        offset += team_abbrevs.nbytes
+        column_names = np.frombuffer(self.mapped_file, dtype=column_name_dtype, count=num_columns, offset=offset)
+        self.team_abbrevs = [team_abbrev.decode("utf-8") for team_abbrev in team_abbrevs]
+        self.column_names = [column.decode("utf-8") for column in column_names]
+        self.column_indices = {column: j for j, column in enumerate(self.column_names)}
+
+        matrix_offset = get_team_params_matrix_offset(num_teams, num_columns)
+        self.values = np.frombuffer(self.mapped_file, dtype=team_params_value_dtype, count=num_teams * num_columns,
+                                    offset=matrix_offset).reshape(num_teams, num_columns)
+        # Rows are read through memoryviews since indexing them returns plain floats, which is faster than indexing an array.
+        # A memoryview can only be cast to the machine's own byte order.
+        if sys.byteorder != "little":
+            raise ValueError("Team parameter files can only be mapped on little-endian machines")
+        matrix_view = memoryview(self.mapped_file)[matrix_offset:matrix_offset + self.values.nbytes].cast("d")
+        self.rows = {team_abbrev: TeamParamRow(team_abbrev, matrix_view[i * num_columns:(i + 1) * num_columns], self.column_indices)
+                     for i, team_abbrev in enumerate(self.team_abbrevs)}
+
+    def __len__(self) -> int:
+        return len(self.team_abbrevs)
+
+    def get_team_params(self, team_abbrev: str) -> TeamParamRow:
+        if team_abbrev not in self.rows:
+            raise ValueError(f"No team stats found for team: {team_abbrev}")
+        return self.rows[team_abbrev]
+
+    def get_team(self, team_abbrev: str) -> Team:
+        return Team(team_abbrev, self.get_team_params(team_abbrev))
@@ -0,0 +1,253 @@
+from GameEngine import GameEngine
+from GameModels import model_code_to_model_class
+from GameState import GameState, PlayResult
+from TeamStatsStore import TeamStatsStore
+from datetime import datetime, timezone
+from time import perf_counter
+import game_simulator
+import numpy as np
+import pandas as pd
+import scipy
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Offline benchmarks of the simulation engine at three levels:
+#   micro: single calls on the hot path of a game (resolve_play, update_game_state, sampling, 4th down calls, game summaries)
+#   macro: whole single-threaded and multi-process simulation runs at several sizes
+#   api: round trips of /run-simulation through the Flask test client
+# Every benchmark runs against the fixture team stats, so the database is never touched. Run it from backend/src since the
+# game models are loaded from game_models/.
+
+benchmark_levels = ["micro", "macro", "api"]
+default_fixture_path = os.path.join("benchmark_fixtures", "team_stats.json")
+default_home_team = "BUF"
+default_away_team = "PHI"
+default_single_threaded_sizes = [100, 500]
+default_multi_process_sizes = [1000, 5000]
+default_api_num_simulations = 1000
+default_regression_threshold = 0.1
+
+# Team sampling methods and the distribution each of them draws from
+team_sample_methods = {
+    "sample_offensive_passing_play": "off_passing_distribution",
+    "sample_offensive_rushing_play": "off_rushing_distribution",
+    "sample_offensive_air_yards": "enhanced_off_passing_dist",
+    "sample_defensive_passing_play": "def_passing_distribution",
+    "sample_defensive_rushing_play": "def_rushing_distribution",
+    "sample_defensive_air_yards": "enhanced_def_passing_dist",
+}
+
+def load_fixture_team_stats(fixture_path=default_fixture_path) -> TeamStatsStore:
+    with open(fixture_path, "r") as fixture_file:
+        fixture = json.load(fixture_file)
+    team_stats_store = TeamStatsStore(fixture["season"])
+    team_stats_store.set_team_stats(fixture["teams"])
+    return team_stats_store
+
+def use_fixture_team_stats(fixture_path=default_fixture_path) -> TeamStatsStore:
+    # The runners in game_simulator use the process-wide store, so they read the fixture stats instead of the database
+    game_simulator.team_stats_store = load_fixture_team_stats(fixture_path)
+    return game_simulator.team_stats_store
+
+def time_call(function, number: int, repeat: int, setup=None) -> dict:
+    # Times repeat batches of number calls and reports the per-call time of each batch. setup (if given) runs before
+    # every batch and isn't timed.
+    batch_times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        batch_start = perf_counter()
+        for _ in range(number):
+            function()
+        batch_times.append((perf_counter() - batch_start) / number)
+    return {
+        "seconds": statistics.median(batch_times),
+        "min_seconds": min(batch_times),
+        "max_seconds": max(batch_times),
+        "number": number,
+        "repeat": repeat,
+    }
+
+def get_environment_metadata() -> dict:
+    try:
+        git_commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        git_commit = None
+    return {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "numpy_version": np.__version__,
+        "pandas_version": pd.__version__,
+        "scipy_version": scipy.__version__,
+    }
+
+def run_micro_benchmarks(model_codes: list, home_team_abbrev=default_home_team, away_team_abbrev=default_away_team, number=1000,
+                         repeat=5) -> dict:
+    results = {}
+    team_stats_store = game_simulator.get_team_stats_store()
+    for model_code in model_codes:
+        game_model = model_code_to_model_class[model_code]()
+        game_model.warm_up()
+        home_team = team_stats_store.get_team(home_team_abbrev)
+        away_team = team_stats_store.get_team(away_team_abbrev)
+        rng = game_simulator.initialize_rng(home_team, away_team, 0)
+        home_team.setup_teams_for_game_model(model_code)
+        away_team.setup_teams_for_game_model(model_code)
+
+        game_state = GameState(home_team, away_team)
+        results[f"micro.{model_code}.resolve_play"] = time_call(lambda: game_model.resolve_play(game_state, rng), number, repeat)
+
+        if hasattr(game_model, "handle_4th_down"):
+            fourth_down_state = GameState(home_team, away_team, quarter=4, game_seconds_remaining=400, quarter_seconds_remaining=400,
+                                          yardline=38, down=4, distance=3, home_score=17, away_score=20)
+            results[f"micro.{model_code}.handle_4th_down"] = time_call(lambda: game_model.handle_4th_down(fourth_down_state, rng), number, repeat)
+
+        # Every batch starts from the opening kickoff so that it never runs past the end of the first quarter
+        game_engine = GameEngine(home_team, away_team, game_model, rng)
+        play_result = PlayResult("run", None, 4.0, 5, 1, 900, False, False, home_team.name)
+        def reset_game_state():
+            game_engine.game_state = GameState(home_team, away_team)
+            game_engine.game_state.play_log = None
+        results[f"micro.{model_code}.update_game_state"] = time_call(lambda: game_engine.update_game_state(play_result),
+                                                                     min(number, 150), repeat, reset_game_state)
+
+        finished_game_engine = GameEngine(home_team, away_team, game_model, rng)
+        finished_game_engine.run_simulation(test_mode=True, log_mode="summary")
+        results[f"micro.{model_code}.get_game_summary"] = time_call(
+            lambda: finished_game_engine.get_game_summary(test_mode=True, log_mode="summary"), number, repeat)
+
+        # Only the samplers that the model's distributions were built for
+        for sample_method_name, dist_attr in team_sample_methods.items():
+            if dist_attr in home_team.samplers:
+                results[f"micro.{model_code}.Team.{sample_method_name}"] = time_call(getattr(home_team, sample_method_name), number, repeat)
+    return results
+
+def run_macro_benchmarks(model_codes: list, home_team_abbrev=default_home_team, away_team_abbrev=default_away_team,
+                         single_threaded_sizes=default_single_threaded_sizes, multi_process_sizes=default_multi_process_sizes,
+                         num_workers=None, repeat=1) -> dict:
+    results = {}
+    for model_code in model_codes:
+        game_model = model_code_to_model_class[model_code]()
+        for num_simulations in single_threaded_sizes:
+            results[f"macro.{model_code}.single_threaded.{num_simulations}"] = time_call(
+                lambda: game_simulator.run_multiple_simulations_with_statistics(home_team_abbrev, away_team_abbrev, num_simulations, game_model,
+                                                                                seed=0), 1, repeat)
+        for num_simulations in multi_process_sizes:
+            results[f"macro.{model_code}.multi_process.{num_simulations}"] = time_call(
+                lambda: game_simulator.run_multiple_simulations_multi_threaded(home_team_abbrev, away_team_abbrev, num_simulations, game_model,
+                                                                               num_workers=num_workers, seed=0), 1, repeat)
+    return results
+
+def run_api_benchmarks(model_codes: list, home_team_abbrev=default_home_team, away_team_abbrev=default_away_team,
+                       num_simulations=default_api_num_simulations, num_workers=None, repeat=3) -> dict:
+    # The API's worker pool is started up front with the fixture stats, so only the request round trip is timed
+    import simulation_engine_api
+    results = {}
+    number_of_workers = num_workers if num_workers else max(1, os.cpu_count() // 2)
+    # The fixture stats are written to their own team parameter file so the season's real one is left alone
+    params_dir = tempfile.TemporaryDirectory()
+    team_stats_store = game_simulator.get_team_stats_store()
+    team_params_paths = {team_stats_store.season: team_stats_store.save_team_params(os.path.join(params_dir.name, "team_params.bin"))}
+    with params_dir, game_simulator.create_simulation_worker_pool(number_of_workers, team_params_paths, model_codes) as executor:
+        simulation_engine_api.simulation_pool = executor
+        simulation_engine_api.simulation_pool_size = number_of_workers
+        client = simulation_engine_api.app.test_client()
+        try:
+            results["api.health"] = time_call(lambda: check_response(client.get("/health")), 1, repeat)
+            for model_code in model_codes:
+                request_body = {"home_team": home_team_abbrev, "away_team": away_team_abbrev, "num_simulations": num_simulations,
+                                "game_model": model_code, "seed": 0, "use_cache": False}
+                results[f"api.{model_code}.run_simulation.{num_simulations}"] = time_call(
+                    lambda: check_response(client.post("/run-simulation", json=request_body)), 1, repeat)
+        finally:
+            simulation_engine_api.simulation_pool = None
+    return results
+
+def check_response(response: object) -> None:
+    if response.status_code != 200:
+        raise RuntimeError(f"Request to {response.request.path} failed with status {response.status_code}: {response.get_data(as_text=True)}")
+
+def compare_to_baseline(results: dict, baseline_results: dict, threshold=default_regression_threshold) -> list:
+    # A benchmark has regressed when its median time is more than threshold (a fraction) slower than in the baseline.
+    # Benchmarks that are missing from either run are skipped.
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline_results:
+            continue
+        baseline_seconds = baseline_results[name]["seconds"]
+        change = (result["seconds"] - baseline_seconds) / baseline_seconds if baseline_seconds > 0 else 0.0
+        if change > threshold:
+            regressions.append({"name": name, "baseline_seconds": baseline_seconds, "seconds": result["seconds"], "change": round(change, 4)})
+    return regressions
+
+def run_benchmark_suite(levels=benchmark_levels, model_codes=None, fixture_path=default_fixture_path, num_workers=None,
+                        single_threaded_sizes=default_single_threaded_sizes, multi_process_sizes=default_multi_process_sizes,
+                        micro_number=1000, micro_repeat=5) -> dict:
+    invalid_levels = [level for level in levels if level not in benchmark_levels]
+    if invalid_levels:
+        raise ValueError(f"Invalid benchmark levels: {', '.join(invalid_levels)}")
+    if model_codes is None:
+        model_codes = list(model_code_to_model_class.keys())
+    use_fixture_team_stats(fixture_path)
+
+    results = {}
+    if "micro" in levels:
+        results.update(run_micro_benchmarks(model_codes, number=micro_number, repeat=micro_repeat))
+    if "macro" in levels:
+        results.update(run_macro_benchmarks(model_codes, single_threaded_sizes=single_threaded_sizes, multi_process_sizes=multi_process_sizes,
+                                            num_workers=num_workers))
+    if "api" in levels:
+        results.update(run_api_benchmarks(model_codes, num_workers=num_workers))
+    return {
+        "environment": get_environment_metadata(),
+        "config": {"levels": list(levels), "model_codes": model_codes, "fixture_path": fixture_path, "num_workers": num_workers,
+                   "single_threaded_sizes": single_threaded_sizes, "multi_process_sizes": multi_process_sizes},
+        "results": results,
+    }
+
+def main(args=None) -> int:
+    parser = argparse.ArgumentParser(description="Run the simulation engine benchmark suite")
+    parser.add_argument("--levels", nargs="+", default=benchmark_levels, choices=benchmark_levels)
+    parser.add_argument("--models", nargs="+", default=None, choices=list(model_code_to_model_class.keys()))
+    parser.add_argument("--fixture", default=default_fixture_path)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--single-threaded-sizes", nargs="+", type=int, default=default_single_threaded_sizes)
+    parser.add_argument("--multi-process-sizes", nargs="+", type=int, default=default_multi_process_sizes)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--baseline", default=None, help="Results file of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=default_regression_threshold)
+    parsed_args = parser.parse_args(args)
+
+    benchmark_run = run_benchmark_suite(parsed_args.levels, parsed_args.models, parsed_args.fixture, parsed_args.workers,
+                                        parsed_args.single_threaded_sizes, parsed_args.multi_process_sizes)
+    with open(parsed_args.output, "w") as output_file:
+        json.dump(benchmark_run, output_file, indent=4)
+    print(f"Benchmark results have been written to '{parsed_args.output}'.")
+    for name, result in benchmark_run["results"].items():
+        print(f"{name}: {result['seconds']:.3g}s")
+
+    if parsed_args.baseline is None:
+        return 0
+    with open(parsed_args.baseline, "r") as baseline_file:
+        baseline_run = json.load(baseline_file)
+    regressions = compare_to_baseline(benchmark_run["results"], baseline_run["results"], parsed_args.threshold)
+    for regression in regressions:
+        print(f"Regression in {regression['name']}: {regression['baseline_seconds']:.3g}s -> {regression['seconds']:.3g}s "
+              f"({100 * regression['change']:.1f}% slower)")
+    if regressions:
+        return 1
+    print(f"No benchmarks regressed by more than {100 * parsed_args.threshold:.0f}% against '{parsed_args.baseline}'.")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+from contextlib import contextmanager
+from threading import Lock, local
+from time import perf_counter
+import os
+
+# Per-phase call counts and total times. Instrumentation is off by default and is turned on for a process (and the worker
+# processes it starts) with SIM_ENGINE_INSTRUMENTATION=1. Hot loops check `enabled` once and skip the timing calls entirely
+# when it is off, so it costs close to nothing unless it's being used.
+enabled = os.environ.get("SIM_ENGINE_INSTRUMENTATION", "0") == "1"
+
+# Phase name -> [call count, total seconds] over the lifetime of the process
+phase_records = {}
+phase_records_lock = Lock()
+
+# Collectors of the phases recorded by the current thread (e.g. for a single request)
+thread_collectors = local()
+
+def set_enabled(value: bool) -> None:
+    global enabled
+    enabled = value
+
+def add_to_records(records: dict, phase: str, count: int, seconds: float) -> None:
+    phase_record = records.get(phase)
+    if phase_record is None:
+        records[phase] = [count, seconds]
+    else:
+        phase_record[0] += count
+        phase_record[1] += seconds
+
+def record(phase: str, seconds: float, count=1) -> None:
+    # Goes to the thread's active collectors (innermost first) and then to the process-wide records, unless a collector
+    # keeps what it collects to itself
+    for collector, propagate in reversed(getattr(thread_collectors, "active", [])):
+        add_to_records(collector, phase, count, seconds)
+        if not propagate:
+            return
+    with phase_records_lock:
+        add_to_records(phase_records, phase, count, seconds)
+
+def merge(snapshot: dict) -> None:
+    # Adds a snapshot taken in another process (e.g. the phases of a simulation chunk run by a worker)
+    for phase, (count, seconds) in snapshot.items():
+        record(phase, seconds, count)
+
+@contextmanager
+def timed(phase: str):
+    if not enabled:
+        yield
+        return
+    start_time = perf_counter()
+    try:
+        yield
+    finally:
+        record(phase, perf_counter() - start_time)
+
+@contextmanager
+def collect(propagate=True):
+    # Collects every phase recorded by this thread inside the with block into the yielded dict. With propagate=False the
+    # phases are only kept in the collector, e.g. when they are sent to another process that merges them itself.
+    collector = {}
+    if not hasattr(thread_collectors, "active"):
+        thread_collectors.active = []
+    collector_entry = (collector, propagate)
+    thread_collectors.active.append(collector_entry)
+    try:
+        yield collector
+    finally:
+        thread_collectors.active.remove(collector_entry)
+
+def snapshot() -> dict:
+    with phase_records_lock:
+        return {phase: list(phase_record) for phase, phase_record in phase_records.items()}
+
+def reset() -> None:
+    with phase_records_lock:
+        phase_records.clear()
+
+def get_timing_breakdown(records: dict) -> dict:
+    return {
+        phase: {"count": count, "total_seconds": round(seconds, 6), "mean_seconds": round(seconds / count, 9) if count > 0 else None}
+        for phase, (count, seconds) in sorted(records.items())
+    }
@@ -0,0 +1,204 @@
+from BatchGameEngine import BatchGameEngine
+from GameModels import model_code_to_model_class
+from SeasonAggregate import SeasonAggregate, num_playoff_seeds
+from game_simulator import create_simulation_worker_pool, get_worker_team, worker_game_models
+from TeamStatsStore import default_season
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from tqdm import tqdm
+from time import time
+import numpy as np
+import math
+import os
+import csv
+
+team_divisions = {
+    "AFC East": ["BUF", "MIA", "NE", "NYJ"],
+    "AFC North": ["BAL", "CIN", "CLE", "PIT"],
+    "AFC South": ["HOU", "IND", "JAX", "TEN"],
+    "AFC West": ["DEN", "KC", "LAC", "LV"],
+    "NFC East": ["DAL", "NYG", "PHI", "WAS"],
+    "NFC North": ["CHI", "DET", "GB", "MIN"],
+    "NFC South": ["ATL", "CAR", "NO", "TB"],
+    "NFC West": ["ARI", "LA", "SEA", "SF"],
+}
+team_division_names = {team_abbrev: division for division, team_abbrevs in team_divisions.items() for team_abbrev in team_abbrevs}
+conferences = ["AFC", "NFC"]
+
+default_schedule_path = "schedule.txt"
+default_seasons_per_chunk = 100
+
+def get_team_conference(team_abbrev: str) -> str:
+    return team_division_names[team_abbrev].split(" ")[0]
+
+def parse_schedule(lines: list) -> list:
+    # Same 'HOME v AWAY' format as input.txt, with one line per scheduled game (blank lines are skipped)
+    schedule = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        teams = line.split(" v ")
+        if len(teams) != 2:
+            raise ValueError(f"Invalid matchup format: '{line}'. Must be 'TEAM_A v TEAM_B'.")
+        schedule.append((teams[0], teams[1]))
+
+    if not schedule:
+        raise ValueError("The schedule has no games")
+    unknown_teams = sorted({team_abbrev for game in schedule for team_abbrev in game if team_abbrev not in team_division_names})
+    if unknown_teams:
+        raise ValueError(f"Unknown teams in schedule: {', '.join(unknown_teams)}")
+    return schedule
+
+def read_schedule(file_path: str) -> list:
+    with open(file_path, mode='r') as schedule_file:
+        return parse_schedule(schedule_file.readlines())
+
+def get_schedule_teams(schedule: list) -> list:
+    return sorted({team_abbrev for game in schedule for team_abbrev in game})
+
+def rank_season_standings(team_abbrevs: list, wins: np.ndarray, losses: np.ndarray, ties: np.ndarray, point_diff: np.ndarray,
+                          rng: np.random.Generator) -> tuple:
+    # Returns the division winners and playoff seeds of every simulated season (one column per season). Teams are ranked
+    # by win percentage, with point differential and then a coin toss as simplified tiebreakers. Division winners get
+    # the top seeds of their conference and the remaining seeds go to the best other teams.
+    num_seasons = wins.shape[1]
+    season_indices = np.arange(num_seasons)
+    games_played = wins + losses + ties
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_pct = np.where(games_played > 0, (wins + 0.5 * ties) / games_played, 0.0)
+    coin_toss = rng.random(wins.shape)
+
+    division_winners = np.zeros(wins.shape, dtype=bool)
+    for division_team_abbrevs in team_divisions.values():
+        rows = np.array([i for i, team_abbrev in enumerate(team_abbrevs) if team_abbrev in division_team_abbrevs], dtype=np.int64)
+        if rows.size == 0:
+            continue
+        # lexsort sorts by the last key first, in ascending order, so the division winner is the last team of each column
+        order = np.lexsort((coin_toss[rows], point_diff[rows], win_pct[rows]), axis=0)
+        division_winners[rows[order[-1]], season_indices] = True
+
+    seeds = np.zeros(wins.shape, dtype=np.int64)
+    for conference in conferences:
+        rows = np.array([i for i, team_abbrev in enumerate(team_abbrevs) if get_team_conference(team_abbrev) == conference], dtype=np.int64)
+        if rows.size == 0:
+            continue
+        order = np.lexsort((coin_toss[rows], point_diff[rows], win_pct[rows], division_winners[rows]), axis=0)[::-1]
+        for seed in range(1, min(num_playoff_seeds, rows.size) + 1):
+            seeds[rows[order[seed - 1]], season_indices] = seed
+    return division_winners, seeds
+
+def run_season_chunk_in_worker(schedule: list, model_code: str, num_seasons: int, seed_sequence=None, season=default_season) -> SeasonAggregate:
+    # Plays every scheduled game num_seasons times in lockstep with the BatchGameEngine, using the worker's bound Team
+    # objects, and only keeps per-team totals of each season
+    rng = np.random.default_rng(seed_sequence)
+    game_model = worker_game_models[model_code]
+    team_abbrevs = get_schedule_teams(schedule)
+    team_indices = {team_abbrev: i for i, team_abbrev in enumerate(team_abbrevs)}
+    teams = {team_abbrev: get_worker_team(team_abbrev, model_code, season) for team_abbrev in team_abbrevs}
+    for team in teams.values():
+        team.reset_samplers(rng)
+
+    standings_shape = (len(team_abbrevs), num_seasons)
+    wins = np.zeros(standings_shape, dtype=np.int64)
+    losses = np.zeros(standings_shape, dtype=np.int64)
+    ties = np.zeros(standings_shape, dtype=np.int64)
+    points_for = np.zeros(standings_shape, dtype=np.int64)
+    points_against = np.zeros(standings_shape, dtype=np.int64)
+    for home_team_abbrev, away_team_abbrev in schedule:
+        batch_game_engine = BatchGameEngine(teams[home_team_abbrev], teams[away_team_abbrev], num_seasons, game_model, rng)
+        final_score = batch_game_engine.run_simulation()["final_score"]
+        home_score = final_score[home_team_abbrev]
+        away_score = final_score[away_team_abbrev]
+        home_index = team_indices[home_team_abbrev]
+        away_index = team_indices[away_team_abbrev]
+        wins[home_index] += home_score > away_score
+        losses[home_index] += home_score < away_score
+        wins[away_index] += away_score > home_score
+        losses[away_index] += away_score < home_score
+        ties[home_index] += home_score == away_score
+        ties[away_index] += home_score == away_score
+        points_for[home_index] += home_score
+        points_against[home_index] += away_score
+        points_for[away_index] += away_score
+        points_against[away_index] += home_score
+
+    division_winners, seeds = rank_season_standings(team_abbrevs, wins, losses, ties, points_for - points_against, rng)
+    season_aggregate = SeasonAggregate(team_abbrevs)
+    season_aggregate.add_seasons(wins, losses, ties, points_for, points_against, division_winners, seeds)
+    return season_aggregate
+
+def run_season_simulations_in_pool(executor: ProcessPoolExecutor, num_workers: int, schedule: list, model_code: str, num_seasons: int,
+                                   seed=None, seasons_per_chunk=default_seasons_per_chunk, season=default_season) -> dict:
+    if model_code not in model_code_to_model_class:
+        raise ValueError(f"Invalid game model code: {model_code}")
+    if num_seasons < 1:
+        raise ValueError("num_seasons must be positive")
+    print(f"Running {num_seasons} simulated seasons of {len(schedule)} games on the worker pool.")
+
+    # Seasons are split into chunks (at least one per worker) that each play the whole schedule
+    chunk_size = min(seasons_per_chunk, math.ceil(num_seasons / num_workers))
+    chunk_season_counts = [min(chunk_size, num_seasons - start) for start in range(0, num_seasons, chunk_size)]
+    chunk_seed_sequences = np.random.SeedSequence(seed).spawn(len(chunk_season_counts))
+    futures = [executor.submit(run_season_chunk_in_worker, schedule, model_code, chunk_season_count, chunk_seed_sequence, season)
+               for chunk_season_count, chunk_seed_sequence in zip(chunk_season_counts, chunk_seed_sequences)]
+
+    season_aggregate = SeasonAggregate(get_schedule_teams(schedule))
+    with tqdm(total=len(futures)) as pbar:
+        for future in as_completed(futures):
+            season_aggregate.merge(future.result())
+            pbar.update(1)
+    return generate_season_simulation_result(season_aggregate)
+
+def generate_season_simulation_result(season_aggregate: SeasonAggregate) -> dict:
+    # Probability tables per division (ordered by average wins) and per conference (ordered by playoff odds)
+    team_summaries = {team_abbrev: season_aggregate.get_team_summary(team_abbrev) for team_abbrev in season_aggregate.team_abbrevs}
+    division_tables = {}
+    for division, division_team_abbrevs in team_divisions.items():
+        rows = [team_summaries[team_abbrev] for team_abbrev in division_team_abbrevs if team_abbrev in team_summaries]
+        if rows:
+            division_tables[division] = sorted(rows, key=lambda row: row["average_wins"], reverse=True)
+    conference_tables = {}
+    for conference in conferences:
+        rows = [row for team_abbrev, row in team_summaries.items() if get_team_conference(team_abbrev) == conference]
+        if rows:
+            conference_tables[conference] = sorted(rows, key=lambda row: (row["playoff_pct"], row["average_wins"]), reverse=True)
+    return {
+        "num_seasons": season_aggregate.num_seasons,
+        "division_tables": division_tables,
+        "conference_tables": conference_tables,
+    }
+
+def run_season_simulations(schedule_path=default_schedule_path, num_seasons=1000, model_code="proto", num_workers=None, seed=None,
+                           seasons_per_chunk=default_seasons_per_chunk) -> dict:
+    season_run_start = time()
+    schedule = read_schedule(schedule_path)
+    number_of_workers = num_workers if num_workers else max(1, os.cpu_count() // 2)
+    with create_simulation_worker_pool(number_of_workers, model_codes=[model_code]) as executor:
+        season_result = run_season_simulations_in_pool(executor, number_of_workers, schedule, model_code, num_seasons, seed, seasons_per_chunk)
+
+    with open("season_predictions.csv", "w") as output_file:
+        seed_columns = [f"Seed {seed_number} %" for seed_number in range(1, num_playoff_seeds + 1)]
+        writer = csv.DictWriter(output_file, fieldnames=["Team", "Division", "Average Wins", "Average Losses", "Average Ties",
+                                                         "Division Title %", "Playoff %"] + seed_columns)
+        writer.writeheader()
+        for division, rows in season_result["division_tables"].items():
+            for row in rows:
+                csv_row = {
+                    "Team": row["team"],
+                    "Division": division,
+                    "Average Wins": row["average_wins"],
+                    "Average Losses": row["average_losses"],
+                    "Average Ties": row["average_ties"],
+                    "Division Title %": row["division_title_pct"],
+                    "Playoff %": row["playoff_pct"],
+                }
+                for seed_column, seed_pct in zip(seed_columns, row["seed_pcts"].values()):
+                    csv_row[seed_column] = seed_pct
+                writer.writerow(csv_row)
+
+    print("Season predictions have been written to 'season_predictions.csv'.")
+    print(f"Simulating {num_seasons} seasons took {time() - season_run_start} seconds.")
+    return season_result
+
+if __name__ == "__main__":
+    run_season_simulations(num_seasons=1000)
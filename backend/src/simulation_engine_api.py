@@ -1,33 +1,187 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-from game_simulator import run_multiple_simulations_with_statistics, run_multiple_simulations_multi_threaded
-from GameModels import PrototypeGameModel, GameModel_V1, GameModel_V1a, GameModel_V1b
-from time import time
+from game_simulator import run_multiple_simulations_with_statistics, run_multiple_simulations_batched, run_multiple_simulations_in_pool, \
+    create_simulation_worker_pool, check_simulation_worker, get_team_stats_store, run_multiple_simulations_adaptive_in_pool, \
+    default_win_pct_tolerance, default_score_diff_tolerance, default_adaptive_round_size
+from GameModels import model_code_to_model_class
+from season_simulator import run_season_simulations_in_pool, parse_schedule, read_schedule, default_schedule_path
+from SimulationJobManager import SimulationJobManager
+from SimulationResultCache import SimulationResultCache, default_max_entries, default_ttl_seconds
+from threading import Lock
+from time import time, perf_counter
+import instrumentation
+import atexit
+import json
+import os
 
 app  = Flask(__name__)
 CORS(app)
 
-model_str_to_model = {
-    "proto": PrototypeGameModel(),
-    "v1": GameModel_V1(),
-    "v1a": GameModel_V1a(),
-    "v1b": GameModel_V1b()
-}
+# Game models of the in-process endpoints, created on first use so that importing the API doesn't load every model's files
+game_models = {}
+
+def get_game_model(model_code: str):
+    if model_code not in model_code_to_model_class:
+        raise ValueError(f"Invalid game model code: {model_code}")
+    if model_code not in game_models:
+        game_models[model_code] = model_code_to_model_class[model_code]()
+    return game_models[model_code]
+
+# Size of the long-lived worker pool used by /run-simulation (set SIM_ENGINE_POOL_SIZE to override)
+simulation_pool_size = int(os.environ.get("SIM_ENGINE_POOL_SIZE", max(1, os.cpu_count() // 2)))
+simulation_pool = None
+simulation_pool_lock = Lock()
+
+def get_simulation_pool():
+    # The pool is created on first use rather than at import time since worker processes re-import this module
+    global simulation_pool
+    with simulation_pool_lock:
+        if simulation_pool is None:
+            print(f"Starting simulation worker pool with {simulation_pool_size} workers...")
+            simulation_pool = create_simulation_worker_pool(simulation_pool_size)
+        return simulation_pool
+
+# Results of recent runs, keyed by the run parameters and the team stats version (set SIM_ENGINE_CACHE_SIZE and
+# SIM_ENGINE_CACHE_TTL_SECONDS to override the size and expiry)
+simulation_result_cache = None
+simulation_result_cache_lock = Lock()
+
+def get_simulation_result_cache() -> SimulationResultCache:
+    global simulation_result_cache
+    with simulation_result_cache_lock:
+        if simulation_result_cache is None:
+            simulation_result_cache = SimulationResultCache(int(os.environ.get("SIM_ENGINE_CACHE_SIZE", default_max_entries)),
+                                                            float(os.environ.get("SIM_ENGINE_CACHE_TTL_SECONDS", default_ttl_seconds)))
+            simulation_result_cache.watch_team_stats(get_team_stats_store())
+        return simulation_result_cache
+
+def get_simulation_cache_key(data: dict, num_chunks=None) -> tuple:
+    # The pool size and chunk count are part of the key since seeded runs are only reproducible for the same chunking
+    cache_key = (data['home_team'], data['away_team'], data['game_model'], int(data['num_simulations']), get_seed(data),
+                 get_team_stats_store().stats_version, simulation_pool_size, num_chunks)
+    if data.get("adaptive"):
+        cache_key += ("adaptive", float(data.get("win_pct_tolerance", default_win_pct_tolerance)),
+                      float(data.get("score_diff_tolerance", default_score_diff_tolerance)),
+                      int(data.get("round_size", default_adaptive_round_size)))
+    return cache_key
+
+# Background jobs submitted through /jobs (set SIM_ENGINE_JOB_WORKERS to change how many run at once)
+simulation_job_manager = SimulationJobManager(max_workers=int(os.environ.get("SIM_ENGINE_JOB_WORKERS", 2)))
+job_chunks_per_worker = 4
+job_event_keepalive_seconds = 15
+
+@atexit.register
+def shutdown_simulation_pool():
+    global simulation_pool
+    with simulation_pool_lock:
+        if simulation_pool is not None:
+            simulation_pool.shutdown(wait=False)
+            simulation_pool = None
+    simulation_job_manager.shutdown()
+
+def get_seed(data: dict):
+    # Optional seed that makes a simulation run reproducible
+    seed = data.get("seed")
+    return int(seed) if seed is not None else None
 
 # Runs the simulation engine in the deafult multi-threaded mode
 @app.route('/run-simulation', methods=['POST'])
 def run_simulation():
     start_time = time()
     data = request.get_json()
-    home_team_abbrev = data['home_team']
-    away_team_abbrev = data['away_team']
-    num_simulations = int(data['num_simulations'])
-    game_model = model_str_to_model[data["game_model"]]
-    result_dict = run_multiple_simulations_multi_threaded(home_team_abbrev, away_team_abbrev, num_simulations, game_model=game_model)
+    result_dict = run_simulation_request(data)
     end_time = time()
     print(f"\nSimulation took {end_time - start_time} seconds on the backend!")
     return jsonify(result_dict)
 
+def run_simulation_request(data: dict, num_chunks=None, progress_callback=None) -> dict:
+    # The phases timed while serving the request are attached to the result if the request sets "include_timings"
+    if not data.get("include_timings"):
+        return run_simulation_request_with_cache(data, num_chunks, progress_callback)
+    request_start_time = perf_counter()
+    with instrumentation.collect() as request_phase_records:
+        result_dict = run_simulation_request_with_cache(data, num_chunks, progress_callback)
+    # Copied so that the timings don't end up in the cached result
+    return dict(result_dict, timings={"enabled": instrumentation.enabled, "request_seconds": round(perf_counter() - request_start_time, 6),
+                                      "phases": instrumentation.get_timing_breakdown(request_phase_records)})
+
+def run_simulation_request_with_cache(data: dict, num_chunks=None, progress_callback=None) -> dict:
+    # Results of seeded requests are served from the cache unless the request sets "use_cache" to false. Unseeded requests
+    # are never cached, so each one is a new random run (with its own run id and featured game).
+    if not data.get("use_cache", True) or get_seed(data) is None:
+        return run_simulation_request_uncached(data, num_chunks, progress_callback)
+    return get_simulation_result_cache().get_or_compute(get_simulation_cache_key(data, num_chunks),
+                                                        lambda: run_simulation_request_uncached(data, num_chunks, progress_callback))
+
+def run_simulation_request_uncached(data: dict, num_chunks=None, progress_callback=None) -> dict:
+    home_team_abbrev = data['home_team']
+    away_team_abbrev = data['away_team']
+    num_simulations = int(data['num_simulations'])
+    if data.get("adaptive"):
+        # num_simulations is the hard cap on the number of simulations in adaptive mode
+        return run_multiple_simulations_adaptive_in_pool(
+            get_simulation_pool, simulation_pool_size, home_team_abbrev, away_team_abbrev, data["game_model"], seed=get_seed(data),
+            win_pct_tolerance=float(data.get("win_pct_tolerance", default_win_pct_tolerance)),
+            score_diff_tolerance=float(data.get("score_diff_tolerance", default_score_diff_tolerance)),
+            max_simulations=num_simulations, round_size=int(data.get("round_size", default_adaptive_round_size)),
+            num_chunks=num_chunks, progress_callback=progress_callback)
+    return run_multiple_simulations_in_pool(get_simulation_pool(), simulation_pool_size, home_team_abbrev, away_team_abbrev,
+                                            num_simulations, data["game_model"], seed=get_seed(data),
+                                            num_chunks=num_chunks, progress_callback=progress_callback)
+
+# Submits a simulation run (same body as /run-simulation) as a background job and responds with its id right away
+@app.route('/jobs', methods=['POST'])
+def submit_simulation_job():
+    data = request.get_json()
+    missing_fields = [field for field in ["home_team", "away_team", "num_simulations", "game_model"] if field not in data]
+    if missing_fields:
+        return jsonify({"error": f"Missing fields: {', '.join(missing_fields)}"}), 400
+    # Jobs are split into more chunks than there are workers so that progress is reported more often
+    num_chunks = simulation_pool_size * job_chunks_per_worker
+    job = simulation_job_manager.submit(lambda progress_callback: run_simulation_request(data, num_chunks, progress_callback), data)
+    return jsonify({"job_id": job.job_id, "status": job.status}), 202
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_simulation_job(job_id):
+    job = simulation_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    return jsonify(job.to_dict())
+
+# Streams the job's progress as server-sent events until it finishes
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def stream_simulation_job_events(job_id):
+    job = simulation_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+
+    def generate_events():
+        last_version = None
+        while True:
+            version = job.wait_for_update(last_version, timeout=job_event_keepalive_seconds)
+            if version == last_version:
+                yield ": keepalive\n\n"
+                continue
+            last_version = version
+            job_dict = job.to_dict()
+            event_name = job_dict["status"] if job.is_finished() else "progress"
+            yield f"event: {event_name}\ndata: {json.dumps(job_dict)}\n\n"
+            if job.is_finished():
+                break
+
+    return Response(stream_with_context(generate_events()), mimetype="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+@app.route('/jobs/<job_id>/result', methods=['GET'])
+def get_simulation_job_result(job_id):
+    job = simulation_job_manager.get_job(job_id)
+    if job is None:
+        return jsonify({"error": f"Unknown job: {job_id}"}), 404
+    if job.status == "failed":
+        return jsonify(job.to_dict()), 500
+    if job.status != "completed":
+        return jsonify(job.to_dict()), 202
+    return jsonify(job.result)
+
 # Runs the simulation engine in a single-threaded mode; only meant for debugging purposes
 @app.route('/run-legacy-simulation', methods=['POST'])
 def run_legacy_simulation():
@@ -35,9 +189,93 @@ def run_legacy_simulation():
     home_team_abbrev = data['home_team']
     away_team_abbrev = data['away_team']
     num_simulations = int(data['num_simulations'])
-    game_model = model_str_to_model[data["game_model"]]
-    result_dict = run_multiple_simulations_with_statistics(home_team_abbrev, away_team_abbrev, num_simulations, game_model=game_model)
+    game_model = get_game_model(data["game_model"])
+    result_dict = run_multiple_simulations_with_statistics(home_team_abbrev, away_team_abbrev, num_simulations, game_model=game_model,
+                                                          seed=get_seed(data))
+    return jsonify(result_dict)
+
+# Runs every simulation in lockstep with the vectorized batch engine
+@app.route('/run-batch-simulation', methods=['POST'])
+def run_batch_simulation():
+    start_time = time()
+    data = request.get_json()
+    home_team_abbrev = data['home_team']
+    away_team_abbrev = data['away_team']
+    num_simulations = int(data['num_simulations'])
+    game_model = get_game_model(data["game_model"])
+    result_dict = run_multiple_simulations_batched(home_team_abbrev, away_team_abbrev, num_simulations, game_model=game_model, seed=get_seed(data))
+    end_time = time()
+    print(f"\nBatch simulation took {end_time - start_time} seconds on the backend!")
     return jsonify(result_dict)
-    
+
+# Simulates full seasons of the schedule in the request (a list of 'HOME v AWAY' games) or of the schedule file
+# (set SIM_ENGINE_SCHEDULE_PATH to override) and responds with division, seeding and playoff probability tables
+@app.route('/run-season-simulation', methods=['POST'])
+def run_season_simulation():
+    start_time = time()
+    data = request.get_json()
+    try:
+        if "schedule" in data:
+            schedule = parse_schedule(data["schedule"])
+        else:
+            schedule = read_schedule(os.environ.get("SIM_ENGINE_SCHEDULE_PATH", default_schedule_path))
+        result_dict = run_season_simulations_in_pool(get_simulation_pool(), simulation_pool_size, schedule, data["game_model"],
+                                                     int(data["num_seasons"]), seed=get_seed(data))
+    except (ValueError, FileNotFoundError) as e:
+        return jsonify({"error": str(e)}), 400
+    end_time = time()
+    print(f"\nSeason simulation took {end_time - start_time} seconds on the backend!")
+    return jsonify(result_dict)
+
+# Checks that the worker pool is up and that a worker can serve a request
+@app.route('/health', methods=['GET'])
+def health():
+    team_stats_store = get_team_stats_store()
+    health_dict = {"pool_size": simulation_pool_size, "pool_started": simulation_pool is not None,
+                   "season": team_stats_store.season, "stats_version": team_stats_store.stats_version,
+                   "result_cache": get_simulation_result_cache().get_stats()}
+    try:
+        health_dict["worker"] = get_simulation_pool().submit(check_simulation_worker).result(timeout=30)
+    except Exception as e:
+        health_dict["status"] = "unavailable"
+        health_dict["error"] = str(e)
+        return jsonify(health_dict), 503
+    health_dict["status"] = "ok"
+    return jsonify(health_dict)
+
+# Hit/miss counters of the simulation result cache
+@app.route('/cache-stats', methods=['GET'])
+def cache_stats():
+    return jsonify(get_simulation_result_cache().get_stats())
+
+# Call counts and times of the instrumented phases since the process started (only recorded with SIM_ENGINE_INSTRUMENTATION=1)
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({"instrumentation_enabled": instrumentation.enabled,
+                    "phases": instrumentation.get_timing_breakdown(instrumentation.snapshot()),
+                    "result_cache": get_simulation_result_cache().get_stats()})
+
+def replace_simulation_pool() -> None:
+    # A new pool (whose workers load the current stats) is swapped in, and the old one is retired without waiting: the chunks
+    # already submitted to it still finish, while later submits (e.g. the next round of an adaptive run) go to the new pool
+    global simulation_pool
+    with simulation_pool_lock:
+        if simulation_pool is None:
+            return
+        retired_pool = simulation_pool
+        simulation_pool = create_simulation_worker_pool(simulation_pool_size)
+    retired_pool.shutdown(wait=False)
+
+# Reloads the team stats from the database (which also clears the result cache); the worker pool is replaced if they changed so that workers pick up the new stats
+@app.route('/refresh-team-stats', methods=['POST'])
+def refresh_team_stats():
+    team_stats_store = get_team_stats_store()
+    with instrumentation.timed("refresh_team_stats"):
+        stats_changed = team_stats_store.refresh()
+    if stats_changed:
+        replace_simulation_pool()
+    return jsonify({"season": team_stats_store.season, "stats_version": team_stats_store.stats_version, "stats_changed": stats_changed})
+
 if __name__ == '__main__':
+    get_simulation_pool()
     app.run(port=5000)
\ No newline at end of file
@@ -1,9 +1,30 @@
 import pytest
+import os
 import random
+from concurrent.futures import ThreadPoolExecutor
 from typing import Tuple
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from time import monotonic
 from GameEngine import GameEngine
-from GameModels import PrototypeGameModel, GameModel_V1, GameModel_V1a, GameModel_V1b
-from Team import Team
+from BatchGameEngine import BatchGameEngine
+from GameState import GameState, PlayResult
+from GameModels import AbstractGameModel, PrototypeGameModel, GameModel_V1, GameModel_V1a, GameModel_V1b, MatchupContext, RUN_PLAY, PUNT_PLAY
+from Team import Team, DistributionSampler
+from PlayLog import PlayLog
+from TeamStatsStore import TeamStatsStore
+from TeamParamStore import TeamParamStore, TeamParamRow, write_team_params
+import game_simulator
+import benchmark_suite
+import instrumentation
+import season_simulator
+from SimulationAggregate import SimulationAggregate
+from SimulationJobManager import SimulationJobManager
+from SimulationResultCache import SimulationResultCache
+from FourthDownGrid import FourthDownGrid, measure_grid_disagreement
+import joblib
 
 teams = ["ARI","ATL","BAL","BUF","CAR","CHI","CIN","CLE","DAL",
         "DEN","DET","GB","HOU","IND","JAX","KC","LA","LAC",
@@ -27,17 +48,17 @@ def test_game_state_initialization():
     
     game_engine = GameEngine(home_team, away_team)
 
-    assert game_engine.game_state["quarter"] == 1
-    assert game_engine.game_state["game_seconds_remaining"] == 3600
-    assert game_engine.game_state["quarter_seconds_remaining"] == 900
-    assert game_engine.game_state["possession_team"] == home_team
-    assert game_engine.game_state["defense_team"] == away_team
-    assert game_engine.game_state["yardline"] == 75
-    assert game_engine.game_state["down"] == 1
-    assert game_engine.game_state["distance"] == 10
-    assert game_engine.game_state["score"][home_team.name] == 0
-    assert game_engine.game_state["score"][away_team.name] == 0
-    assert game_engine.game_state["play_log"] == []
+    assert game_engine.game_state.quarter == 1
+    assert game_engine.game_state.game_seconds_remaining == 3600
+    assert game_engine.game_state.quarter_seconds_remaining == 900
+    assert game_engine.game_state.possession_team == home_team
+    assert game_engine.game_state.defense_team == away_team
+    assert game_engine.game_state.yardline == 75
+    assert game_engine.game_state.down == 1
+    assert game_engine.game_state.distance == 10
+    assert game_engine.game_state.score[home_team.name] == 0
+    assert game_engine.game_state.score[away_team.name] == 0
+    assert game_engine.game_state.play_log == []
 
 def test_turnover_simulation():
     home_team_abbrev, away_team_abbrev = get_random_teams()
@@ -50,28 +71,28 @@ def test_turnover_simulation():
     expected_defteam = home_team.name
 
     # Create an initial mock game state
-    mock_game_state = {
-        "quarter": 1,
-        "game_seconds_remaining": 3600,
-        "quarter_seconds_remaining": 900, 
-        "possession_team": home_team, 
-        "defense_team": away_team,
-        "yardline": 100-expected_yardline, 
-        "down": 2,
-        "distance": 5,
-        "score": {home_team.name: 0, away_team.name: 0},
-        "play_log": [],
-    }
+    mock_game_state = GameState(
+        home_team,
+        away_team,
+        quarter=1,
+        game_seconds_remaining=3600,
+        quarter_seconds_remaining=900,
+        possession_team=home_team,
+        defense_team=away_team,
+        yardline=100-expected_yardline,
+        down=2,
+        distance=5,
+    )
 
     game_engine = GameEngine(home_team, away_team)
     game_engine.game_state = mock_game_state
     game_engine.simulate_turnover()
 
-    assert game_engine.game_state["yardline"] == expected_yardline
-    assert game_engine.game_state["down"] == expected_down
-    assert game_engine.game_state["distance"] == expected_distance
-    assert game_engine.game_state["possession_team"].name == expected_posteam
-    assert game_engine.game_state["defense_team"].name == expected_defteam
+    assert game_engine.game_state.yardline == expected_yardline
+    assert game_engine.game_state.down == expected_down
+    assert game_engine.game_state.distance == expected_distance
+    assert game_engine.game_state.possession_team.name == expected_posteam
+    assert game_engine.game_state.defense_team.name == expected_defteam
 
 def test_punt_simulation():
     home_team_abbrev, away_team_abbrev = get_random_teams()
@@ -83,31 +104,31 @@ def test_punt_simulation():
     expected_posteam = away_team.name
     expected_defteam = home_team.name
 
-    mock_play_result = { "yards_gained" : 0 }
+    mock_play_result = PlayResult("punt", None, 0, 25, 1, 900, False, False, home_team.name)
 
     # Create an initial mock game state
-    mock_game_state = {
-        "quarter": 1,
-        "game_seconds_remaining": 3600,
-        "quarter_seconds_remaining": 900, 
-        "possession_team": home_team, 
-        "defense_team": away_team,
-        "yardline": 100 - expected_yardline, 
-        "down": 2,
-        "distance": 5,
-        "score": {home_team.name: 0, away_team.name: 0},
-        "play_log": [],
-    }
+    mock_game_state = GameState(
+        home_team,
+        away_team,
+        quarter=1,
+        game_seconds_remaining=3600,
+        quarter_seconds_remaining=900,
+        possession_team=home_team,
+        defense_team=away_team,
+        yardline=100 - expected_yardline,
+        down=2,
+        distance=5,
+    )
 
     game_engine = GameEngine(home_team, away_team)
     game_engine.game_state = mock_game_state
     game_engine.simulate_punt(mock_play_result)
 
-    assert game_engine.game_state["yardline"] == expected_yardline
-    assert game_engine.game_state["down"] == expected_down
-    assert game_engine.game_state["distance"] == expected_distance
-    assert game_engine.game_state["possession_team"].name == expected_posteam
-    assert game_engine.game_state["defense_team"].name == expected_defteam
+    assert game_engine.game_state.yardline == expected_yardline
+    assert game_engine.game_state.down == expected_down
+    assert game_engine.game_state.distance == expected_distance
+    assert game_engine.game_state.possession_team.name == expected_posteam
+    assert game_engine.game_state.defense_team.name == expected_defteam
 
 def test_single_game_simulation_with_prototype_model():
     try:
@@ -133,9 +154,9 @@ def test_single_game_simulation_with_prototype_model():
         assert away_team.enhanced_def_passing_dist is None
 
         assert game_engine.game_state is not None
-        assert game_engine.game_state["quarter"] == 4
-        assert game_engine.game_state["game_seconds_remaining"] <= 0
-        assert game_engine.game_state["quarter_seconds_remaining"] <= 0
+        assert game_engine.game_state.quarter == 4
+        assert game_engine.game_state.game_seconds_remaining <= 0
+        assert game_engine.game_state.quarter_seconds_remaining <= 0
 
         assert game_summary is not None
         assert game_summary["final_score"][home_team.name] >= 0
@@ -185,9 +206,9 @@ def test_single_game_simulation_with_V1_model():
         assert away_team.enhanced_def_passing_dist is None
 
         assert game_engine.game_state is not None
-        assert game_engine.game_state["quarter"] == 4
-        assert game_engine.game_state["game_seconds_remaining"] <= 0
-        assert game_engine.game_state["quarter_seconds_remaining"] <= 0
+        assert game_engine.game_state.quarter == 4
+        assert game_engine.game_state.game_seconds_remaining <= 0
+        assert game_engine.game_state.quarter_seconds_remaining <= 0
 
         assert game_summary is not None
         assert game_summary["final_score"][home_team.name] >= 0
@@ -237,9 +258,9 @@ def test_single_game_simulation_with_V1a_model():
         assert away_team.enhanced_def_passing_dist is None
 
         assert game_engine.game_state is not None
-        assert game_engine.game_state["quarter"] == 4
-        assert game_engine.game_state["game_seconds_remaining"] <= 0
-        assert game_engine.game_state["quarter_seconds_remaining"] <= 0
+        assert game_engine.game_state.quarter == 4
+        assert game_engine.game_state.game_seconds_remaining <= 0
+        assert game_engine.game_state.quarter_seconds_remaining <= 0
 
         assert game_summary is not None
         assert game_summary["final_score"][home_team.name] >= 0
@@ -289,9 +310,9 @@ def test_single_game_simulation_with_V1b_model():
         assert away_team.enhanced_def_passing_dist.rvs() >= 0
 
         assert game_engine.game_state is not None
-        assert game_engine.game_state["quarter"] == 4
-        assert game_engine.game_state["game_seconds_remaining"] <= 0
-        assert game_engine.game_state["quarter_seconds_remaining"] <= 0
+        assert game_engine.game_state.quarter == 4
+        assert game_engine.game_state.game_seconds_remaining <= 0
+        assert game_engine.game_state.quarter_seconds_remaining <= 0
 
         assert game_summary is not None
         assert game_summary["final_score"][home_team.name] >= 0
@@ -301,6 +322,592 @@ def test_single_game_simulation_with_V1b_model():
     except Exception as e:
         pytest.fail("Single game simulation failed due to an unexpected exception: " + str(e))
 
+def test_team_stat_counters_match_play_log():
+    home_team_abbrev, away_team_abbrev = get_random_teams()
+    home_team, away_team = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+    game_engine = GameEngine(home_team, away_team, game_model=PrototypeGameModel())
+    game_summary = game_engine.run_simulation(test_mode=True)
+
+    play_log = game_summary["play_log"]
+    for team in [home_team, away_team]:
+        team_plays = [play for play in play_log if play["posteam"] == team.name]
+        run_plays = [play for play in team_plays if play["play_type"] == "run"]
+        pass_plays = [play for play in team_plays if play["play_type"] == "pass"]
+        team_summary = game_summary[team.name]
+
+        assert team_summary["team"] == team.name
+        assert team_summary["score"] == game_summary["final_score"][team.name]
+        assert team_summary["rushing_attempts"] == len(run_plays)
+        assert team_summary["rushing_yards"] == sum(play["yards_gained"] for play in run_plays)
+        assert team_summary["rushing_tds"] == sum(play["touchdown"] for play in run_plays)
+        assert team_summary["pass_yards"] == sum(play["yards_gained"] for play in pass_plays)
+        assert team_summary["passing_tds"] == sum(play["touchdown"] for play in pass_plays)
+        assert team_summary["sacks_allowed"] == sum(play["yards_gained"] < 0 for play in pass_plays)
+        assert team_summary["total_turnovers"] == sum(play["turnover"] for play in team_plays)
+        assert team_summary["run_rate"] == round(len(run_plays) / len(team_plays), 2)
+
+def test_game_engine_log_modes():
+    home_team_abbrev, away_team_abbrev = get_random_teams()
+    home_team, away_team = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+
+    off_summary = GameEngine(home_team, away_team, game_model=PrototypeGameModel()).run_simulation(test_mode=True, log_mode="off")
+    assert set(off_summary.keys()) == {"final_score", "num_plays_in_game"}
+    assert off_summary["num_plays_in_game"] > 0
+
+    summary_game_engine = GameEngine(home_team, away_team, game_model=PrototypeGameModel())
+    summary = summary_game_engine.run_simulation(test_mode=True, log_mode="summary")
+    assert "play_log" not in summary
+    assert summary_game_engine.game_state.play_log is None
+    assert summary[home_team.name]["team"] == home_team.name
+    assert summary[away_team.name]["team"] == away_team.name
+
+    full_game_engine = GameEngine(home_team, away_team, game_model=PrototypeGameModel())
+    full_summary = full_game_engine.run_simulation(test_mode=True, log_mode="full")
+    play_log = full_game_engine.game_state.play_log
+    assert isinstance(play_log, PlayLog)
+    assert len(play_log) == full_summary["num_plays_in_game"]
+    assert full_summary["play_log"] == play_log.to_dicts()
+    assert full_summary["play_log"][-1]["quarter"] == 4
+    assert play_log.to_columns()["posteam"] == [play["posteam"] for play in full_summary["play_log"]]
+
+    with pytest.raises(ValueError):
+        GameEngine(home_team, away_team, game_model=PrototypeGameModel()).run_simulation(test_mode=True, log_mode="verbose")
+
+def test_play_log_round_trip():
+    play_log = PlayLog("KC", "PIT")
+    play_result = PlayResult(play_type="field_goal", field_goal_made=True, yards_gained=0, time_elapsed=20, quarter=2,
+                             quarter_seconds_remaining=300, turnover=False, touchdown=False, posteam="PIT")
+    play_result.game_seconds_remaining = 2100
+    play_result.yardline = 30.5
+    play_result.down = 4
+    play_result.distance = 6.5
+    play_result.home_score = 7
+    play_result.away_score = 3
+    play_result.posteam_score = 3
+    play_log.append(play_result)
+
+    assert len(play_log) == 1
+    assert play_log.to_dicts() == [play_result.to_dict("KC", "PIT")]
+
+def test_simulation_aggregate_merge():
+    home_team_abbrev, away_team_abbrev = get_random_teams()
+    home_team, away_team = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+    game_summaries = [GameEngine(home_team, away_team, game_model=PrototypeGameModel()).run_simulation(test_mode=True, log_mode="summary")
+                      for _ in range(20)]
+
+    full_aggregate = SimulationAggregate(home_team.name, away_team.name)
+    first_half_aggregate = SimulationAggregate(home_team.name, away_team.name)
+    second_half_aggregate = SimulationAggregate(home_team.name, away_team.name)
+    for i, game_summary in enumerate(game_summaries):
+        full_aggregate.add_game(game_summary)
+        if i < 10:
+            first_half_aggregate.add_game(game_summary)
+        else:
+            second_half_aggregate.add_game(game_summary)
+    first_half_aggregate.merge(second_half_aggregate)
+
+    home_scores = [game_summary["final_score"][home_team.name] for game_summary in game_summaries]
+    away_scores = [game_summary["final_score"][away_team.name] for game_summary in game_summaries]
+    assert first_half_aggregate.num_games == 20
+    assert first_half_aggregate.home_wins + first_half_aggregate.away_wins + first_half_aggregate.ties == 20
+    assert first_half_aggregate.home_wins == sum(home > away for home, away in zip(home_scores, away_scores))
+    assert first_half_aggregate.get_mean(home_team.name, "score") == pytest.approx(np.mean(home_scores))
+    assert first_half_aggregate.get_variance(away_team.name, "score") == pytest.approx(np.var(away_scores, ddof=1))
+    assert first_half_aggregate.get_mean(home_team.name, "rushing_yards") == pytest.approx(full_aggregate.get_mean(home_team.name, "rushing_yards"))
+    assert first_half_aggregate.get_score_diff_mean() == pytest.approx(np.mean(home_scores) - np.mean(away_scores))
+
+    with pytest.raises(ValueError):
+        first_half_aggregate.merge(SimulationAggregate(away_team.name, home_team.name))
+
+def test_simulation_worker_serves_chunks_from_preloaded_state(tmp_path):
+    home_team_abbrev, away_team_abbrev = "BUF", "PHI"
+    home_team, away_team = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+    init_simulation_worker_for_test(["proto"], [home_team, away_team], tmp_path)
+
+    assert game_simulator.check_simulation_worker()["game_models"] == ["proto"]
+    sim_aggregate, featured_play_log = game_simulator.run_simulation_chunk_in_worker(home_team_abbrev, away_team_abbrev, "proto", 10, 5, 12)
+    assert sim_aggregate.num_games == 5
+    assert featured_play_log is not None
+    assert len(featured_play_log["play_type"]) > 0
+
+    # Teams are reused across chunks instead of being rebuilt for every request
+    worker_team = game_simulator.get_worker_team(home_team_abbrev, "proto")
+    assert isinstance(worker_team.stats, TeamParamRow)
+    game_simulator.run_simulation_chunk_in_worker(home_team_abbrev, away_team_abbrev, "proto", 0, 2)
+    assert game_simulator.get_worker_team(home_team_abbrev, "proto") is worker_team
+
+    with pytest.raises(ValueError):
+        game_simulator.get_worker_team("XYZ", "proto")
+
+def test_simulation_slate_merges_chunks_per_job(tmp_path):
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    init_simulation_worker_for_test(["proto"], [home_team, away_team], tmp_path)
+    slate_jobs = [("BUF", "PHI", "proto"), ("PHI", "BUF", "proto")]
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        job_results = game_simulator.run_simulation_slate(executor, slate_jobs, 7, seed=5, chunk_size=3)
+        repeated_job_results = game_simulator.run_simulation_slate(executor, slate_jobs, 7, seed=5, chunk_size=3)
+
+    for slate_job in slate_jobs:
+        job_result = job_results[slate_job]
+        assert job_result["aggregate"].num_games == 7
+        assert job_result["aggregate"].home_team_name == slate_job[0]
+        assert job_result["num_chunks"] == 3
+        assert job_result["compute_seconds"] > 0
+        assert job_result["aggregate"].score_diff_sum == repeated_job_results[slate_job]["aggregate"].score_diff_sum
+
+def test_season_standings_rank_division_winners_ahead_of_wild_cards():
+    team_abbrevs = ["BUF", "MIA", "NE", "KC"]
+    wins = np.array([[10], [12], [9], [8]])
+    losses = 17 - wins
+    ties = np.zeros((4, 1), dtype=np.int64)
+    point_diff = np.array([[50], [40], [30], [-20]])
+    division_winners, seeds = season_simulator.rank_season_standings(team_abbrevs, wins, losses, ties, point_diff, np.random.default_rng(0))
+
+    assert division_winners[:, 0].tolist() == [False, True, False, True]
+    # Both division winners are seeded ahead of BUF even though KC has a worse record
+    assert seeds[:, 0].tolist() == [3, 1, 4, 2]
+
+def test_season_chunk_aggregates_standings_of_every_season(tmp_path):
+    buf_team, phi_team = init_teams_for_test("BUF", "PHI")
+    mia_team, dal_team = init_teams_for_test("MIA", "DAL")
+    init_simulation_worker_for_test(["proto"], [buf_team, phi_team, mia_team, dal_team], tmp_path)
+    schedule = season_simulator.parse_schedule(["BUF v PHI", "MIA v DAL", "", "PHI v MIA", "DAL v BUF"])
+
+    season_aggregate = season_simulator.run_season_chunk_in_worker(schedule, "proto", 20, np.random.SeedSequence(3))
+    assert season_aggregate.num_seasons == 20
+    assert season_aggregate.team_abbrevs == ["BUF", "DAL", "MIA", "PHI"]
+    assert (season_aggregate.wins_sum + season_aggregate.losses_sum + season_aggregate.ties_sum).tolist() == [40] * 4
+    assert season_aggregate.division_titles.sum() == 20 * 2
+    # Every team makes the playoffs since each conference has fewer than 7 teams
+    assert season_aggregate.get_team_summary("BUF")["playoff_pct"] == 100
+
+    season_result = season_simulator.generate_season_simulation_result(season_aggregate)
+    assert list(season_result["division_tables"].keys()) == ["AFC East", "NFC East"]
+    assert sorted(row["team"] for row in season_result["conference_tables"]["AFC"]) == ["BUF", "MIA"]
+
+    with pytest.raises(ValueError):
+        season_simulator.parse_schedule(["BUF v XYZ"])
+
+def test_team_stats_store_snapshot_round_trip(tmp_path):
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    snapshot_path = str(tmp_path / "team_stats.npz")
+    store = TeamStatsStore(2024, snapshot_path)
+    store.set_team_stats({"BUF": home_team.stats, "PHI": away_team.stats})
+    store.save_snapshot()
+
+    snapshot_store = TeamStatsStore(2024, snapshot_path, prefer_snapshot=True)
+    snapshot_store.load() # Loads from the snapshot without touching the database
+    assert snapshot_store.stats_version == store.stats_version
+    assert snapshot_store.get_team_stats("PHI") == away_team.stats
+    assert snapshot_store.get_team("BUF").stats["off_air_yards_per_attempt"] == home_team.stats["off_air_yards_per_attempt"]
+
+    with pytest.raises(ValueError):
+        snapshot_store.get_team_stats("XYZ")
+    with pytest.raises(ValueError):
+        TeamStatsStore(2023, snapshot_path).load_snapshot()
+
+    # By default the database wins over an existing (possibly stale) snapshot, which is only used when the database can't be reached
+    db_url = f"sqlite:///{tmp_path / 'sim_engine.db'}"
+    pd.DataFrame({"team": ["BUF"], "off_pass_rate": [0.6]}).to_sql("sim_engine_team_stats_2024", create_engine(db_url), index=False)
+    db_store = TeamStatsStore(2024, snapshot_path, db_url=db_url)
+    db_store.load()
+    assert db_store.get_all_team_stats() == {"BUF": {"team": "BUF", "off_pass_rate": 0.6}}
+    fallback_store = TeamStatsStore(2024, str(tmp_path / "fallback.npz"), db_url=f"sqlite:///{tmp_path / 'missing' / 'sim_engine.db'}")
+    with pytest.raises(OperationalError):
+        fallback_store.load()
+    store.snapshot_path = fallback_store.snapshot_path
+    store.save_snapshot()
+    fallback_store.load()
+    assert fallback_store.stats_version == store.stats_version
+
+def test_seeded_simulation_chunks_are_reproducible():
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    chunk_results = []
+    for seed in [11, 11, 12]:
+        sim_aggregate, featured_play_log = game_simulator.run_simulation_chunk(home_team, away_team, PrototypeGameModel(), 0, 10, 3,
+                                                                               np.random.SeedSequence(seed))
+        chunk_results.append((sim_aggregate.score_diff_sum, sim_aggregate.team_stats, featured_play_log))
+
+    assert chunk_results[0] == chunk_results[1]
+    assert chunk_results[0] != chunk_results[2]
+
+def test_matchup_context_is_built_once_per_matchup_and_model():
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    home_team.set_stats(dict(home_team.stats, team="BUF", turnover_rate=0.08, run_rate=0.5, pass_rate=0.5))
+    proto_model = PrototypeGameModel()
+    matchup_context = proto_model.get_matchup_context(home_team, away_team)
+    assert matchup_context.run_probability == pytest.approx(0.5)
+    assert matchup_context.go_for_it_run_probability == pytest.approx(0.5 / (0.5 + away_team.get_stat("pass_rate")))
+    assert matchup_context.turnover_rate == pytest.approx(0.55 * 0.08 + 0.45 * away_team.get_stat("forced_turnover_rate"))
+    assert matchup_context.pass_completion_rate == pytest.approx((0.55 * home_team.get_stat("pass_completion_rate") + 0.45 * away_team.get_stat("pass_completion_rate_allowed")) / 100)
+    assert proto_model.get_matchup_context(home_team, away_team) is matchup_context
+    assert proto_model.get_matchup_context(away_team, home_team) is not matchup_context
+
+    # Each model weighs the matchup (and scales turnovers) its own way
+    v1b_context = MatchupContext(home_team, away_team, 0.575, GameModel_V1b.turnover_rate_factor)
+    assert v1b_context.turnover_rate == pytest.approx(0.375 * (0.575 * 0.08 + 0.425 * away_team.get_stat("forced_turnover_rate")))
+
+    # Contexts are rebuilt once either team's stats are replaced
+    away_team.set_stats(dict(away_team.stats, forced_turnover_rate=0.3))
+    refreshed_context = proto_model.get_matchup_context(home_team, away_team)
+    assert refreshed_context is not matchup_context
+    assert refreshed_context.turnover_rate == pytest.approx(0.55 * 0.08 + 0.45 * 0.3)
+
+def test_instrumentation_counts_phases_and_merges_chunk_records(monkeypatch):
+    monkeypatch.setattr(instrumentation, "enabled", True)
+    monkeypatch.setattr(instrumentation, "phase_records", {})
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    with instrumentation.collect() as game_phase_records:
+        game_engine = GameEngine(home_team, away_team, PrototypeGameModel())
+        game_engine.run_simulation(test_mode=True, log_mode="full")
+    assert game_phase_records["resolve_play"][0] == len(game_engine.game_state.play_log)
+    assert game_phase_records["update_game_state"][0] == len(game_engine.game_state.play_log)
+    assert game_phase_records["get_game_summary"][0] == 1
+    assert instrumentation.snapshot()["resolve_play"] == game_phase_records["resolve_play"]
+
+    # Chunk phases stay with the aggregate (as they would in a worker process) until they are merged
+    instrumentation.reset()
+    sim_aggregate, _ = game_simulator.run_simulation_chunk(home_team, away_team, PrototypeGameModel(), 0, 5, 2)
+    assert instrumentation.snapshot() == {}
+    assert sim_aggregate.phase_records["simulation_chunk"][0] == 1
+    assert sim_aggregate.phase_records["get_game_summary"][0] == 5
+    instrumentation.merge(sim_aggregate.phase_records)
+    instrumentation.merge(sim_aggregate.phase_records)
+    breakdown = instrumentation.get_timing_breakdown(instrumentation.snapshot())
+    assert breakdown["get_game_summary"]["count"] == 10
+    assert breakdown["resolve_play"]["count"] == 2 * sim_aggregate.phase_records["resolve_play"][0]
+
+    # Nothing is recorded while instrumentation is off
+    monkeypatch.setattr(instrumentation, "enabled", False)
+    with instrumentation.collect() as disabled_phase_records:
+        GameEngine(home_team, away_team, PrototypeGameModel()).run_simulation(test_mode=True, log_mode="summary")
+    assert disabled_phase_records == {}
+
+def test_team_samplers_draw_from_attached_generator():
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    home_team.setup_teams_for_game_model("v1")
+    home_team.reset_samplers(np.random.default_rng(3))
+    first_samples = home_team.sample_offensive_rushing_play(size=50)
+    home_team.reset_samplers(np.random.default_rng(3))
+    assert np.array_equal(home_team.sample_offensive_rushing_play(size=50), first_samples)
+
+    # Samplers built after a Generator is attached also use it
+    away_team.reset_samplers(np.random.default_rng(3))
+    away_team.setup_teams_for_game_model("v1b")
+    assert away_team.samplers["off_rushing_distribution"].rng is away_team.sample_rng
+
+def test_adaptive_simulation_rounds_stop_at_tolerance_or_cap():
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        def submit_round(first_game_index, num_simulations_for_round, featured_game_index, round_seed_sequence):
+            return game_simulator.submit_simulation_chunks(executor, game_simulator.run_simulation_chunk, (home_team, away_team, PrototypeGameModel()),
+                                                           num_simulations_for_round, 10, featured_game_index, round_seed_sequence, first_game_index)
+
+        # Loose tolerances are met after the first round
+        sim_aggregate, featured_play_log, converged = game_simulator.run_adaptive_simulation_rounds(
+            submit_round, home_team.name, away_team.name, 5, 100.0, 100.0, 200, 20)
+        assert converged
+        assert sim_aggregate.num_games == 20
+        assert featured_play_log is not None
+
+        # Tolerances that can't be met stop at the cap
+        sim_aggregate, _, converged = game_simulator.run_adaptive_simulation_rounds(
+            submit_round, home_team.name, away_team.name, 5, 0.0, 0.0, 50, 20)
+        assert not converged
+        assert sim_aggregate.num_games == 50
+        assert sim_aggregate.get_home_win_pct_interval_width() > 0
+
+def test_adaptive_run_keeps_going_when_its_pool_is_replaced(tmp_path):
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    init_simulation_worker_for_test(["proto"], [home_team, away_team], tmp_path)
+    pools = []
+
+    def get_replaced_pool():
+        # Every round gets a new pool and the previous one is retired, like the API's pool after a team stats refresh
+        if pools:
+            pools[-1].shutdown(wait=False)
+        pools.append(ThreadPoolExecutor(max_workers=2))
+        return pools[-1]
+
+    sim_result = game_simulator.run_multiple_simulations_adaptive_in_pool(get_replaced_pool, 2, "BUF", "PHI", "proto", seed=3,
+                                                                         win_pct_tolerance=0.0, score_diff_tolerance=0.0,
+                                                                         max_simulations=30, round_size=10)
+    assert sim_result["num_simulations"] == 30
+    assert len(pools) == 3
+    pools[-1].shutdown()
+
+    # Adaptive runs can use the parameters of any season that the workers can map
+    team_params_path = str(tmp_path / "team_params_2023.bin")
+    write_team_params(team_params_path, 2023, {"BUF": home_team.stats, "PHI": away_team.stats}, "test")
+    game_simulator.init_simulation_worker(["proto"], {2023: team_params_path})
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        sim_result = game_simulator.run_multiple_simulations_adaptive_in_pool(executor, 2, "BUF", "PHI", "proto", seed=3, max_simulations=20,
+                                                                             round_size=10, season=2023)
+    assert sim_result["num_simulations"] >= 10
+    assert (2023, "BUF", "proto") in game_simulator.worker_teams
+
+def test_simulation_stats_summary_is_computed_in_memory_with_optional_sink(tmp_path, monkeypatch):
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    home_team_sim_stats_df = pd.DataFrame({"team": ["BUF", "BUF"], **{field: [1.0, 2.0] for field in game_simulator.team_stat_fields}})
+    away_team_sim_stats_df = pd.DataFrame({"team": ["PHI", "PHI"], **{field: [3.0, 5.0] for field in game_simulator.team_stat_fields}})
+    away_team_sim_stats_df.loc[0, "fg_pct"] = np.nan
+
+    # Nothing is written to disk (there isn't even a logs/ directory) unless a stats sink is configured
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("SIM_ENGINE_STATS_SINK", raising=False)
+    sim_result = game_simulator.generate_simulation_stats_summary(home_team, away_team, 1, 2, home_team_sim_stats_df, away_team_sim_stats_df)
+    assert sim_result["average_score_diff"] == pytest.approx(1.5 - 4.0)
+    assert sim_result["home_win_pct"] == 50
+    assert sim_result["total_sim_stats"][1]["fg_pct"] == 5.0
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.setenv("SIM_ENGINE_STATS_SINK", "csv")
+    monkeypatch.setenv("SIM_ENGINE_STATS_SINK_DIR", str(tmp_path / "sink"))
+    monkeypatch.setattr(game_simulator, "simulation_stats_sink", None)
+    first_result = game_simulator.generate_simulation_stats_summary(home_team, away_team, 1, 2, home_team_sim_stats_df, away_team_sim_stats_df)
+    second_result = game_simulator.generate_simulation_stats_summary(home_team, away_team, 1, 2, home_team_sim_stats_df, away_team_sim_stats_df)
+    game_simulator.get_simulation_stats_sink().flush()
+
+    # Every run writes its own files
+    assert first_result["run_id"] != second_result["run_id"]
+    for run_id in [first_result["run_id"], second_result["run_id"]]:
+        assert pd.read_csv(tmp_path / "sink" / f"{run_id}_BUF_sim_stats.csv")["score"].tolist() == [1.0, 2.0]
+        assert (tmp_path / "sink" / f"{run_id}_total_sim_stats.csv").exists()
+    game_simulator.get_simulation_stats_sink().shutdown()
+
+def test_benchmark_suite_runs_offline_and_flags_regressions(monkeypatch):
+    monkeypatch.setattr(game_simulator, "team_stats_store", None)
+    benchmark_run = benchmark_suite.run_benchmark_suite(["micro"], ["proto"], micro_number=5, micro_repeat=2)
+    results = benchmark_run["results"]
+    assert game_simulator.get_team_stats_store().get_all_team_stats().keys() == {"BUF", "PHI"}
+    assert {"micro.proto.resolve_play", "micro.proto.update_game_state", "micro.proto.get_game_summary"} <= results.keys()
+    assert benchmark_run["environment"]["cpu_count"] == os.cpu_count()
+
+    baseline_results = {name: dict(result, seconds=result["seconds"] / 2) for name, result in results.items()}
+    baseline_results["micro.proto.resolve_play"]["seconds"] = results["micro.proto.resolve_play"]["seconds"]
+    regressions = benchmark_suite.compare_to_baseline(results, baseline_results, threshold=0.5)
+    assert sorted(regression["name"] for regression in regressions) == sorted(name for name in results if name != "micro.proto.resolve_play")
+    assert benchmark_suite.compare_to_baseline(results, {}, threshold=0.5) == []
+
+    with pytest.raises(ValueError):
+        benchmark_suite.run_benchmark_suite(["nano"], ["proto"])
+
+def test_simulation_job_manager_reports_progress_and_results():
+    job_manager = SimulationJobManager(max_workers=1, max_finished_jobs=1)
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+
+    def run_job(progress_callback):
+        sim_aggregate = SimulationAggregate(home_team.name, away_team.name)
+        for _ in range(3):
+            sim_aggregate.add_game(GameEngine(home_team, away_team, PrototypeGameModel()).run_simulation(test_mode=True, log_mode="summary"))
+            progress_callback(sim_aggregate)
+        return {"num_simulations": sim_aggregate.num_games}
+
+    def run_failing_job(progress_callback):
+        raise ValueError("No team stats found for team: XYZ")
+
+    job = job_manager.submit(run_job, {"num_simulations": 3})
+    while not job.is_finished():
+        job.wait_for_update(job.version, timeout=5)
+    assert job.status == "completed"
+    assert job.result == {"num_simulations": 3}
+    assert job.to_dict()["progress"]["num_simulations_done"] == 3
+    assert job_manager.get_job(job.job_id) is job
+
+    failed_job = job_manager.submit(run_failing_job, {})
+    while not failed_job.is_finished():
+        failed_job.wait_for_update(failed_job.version, timeout=5)
+    assert failed_job.status == "failed"
+    assert "XYZ" in failed_job.error
+
+    # Only the most recent finished job is kept
+    job_manager.submit(run_job, {"num_simulations": 3})
+    assert job_manager.get_job(job.job_id) is None
+    job_manager.shutdown()
+
+def test_simulation_result_cache_evicts_and_invalidates_on_refresh(tmp_path, monkeypatch):
+    cache = SimulationResultCache(max_entries=2, ttl_seconds=60)
+    cache.put(("BUF", "PHI"), {"home_win_pct": 60})
+    cache.put(("KC", "DEN"), {"home_win_pct": 70})
+    assert cache.get(("BUF", "PHI")) == {"home_win_pct": 60}
+    cache.put(("DAL", "NYG"), {"home_win_pct": 55}) # Evicts KC vs. DEN, the least recently used entry
+    assert cache.get(("KC", "DEN")) is None
+    assert cache.get_or_compute(("DAL", "NYG"), lambda: pytest.fail("Result should have been cached")) == {"home_win_pct": 55}
+
+    stats = cache.get_stats()
+    assert (stats["entries"], stats["hits"], stats["misses"], stats["evictions"]) == (2, 2, 1, 1)
+
+    # Entries older than the TTL are misses
+    expired_time = monotonic() + 61
+    monkeypatch.setattr("SimulationResultCache.monotonic", lambda: expired_time)
+    assert cache.get(("BUF", "PHI")) is None
+
+    # Refreshing the team stats clears the cache, but only when the stats changed
+    db_url = f"sqlite:///{tmp_path / 'team_stats.db'}"
+    db_engine = create_engine(db_url)
+    pd.DataFrame({"team": ["BUF", "PHI"], "off_pass_rate": [0.6, 0.5]}).to_sql("sim_engine_team_stats_2024", db_engine, index=False)
+    store = TeamStatsStore(2024, db_url=db_url)
+    cache.watch_team_stats(store)
+    cache.put(("BUF", "PHI"), {"home_win_pct": 60})
+    assert store.refresh()
+    assert cache.get_stats()["entries"] == 0
+    cache.put(("BUF", "PHI"), {"home_win_pct": 60})
+    assert not store.refresh()
+    assert cache.get_stats()["entries"] == 1
+
+def test_only_seeded_simulation_requests_are_cached(monkeypatch):
+    import simulation_engine_api
+    monkeypatch.setattr(game_simulator, "team_stats_store", benchmark_suite.load_fixture_team_stats())
+    monkeypatch.setattr(simulation_engine_api, "simulation_result_cache", SimulationResultCache(8, 60))
+    run_ids = iter(range(100))
+    monkeypatch.setattr(simulation_engine_api, "run_simulation_request_uncached", lambda data, num_chunks, progress_callback: {"run_id": next(run_ids)})
+
+    request_data = {"home_team": "BUF", "away_team": "PHI", "game_model": "proto", "num_simulations": 10}
+    # Every unseeded request is a new random run
+    assert simulation_engine_api.run_simulation_request(request_data)["run_id"] == 0
+    assert simulation_engine_api.run_simulation_request(request_data)["run_id"] == 1
+    assert simulation_engine_api.simulation_result_cache.get_stats()["entries"] == 0
+    # Seeded requests are reproducible, so repeats are served from the cache
+    seeded_request_data = dict(request_data, seed=7)
+    assert simulation_engine_api.run_simulation_request(seeded_request_data)["run_id"] == 2
+    assert simulation_engine_api.run_simulation_request(seeded_request_data)["run_id"] == 2
+
+def test_team_stats_store_reads_from_sim_engine_db_url(tmp_path, monkeypatch):
+    # SIM_ENGINE_DB_URL points the store at e.g. a local SQLite copy of the sim engine tables written by data_prep.py
+    db_url = f"sqlite:///{tmp_path / 'sim_engine.db'}"
+    pd.DataFrame({"team": ["BUF", "PHI"], "off_pass_rate": [0.6, 0.5]}).to_sql("sim_engine_team_stats_2024", create_engine(db_url))
+    monkeypatch.setenv("SIM_ENGINE_DB_URL", db_url)
+    store = TeamStatsStore(2024, snapshot_path=str(tmp_path / "snapshot.json"))
+    assert store.refresh()
+    assert store.get_team_stats("PHI")["off_pass_rate"] == 0.5
+
+def test_team_param_store_maps_stats_of_every_season(tmp_path, monkeypatch):
+    home_team, away_team = init_teams_for_test("BUF", "PHI")
+    team_stats = {"BUF": home_team.stats, "PHI": dict(away_team.stats, pass_rate=None)}
+    write_team_params(str(tmp_path / "team_params_2024.bin"), 2024, team_stats, "abc123")
+
+    store = TeamParamStore(str(tmp_path / "team_params_2024.bin"))
+    assert (store.season, store.stats_version, store.team_abbrevs, len(store)) == (2024, "abc123", ["BUF", "PHI"], 2)
+    buf_params = store.get_team_params("BUF")
+    assert buf_params["team"] == "BUF"
+    assert list(buf_params) == list(home_team.stats)
+    assert all(buf_params[key] == home_team.stats[key] for key in home_team.stats if key != "team")
+    assert np.isnan(store.get_team_params("PHI")["pass_rate"])
+    assert store.get_team("BUF").get_stat("off_rush_yards_per_play_mean") == home_team.get_stat("off_rush_yards_per_play_mean")
+    with pytest.raises(KeyError):
+        buf_params["not_a_stat"]
+    with pytest.raises(ValueError):
+        store.get_team_params("XYZ")
+
+    # The file is mapped read-only, so the stats can't be changed through it
+    with pytest.raises(TypeError):
+        buf_params.values[0] = 1.0
+    with pytest.raises(ValueError):
+        store.values[0, 0] = 1.0
+
+    # Workers map the seasons they were started with and map other seasons' files on first use
+    monkeypatch.setenv("SIM_ENGINE_TEAM_PARAMS_DIR", str(tmp_path))
+    write_team_params(str(tmp_path / "team_params_2023.bin"), 2023, {"BUF": away_team.stats}, "def456")
+    game_simulator.init_simulation_worker(["proto"], {2024: str(tmp_path / "team_params_2024.bin")})
+    assert game_simulator.get_worker_team("BUF", "proto", 2023).get_stat("team") == "BUF"
+    assert game_simulator.get_worker_team("BUF", "proto", 2023) is not game_simulator.get_worker_team("BUF", "proto", 2024)
+    assert game_simulator.check_simulation_worker()["team_param_seasons"] == [2023, 2024]
+    with pytest.raises(ValueError):
+        game_simulator.get_worker_team("BUF", "proto", 2019)
+
+    with pytest.raises(ValueError):
+        write_team_params(str(tmp_path / "team_params_2022.bin"), 2022, {"BUF": dict(home_team.stats, coach="Sean McDermott")}, "x")
+
+def test_distribution_sampler_block_refills():
+    home_team_abbrev, away_team_abbrev = get_random_teams()
+    home_team, _ = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+    home_team.setup_teams_for_game_model("v1b")
+
+    sampler = DistributionSampler(home_team.off_rushing_distribution, block_size=8)
+    first_sample = sampler.sample()
+    assert sampler.cursor == 1
+    assert first_sample == sampler.block[0]
+
+    # Requests larger than the block are served across several refills
+    samples = sampler.sample_many(21)
+    assert len(samples) == 21
+    assert (samples >= 0).all()
+    assert sampler.cursor == (1 + 21) % 8
+    assert len(sampler.block) == 8
+
+    # Block sampling shouldn't change the distribution that is being sampled
+    mean = home_team.off_rushing_distribution.mean()
+    assert abs(sampler.sample_many(20000).mean() - mean) < 0.1 * mean
+
+def test_fourth_down_grid_matches_model_at_grid_points():
+    fourth_down_model = joblib.load("game_models/v2a_4th_down_playcall_model.pkl")
+    fourth_down_grid = FourthDownGrid(fourth_down_model, time_step=300, max_ydstogo=5, yardline_step=10,
+                                      score_differential_step=7, max_score_differential=14)
+
+    grid_features = fourth_down_grid.get_grid_features()
+    model_predictions = fourth_down_model.predict(grid_features)
+    assert (fourth_down_grid.predict(grid_features) == model_predictions).all()
+
+    for i in range(0, len(grid_features), 97):
+        row = grid_features.iloc[i].to_dict()
+        assert fourth_down_grid.predict_one(**row) == model_predictions[i]
+
+    disagreement_summary = measure_grid_disagreement(fourth_down_model, fourth_down_grid, num_samples=500, seed=3)
+    assert 0 <= disagreement_summary["disagreement_rate"] <= 1
+
+def test_batch_state_transitions():
+    home_team_abbrev, away_team_abbrev = get_random_teams()
+    home_team, away_team = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+
+    batch_game_engine = BatchGameEngine(home_team, away_team, 3)
+    batch_game_engine.game_state["yardline"][:] = [66, 40, 5]
+    batch_game_engine.game_state["down"][:] = [2, 4, 1]
+
+    # Game 0 turns the ball over, game 1 punts and game 2 scores a touchdown
+    mock_play_result = {
+        "play_type": np.array([RUN_PLAY, PUNT_PLAY, RUN_PLAY], dtype=np.int8),
+        "field_goal_made": np.array([False, False, False]),
+        "yards_gained": np.array([0.0, 45.0, 6.0]),
+        "time_elapsed": np.array([20, 20, 20]),
+        "turnover": np.array([True, False, False]),
+    }
+    batch_game_engine.update_game_state(np.arange(3), mock_play_result)
+    game_state = batch_game_engine.game_state
+
+    assert list(game_state["yardline"]) == [34, 75, 75]
+    assert list(game_state["down"]) == [1, 1, 1]
+    assert list(game_state["distance"]) == [10, 10, 10]
+    assert list(game_state["home_has_possession"]) == [False, False, False]
+    assert list(game_state["home_score"]) == [0, 0, 7]
+    assert list(game_state["quarter_seconds_remaining"]) == [880, 880, 880]
+
+def test_game_models_must_support_batch_simulation():
+    class SingleGameOnlyModel(AbstractGameModel):
+        def resolve_play(self, game_state, rng):
+            return PrototypeGameModel().resolve_play(game_state, rng)
+
+    # A model without resolve_play_batch fails when it's created rather than partway through a batch run
+    with pytest.raises(TypeError):
+        SingleGameOnlyModel()
+
+def test_batch_game_simulation_with_prototype_model():
+    home_team_abbrev, away_team_abbrev = get_random_teams()
+    home_team, away_team = init_teams_for_test(home_team_abbrev, away_team_abbrev)
+    num_games = 200
+    batch_game_engine = BatchGameEngine(home_team, away_team, num_games, PrototypeGameModel(), np.random.default_rng(7))
+    batch_summary = batch_game_engine.run_simulation()
+
+    assert batch_game_engine.game_state["game_over"].all()
+    assert (batch_game_engine.game_state["quarter"] == 4).all()
+    assert (batch_game_engine.game_state["quarter_seconds_remaining"] <= 0).all()
+
+    assert len(batch_summary["num_plays_in_game"]) == num_games
+    assert (batch_summary["num_plays_in_game"] > 0).all()
+    assert (batch_summary["final_score"][home_team.name] >= 0).all()
+    assert (batch_summary["final_score"][away_team.name] >= 0).all()
+    assert len(batch_summary[home_team.name]["score"]) == num_games
+
 ###########################################################################################
 # Helper functions
 def get_random_teams() -> Tuple[str, str]:
@@ -311,6 +918,11 @@ def get_random_teams() -> Tuple[str, str]:
     away_team_abbrev = teams[away_team_idx]
     return home_team_abbrev, away_team_abbrev
 
+def init_simulation_worker_for_test(model_codes: list, test_teams: list, tmp_path) -> None:
+    team_params_path = str(tmp_path / "team_params.bin")
+    write_team_params(team_params_path, 2024, {team.name: team.stats for team in test_teams}, "test")
+    game_simulator.init_simulation_worker(model_codes, {2024: team_params_path})
+
 def init_teams_for_test(home_team_abbrev: str, away_team_abbrev: str) -> Tuple[object, object]:
     home_team_stats = {
         "team": home_team_abbrev,